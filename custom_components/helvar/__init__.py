@@ -9,10 +9,12 @@ from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers import config_validation as cv
 
-from .const import CONF_HOST, CONF_PORT, DEFAULT_PORT, DOMAIN
+from .const import CONF_HOST, CONF_PORT, CONF_ROUTERS, DEFAULT_PORT, DOMAIN
 from .router import HelvarRouter
+from .services import async_setup_services
+from .topology import TopologyStore
 
-PLATFORMS = ["light", "select"]
+PLATFORMS = ["light", "select", "sensor"]
 
 CONFIG_SCHEMA = vol.Schema(
     {
@@ -20,6 +22,9 @@ CONFIG_SCHEMA = vol.Schema(
             {
                 vol.Required(CONF_HOST): cv.string,
                 vol.Optional(CONF_PORT, default=DEFAULT_PORT): cv.port,
+                vol.Optional(CONF_ROUTERS, default=[]): vol.All(
+                    cv.ensure_list, [cv.string]
+                ),
             }
         )
     },
@@ -31,6 +36,7 @@ async def async_setup(hass, config):
     """Set up the Helvar platform."""
 
     hass.data[DOMAIN] = {}
+    async_setup_services(hass)
     return True
 
 
@@ -45,6 +51,8 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         hass.data[DOMAIN][entry.entry_id] = None
         return False
 
+    entry.async_on_unload(entry.add_update_listener(async_update_options))
+
     # for platform in PLATFORMS:
     #     hass.async_create_task(
     #         hass.config_entries.async_forward_entry_setup(entry, platform)
@@ -53,6 +61,11 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     return True
 
 
+async def async_update_options(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload the config entry when its options change."""
+    await hass.config_entries.async_reload(entry.entry_id)
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     unload_ok = all(
@@ -64,6 +77,12 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         )
     )
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        router = hass.data[DOMAIN].pop(entry.entry_id)
+        await router.async_reset()
 
     return unload_ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove the cached topology when a config entry is deleted."""
+    await TopologyStore(hass, entry.entry_id).async_remove()
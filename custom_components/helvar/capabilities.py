@@ -0,0 +1,79 @@
+"""What kind of thing each Helvar device is, and what it can do."""
+from __future__ import annotations
+
+from aiohelvar.static import DigidimType
+
+# Kinds of device.
+KIND_DIMMER = "dimmer"
+KIND_SWITCH = "switch"
+KIND_COLOUR = "colour"
+KIND_EMERGENCY = "emergency"
+KIND_SENSOR = "sensor"
+KIND_CONTROL = "control"
+
+# Kinds that have a level and are shown as lights.
+LIGHT_KINDS = (KIND_DIMMER, KIND_SWITCH, KIND_COLOUR, KIND_EMERGENCY)
+
+# DALI device types, as aiohelvar names them, that aren't plain dimmable lamps.
+_DALI_KINDS = {
+    "Self contained emergency lighting": KIND_EMERGENCY,
+    "Switching function": KIND_SWITCH,
+    "Colour control": KIND_COLOUR,
+}
+
+# DIGIDIM part numbers of relay outputs and of sensors.
+_DIGIDIM_SWITCHES = {"458/SW8", "498"}
+_DIGIDIM_SENSORS = {"312", "320", "321"}
+
+# Device state flags of emergency fittings.
+NS_EM_IN_EMERGENCY = 0x00000400
+NS_EM_BATTERY_FAIL = 0x00040000
+
+
+def detect_kind(device) -> str:
+    """Return the kind of a device from the type the router reported for it.
+
+    Protocols aiohelvar doesn't decode are assumed to be dimmers if they have a
+    level, as before.
+    """
+
+    if device.protocol == "DALI":
+        return _DALI_KINDS.get(device.type, KIND_DIMMER)
+
+    if device.protocol == "DIGIDIM" and isinstance(device.type, DigidimType):
+        if device.type.part_number in _DIGIDIM_SWITCHES:
+            return KIND_SWITCH
+        if device.type.part_number in _DIGIDIM_SENSORS:
+            return KIND_SENSOR
+
+    return KIND_DIMMER if device.is_load else KIND_CONTROL
+
+
+def load_members(api, group, strict: bool = False) -> list | None:
+    """Return the devices in a group that have a level.
+
+    Members that aren't registered are skipped, unless strict is set, when they
+    make it return None instead, for callers that must know the whole group.
+    """
+
+    members = []
+    for address in group.devices:
+        device = api.devices.devices.get(address)
+        if device is None:
+            if strict:
+                return None
+            continue
+        if device.is_load:
+            members.append(device)
+    return members
+
+
+def emergency_status(device) -> dict:
+    """Return the state of an emergency fitting, as of its last state query."""
+
+    state = int(device.state or 0)
+    return {
+        "in_emergency": bool(state & NS_EM_IN_EMERGENCY),
+        "battery_failed": bool(state & NS_EM_BATTERY_FAIL),
+        "lamp_failed": device.is_lamp_failure,
+    }
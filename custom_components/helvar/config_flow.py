@@ -8,12 +8,32 @@ import aiohelvar
 import voluptuous as vol
 
 from homeassistant import config_entries
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.data_entry_flow import FlowResult
 from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers import config_validation as cv
 
-from .const import CONF_HOST, CONF_PORT, DEFAULT_PORT, DOMAIN
+from .const import (
+    CONF_DISABLED_GROUPS,
+    CONF_EVENT_CLUSTERS,
+    CONF_EVENT_GROUPS,
+    CONF_FIRE_EVENTS,
+    CONF_FLUSH_INTERVAL,
+    CONF_HOST,
+    CONF_PIPELINE_WINDOW,
+    CONF_POLL_RATE,
+    CONF_PORT,
+    CONF_ROUTERS,
+    CONF_STATE_WRITE_WINDOW,
+    CONF_SYNC_INTERVAL,
+    DEFAULT_FLUSH_INTERVAL,
+    DEFAULT_PIPELINE_WINDOW,
+    DEFAULT_POLL_RATE,
+    DEFAULT_PORT,
+    DEFAULT_STATE_WRITE_WINDOW,
+    DEFAULT_SYNC_INTERVAL,
+    DOMAIN,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -21,6 +41,7 @@ STEP_USER_DATA_SCHEMA = vol.Schema(
     {
         vol.Required(CONF_HOST): cv.string,
         vol.Optional(CONF_PORT, default=DEFAULT_PORT): cv.port,
+        vol.Optional(CONF_ROUTERS, default=""): cv.string,
     }
 )
 
@@ -37,12 +58,19 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         """Initialize the Helvar flow."""
         self.router: aiohelvar.Router | None = None
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        """Get the options flow for this handler."""
+        return OptionsFlowHandler(config_entry)
+
     async def validate_input(
         self, hass: HomeAssistant, data: dict[str, Any]
     ) -> dict[str, Any]:
         """Validate the user input allows us to connect.
 
-        Data has the keys from STEP_USER_DATA_SCHEMA with values provided by the user.
+        Data has the keys from STEP_USER_DATA_SCHEMA with values provided by the user,
+        with the other routers of the workgroup already split into a list.
         """
         router = aiohelvar.Router((data[CONF_HOST]), data[CONF_PORT])
 
@@ -51,6 +79,14 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         except ConnectionError as initial_exception:
             raise CannotConnect() from initial_exception
 
+        for host in data[CONF_ROUTERS]:
+            other_router = aiohelvar.Router(host, data[CONF_PORT])
+            try:
+                await other_router.connect()
+            except ConnectionError as other_exception:
+                raise CannotConnect() from other_exception
+            await other_router.disconnect()
+
         workgroup_name = router.workgroup_name
         self.router = router
         # Return info that you want to store in the config entry.
@@ -67,6 +103,12 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
         errors = {}
 
+        user_input[CONF_ROUTERS] = [
+            host.strip()
+            for host in user_input.get(CONF_ROUTERS, "").split(",")
+            if host.strip()
+        ]
+
         try:
             info = await self.validate_input(self.hass, user_input)
         except CannotConnect:
@@ -86,6 +128,97 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         return self.async_create_entry(title=info["title"], data=user_input)
 
 
+class OptionsFlowHandler(config_entries.OptionsFlow):
+    """Handle Helvar options."""
+
+    def __init__(self, config_entry):
+        """Initialize the options flow."""
+        self.config_entry = config_entry
+
+    async def async_step_init(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Manage the Helvar options."""
+        if user_input is not None:
+            return self.async_create_entry(title="", data=user_input)
+
+        options = self.config_entry.options
+
+        schema = {
+            vol.Optional(
+                CONF_FLUSH_INTERVAL,
+                default=options.get(CONF_FLUSH_INTERVAL, DEFAULT_FLUSH_INTERVAL),
+            ): vol.All(vol.Coerce(int), vol.Range(min=0, max=5000)),
+            vol.Optional(
+                CONF_STATE_WRITE_WINDOW,
+                default=options.get(
+                    CONF_STATE_WRITE_WINDOW, DEFAULT_STATE_WRITE_WINDOW
+                ),
+            ): vol.All(vol.Coerce(int), vol.Range(min=0, max=5000)),
+            vol.Optional(
+                CONF_POLL_RATE,
+                default=options.get(CONF_POLL_RATE, DEFAULT_POLL_RATE),
+            ): vol.All(vol.Coerce(float), vol.Range(min=0, max=50)),
+            vol.Optional(
+                CONF_PIPELINE_WINDOW,
+                default=options.get(CONF_PIPELINE_WINDOW, DEFAULT_PIPELINE_WINDOW),
+            ): vol.All(vol.Coerce(int), vol.Range(min=1, max=64)),
+            vol.Optional(
+                CONF_SYNC_INTERVAL,
+                default=options.get(CONF_SYNC_INTERVAL, DEFAULT_SYNC_INTERVAL),
+            ): vol.All(vol.Coerce(int), vol.Range(min=0, max=1440)),
+            vol.Optional(
+                CONF_FIRE_EVENTS, default=options.get(CONF_FIRE_EVENTS, True)
+            ): bool,
+        }
+
+        groups = self._groups()
+        if groups:
+            for key in (CONF_DISABLED_GROUPS, CONF_EVENT_GROUPS):
+                schema[_multi_select_key(options, key, groups)] = cv.multi_select(
+                    groups
+                )
+
+        clusters = self._clusters()
+        if clusters:
+            schema[
+                _multi_select_key(options, CONF_EVENT_CLUSTERS, clusters)
+            ] = cv.multi_select(clusters)
+
+        return self.async_show_form(step_id="init", data_schema=vol.Schema(schema))
+
+    def _groups(self):
+        """Return the names of the router's groups by id, if it is set up."""
+        router = self.hass.data.get(DOMAIN, {}).get(self.config_entry.entry_id)
+        if router is None or router.api is None:
+            return {}
+        return {
+            str(group_id): group.name or f"Group {group_id}"
+            for group_id, group in sorted(router.api.groups.groups.items())
+        }
+
+    def _clusters(self):
+        """Return the names of the workgroup's clusters by id, if it is set up."""
+        router = self.hass.data.get(DOMAIN, {}).get(self.config_entry.entry_id)
+        if router is None or router.api is None:
+            return {}
+        return {
+            str(cluster_id): f"Cluster {cluster_id}"
+            for cluster_id in sorted({cluster_id for cluster_id, _ in router.routers})
+        }
+
+
+def _multi_select_key(options, key, choices):
+    """Return the schema key of a multi-select, defaulting to its chosen values.
+
+    Choices that no longer exist are dropped.
+    """
+    return vol.Optional(
+        key,
+        default=[choice for choice in options.get(key, []) if choice in choices],
+    )
+
+
 class CannotConnect(HomeAssistantError):
     """Error to indicate we cannot connect."""
 
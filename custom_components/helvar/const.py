@@ -2,10 +2,43 @@
 
 DOMAIN = "helvar"
 
+# Dispatcher signal, formatted with the config entry id.
+SIGNAL_SCENES_UPDATED = "helvar_scenes_updated_{}"
+SIGNAL_AVAILABILITY = "helvar_availability_{}"
+# Sent with a TopologyDiff when devices or groups are added or removed.
+SIGNAL_TOPOLOGY_UPDATED = "helvar_topology_updated_{}"
+
+# Home Assistant events fired from router notifications.
+EVENT_SCENE_RECALLED = "helvar_scene_recalled"
+EVENT_LEVEL_CHANGED = "helvar_level_changed"
+
 CONF_HOST = "host"
 CONF_PORT = "port"
+CONF_ROUTERS = "routers"
+CONF_STATE_WRITE_WINDOW = "state_write_window"
+CONF_POLL_RATE = "poll_rate"
+CONF_FLUSH_INTERVAL = "flush_interval"
+CONF_PIPELINE_WINDOW = "pipeline_window"
+CONF_DISABLED_GROUPS = "disabled_groups"
+CONF_SYNC_INTERVAL = "sync_interval"
+CONF_FIRE_EVENTS = "fire_events"
+CONF_EVENT_GROUPS = "event_groups"
+CONF_EVENT_CLUSTERS = "event_clusters"
 
 DEFAULT_PORT = 50000
+# Milliseconds between flushes of coalesced device commands.
+DEFAULT_FLUSH_INTERVAL = 100
+# Milliseconds to collect router notifications for before writing entity state.
+DEFAULT_STATE_WRITE_WINDOW = 50
+# Device level queries per second used to reconcile drifted levels. 0 disables it.
+DEFAULT_POLL_RATE = 1.0
+# Queries allowed to wait for a reply from the router at once.
+DEFAULT_PIPELINE_WINDOW = 4
+# Minutes between checks for configuration changes on the routers. 0 disables them.
+DEFAULT_SYNC_INTERVAL = 10
+# Entities created and added at a time during setup, yielding to the event loop
+# between pages.
+ENTITY_PAGE_SIZE = 100
 
 DEFAULT_ON_GROUP_SCENE = 1
 DEFAULT_ON_GROUP_BLOCK = 1
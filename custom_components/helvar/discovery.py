@@ -0,0 +1,235 @@
+"""Parallel discovery of a Helvar workgroup."""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from collections.abc import Callable
+import logging
+
+import aiohelvar
+
+from .sync import (
+    async_apply_configuration,
+    async_read_configuration,
+    async_read_device,
+)
+from .topology import TopologyDiff, address_from_string
+
+_LOGGER = logging.getLogger(__name__)
+
+# Discovered devices are handed on in batches of up to this many, or whatever
+# has arrived after BATCH_DELAY seconds, so entities can be added in bulk
+# without keeping any device waiting for long.
+BATCH_SIZE = 25
+BATCH_DELAY = 0.5
+
+
+def _subnet_key(address_string: str) -> str:
+    """Return the cluster.router.subnet part of a device's storage address."""
+    return address_string.rsplit(".", 1)[0]
+
+
+class WorkgroupDiscovery:
+    """Discover every device, group and scene in a workgroup.
+
+    aiohelvar discovers one query at a time. Here the cheap configuration is read
+    first, which lists every device. The devices are then read in parallel, a
+    worker per slot of the pipeline window on each subnet, so every subnet makes
+    progress at once without more queries in flight than the routers allow.
+    Devices are registered in batches as soon as they have been read, and each
+    batch is handed to on_devices as it is registered, so anything that looks at
+    the registry and listens to on_devices sees every device exactly once.
+    Groups and scenes are registered once every device has been.
+    """
+
+    def __init__(
+        self,
+        pipeline,
+        routers: list,
+        on_devices: Callable[[list], None] | None = None,
+    ):
+        """Initialize the discovery.
+
+        routers are aiohelvar routers for the workgroup, connected, with the one
+        that holds the registry of the whole workgroup first.
+        """
+        self.pipeline = pipeline
+        self.routers = routers
+        self.on_devices = on_devices
+        self.configuration = None
+        # The timeout that stopped the discovery, if one did.
+        self.error = None
+        # Devices, discovered and failed on each subnet, keyed by cluster.router.subnet.
+        self.progress = {}
+        self._owners = {(api.cluster_id, api.router_id): api for api in routers}
+        self._batch = []
+        self._batch_timer = None
+        self._done = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        """Return True once the discovery has finished, or has given up."""
+        return self._done.is_set()
+
+    @property
+    def failed(self) -> int:
+        """Return the number of devices that didn't answer."""
+        return sum(subnet["failed"] for subnet in self.progress.values())
+
+    @property
+    def percent(self):
+        """Return how much of the workgroup has been read, or None before it's known."""
+
+        if self.configuration is None:
+            return None
+        if self.done and self.error is None:
+            return 100.0
+
+        total = sum(subnet["devices"] for subnet in self.progress.values())
+        read = sum(
+            subnet["discovered"] + subnet["failed"] for subnet in self.progress.values()
+        )
+        return round(read / total * 100, 1) if total else 0.0
+
+    async def async_wait(self):
+        """Wait until the discovery has finished."""
+        await self._done.wait()
+
+    async def async_read_configuration(self) -> dict:
+        """Read the workgroup's configuration, which lists every device.
+
+        It only takes a few queries per router and group, so it is quick enough to
+        wait for before the entry is set up.
+        """
+
+        self.configuration = await async_read_configuration(
+            self.pipeline, self.routers
+        )
+        if self.configuration["workgroup_name"]:
+            self.routers[0].workgroup_name = self.configuration["workgroup_name"]
+
+        self.progress = {}
+        for address_string in self.configuration["devices"]:
+            subnet = self.progress.setdefault(
+                _subnet_key(address_string),
+                {"devices": 0, "discovered": 0, "failed": 0},
+            )
+            subnet["devices"] += 1
+
+        return self.configuration
+
+    async def async_read_devices(self):
+        """Read every device, then register the groups and scenes.
+
+        Devices that don't answer are counted as failed and left out. A timeout
+        reading the groups or scenes ends the discovery, keeping what was read.
+        """
+
+        try:
+            await self._async_read_workgroup()
+        except (asyncio.TimeoutError, aiohelvar.CommandResponseTimeout) as err:
+            self.error = err
+            raise
+        finally:
+            self._done.set()
+
+    async def _async_read_workgroup(self):
+        """Read every device, then register the groups and scenes."""
+
+        if self.configuration is None:
+            await self.async_read_configuration()
+
+        queues = {}
+        for address_string in self.configuration["devices"]:
+            queues.setdefault(_subnet_key(address_string), deque()).append(
+                address_string
+            )
+
+        try:
+            await asyncio.gather(
+                *(self._async_read_subnet(key, queue) for key, queue in queues.items())
+            )
+        finally:
+            self._async_flush()
+
+        configuration = self.configuration
+        await async_apply_configuration(
+            self.pipeline,
+            self.routers[0],
+            configuration,
+            TopologyDiff(
+                added_groups=list(configuration["groups"]),
+                changed_scenes=list(configuration["scenes"]),
+            ),
+            self.api_for,
+        )
+
+    def api_for(self, address):
+        """Return the router being discovered that owns a device address."""
+        return self._owners.get((address.block, address.router), self.routers[0])
+
+    async def _async_read_subnet(self, key, queue):
+        """Read the devices on one subnet, as many at once as the window allows."""
+
+        progress = self.progress[key]
+
+        async def async_worker():
+            while queue:
+                address_string = queue.popleft()
+                address = address_from_string(address_string)
+                owner = self.api_for(address)
+                try:
+                    device = await async_read_device(
+                        self.pipeline,
+                        owner,
+                        address,
+                        self.configuration["devices"][address_string],
+                    )
+                except (asyncio.TimeoutError, aiohelvar.CommandResponseTimeout):
+                    progress["failed"] += 1
+                    _LOGGER.warning("Helvar device %s didn't answer", address)
+                    continue
+
+                progress["discovered"] += 1
+                self._async_add_to_batch(device)
+
+        await asyncio.gather(
+            *(async_worker() for _ in range(min(self.pipeline.window, len(queue))))
+        )
+
+        _LOGGER.debug(
+            "Discovered %s of %s devices on Helvar subnet %s",
+            progress["discovered"],
+            progress["devices"],
+            key,
+        )
+
+    def _async_add_to_batch(self, device):
+        self._batch.append(device)
+        if len(self._batch) >= BATCH_SIZE:
+            self._async_flush()
+        elif self._batch_timer is None:
+            self._batch_timer = asyncio.get_running_loop().call_later(
+                BATCH_DELAY, self._async_flush
+            )
+
+    def _async_flush(self):
+        """Register the devices read since the last batch and hand them on."""
+
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+
+        primary = self.routers[0]
+        for device in batch:
+            primary.devices.register_device(device)
+            owner = self.api_for(device.address)
+            if owner is not primary:
+                owner.devices.register_device(device)
+
+        if self.on_devices is not None:
+            self.on_devices(batch)
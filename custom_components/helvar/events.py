@@ -0,0 +1,102 @@
+"""Home Assistant events for what Helvar routers report."""
+from __future__ import annotations
+
+from homeassistant.core import callback
+
+from .const import (
+    CONF_EVENT_CLUSTERS,
+    CONF_EVENT_GROUPS,
+    CONF_FIRE_EVENTS,
+    EVENT_LEVEL_CHANGED,
+    EVENT_SCENE_RECALLED,
+)
+
+# Where a level change came from.
+SOURCE_SCENE = "scene"
+SOURCE_POLL = "poll"
+
+
+class NotificationEvents:
+    """Fire events on the Home Assistant bus for router notifications.
+
+    helvar_scene_recalled is fired for each scene recall the routers report, and
+    helvar_level_changed for each device level set by a recall or found to have
+    drifted by the level reconciler. Automations get every event, rather than
+    whatever entity state is left after a batch of writes.
+
+    Events can be limited to some groups and clusters, so a busy site doesn't
+    flood the event bus. Groups span the workgroup, so scene recalls are only
+    filtered by group. Level changes pass if the device is in one of the groups
+    and on one of the clusters. An empty filter lets everything through.
+    """
+
+    def __init__(self, hass, router):
+        """Initialize from the router's options."""
+        self.hass = hass
+        self.router = router
+        options = router.config_entry.options
+        self.enabled = options.get(CONF_FIRE_EVENTS, True)
+        self.groups = {int(group_id) for group_id in options.get(CONF_EVENT_GROUPS, [])}
+        self.clusters = {
+            int(cluster) for cluster in options.get(CONF_EVENT_CLUSTERS, [])
+        }
+        self.stats = {"fired": 0, "filtered": 0}
+
+    def wants_group(self, group_id) -> bool:
+        """Return True if events are fired for a group."""
+        return self.enabled and (not self.groups or int(group_id) in self.groups)
+
+    def wants_device(self, address) -> bool:
+        """Return True if level events are fired for a device."""
+
+        if not self.enabled:
+            return False
+        if self.clusters and address.block not in self.clusters:
+            return False
+        return not self.groups or not self.groups.isdisjoint(
+            self.router.groups_of(address)
+        )
+
+    @callback
+    def async_scene_recalled(self, scene_address):
+        """Fire helvar_scene_recalled for a scene a group was set to."""
+
+        if not self.wants_group(scene_address.group):
+            self.stats["filtered"] += 1
+            return
+
+        scene = self.router.api.scenes.scenes.get(scene_address)
+        self._async_fire(
+            EVENT_SCENE_RECALLED,
+            {
+                "group": scene_address.group,
+                "block": scene_address.block,
+                "scene": scene_address.scene,
+                "scene_address": str(scene_address),
+                "name": None if scene is None else scene.name,
+            },
+        )
+
+    @callback
+    def async_level_changed(self, device, source, scene_address=None):
+        """Fire helvar_level_changed for the new level of a device."""
+
+        if not self.wants_device(device.address):
+            self.stats["filtered"] += 1
+            return
+
+        self._async_fire(
+            EVENT_LEVEL_CHANGED,
+            {
+                "address": str(device.address),
+                "name": device.name,
+                "level": device.load_level,
+                "source": source,
+                "scene_address": None if scene_address is None else str(scene_address),
+            },
+        )
+
+    def _async_fire(self, event_type, data):
+        data["entry_id"] = self.router.config_entry.entry_id
+        self.hass.bus.async_fire(event_type, data)
+        self.stats["fired"] += 1
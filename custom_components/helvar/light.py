@@ -1,4 +1,5 @@
 """Support for Helvar light devices."""
+from itertools import chain
 import logging
 
 import aiohelvar
@@ -6,13 +7,28 @@ import aiohelvar
 # Import the device class from the component that you want to support
 from homeassistant.components.light import (
     ATTR_BRIGHTNESS,
+    ATTR_TRANSITION,
+    DOMAIN as LIGHT_DOMAIN,
     LightEntity,
+    LightEntityFeature,
     ColorMode,
 )
-
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+
+from .capabilities import (
+    KIND_EMERGENCY,
+    KIND_SWITCH,
+    LIGHT_KINDS,
+    emergency_status,
+    load_members,
+)
 from .const import (  # DEFAULT_OFF_GROUP_BLOCK,; DEFAULT_OFF_GROUP_SCENE,; DEFAULT_ON_GROUP_BLOCK,; DEFAULT_ON_GROUP_SCENE,; VALID_OFF_GROUP_SCENES,
     DOMAIN as HELVAR_DOMAIN,
 )
+from .paging import async_add_paged, async_remove_entities
+from .protocol import transition_to_fade_time
+from .topology import address_from_string
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -26,44 +42,136 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
 
     router = hass.data[HELVAR_DOMAIN][config_entry.entry_id]
 
-    # Add devices
-    # async_add_entities(
-    #     # Add groups
-    #     HelvarLight(group, None, router)
-    #     for group in router.api.groups.groups.values()
-    # )
-
+    # Devices and groups are still being registered while the workgroup is
+    # discovered. Those registered from here on come through the topology signal,
+    # which is connected before anything is awaited, so each gets one entity.
     devices = [
-        HelvarLight(device, router) for device in router.api.devices.get_light_devices()
+        device
+        for device in router.api.devices.get_light_devices()
+        if _is_light(router, device)
+    ]
+    groups = [
+        group
+        for group in router.api.groups.groups.values()
+        if load_members(router.api, group)
     ]
 
-    _LOGGER.info("Adding %s helvar devices", len(devices))
+    @callback
+    def async_topology_updated(diff):
+        """Add and remove lights for devices and groups that came or went."""
+
+        async_remove_entities(
+            hass,
+            LIGHT_DOMAIN,
+            [
+                *(
+                    _light_unique_id(address_from_string(address))
+                    for address in diff.removed_devices
+                ),
+                *(_group_light_unique_id(group_id) for group_id in diff.removed_groups),
+            ],
+        )
+
+        added = [
+            HelvarLight(device, router)
+            for device in (
+                router.api.devices.devices.get(address_from_string(address))
+                for address in diff.added_devices
+            )
+            if device is not None and _is_light(router, device)
+        ]
+        added += [
+            HelvarGroupLight(group, router)
+            for group in (
+                router.api.groups.groups.get(int(group_id))
+                for group_id in diff.added_groups
+            )
+            if group is not None and load_members(router.api, group)
+        ]
+        if added:
+            async_add_entities(added)
+
+    config_entry.async_on_unload(
+        async_dispatcher_connect(
+            hass, router.topology_updated_signal, async_topology_updated
+        )
+    )
+
+    added = await async_add_paged(
+        async_add_entities,
+        chain(
+            (HelvarLight(device, router) for device in devices),
+            (HelvarGroupLight(group, router) for group in groups),
+        ),
+    )
+
+    _LOGGER.info("Added %s helvar lights and group lights", added)
+
+
+def _light_unique_id(address):
+    """Return the unique id of the light for a device address."""
+    return f"{address}-light"
+
+
+def _group_light_unique_id(group_id):
+    """Return the unique id of the light for a group."""
+    return f"{group_id}-group-light"
+
+
+def _fade_time(kwargs):
+    """Return the fade time for a service call's transition, or None if it has none."""
+    if ATTR_TRANSITION not in kwargs:
+        return None
+    return transition_to_fade_time(kwargs[ATTR_TRANSITION])
+
 
-    async_add_entities(devices)
+def _is_light(router, device):
+    """Return True if a device should be shown as a light."""
+    return device.is_light and router.device_kind(device) in LIGHT_KINDS
 
 
 class HelvarLight(LightEntity):
-    """Representation of a Helvar Light."""
+    """Representation of a Helvar Light.
+
+    Switching devices, such as relays, are on/off lights without transitions.
+    Everything else with a level is dimmable.
+    """
 
     def __init__(self, device: aiohelvar.devices.Device, router):
         """Initialize an HelvarLight."""
         self.router = router
         self.device = device
+        self.kind = router.device_kind(device)
+        if self.kind == KIND_SWITCH:
+            self._attr_supported_features = LightEntityFeature(0)
+            self._attr_color_mode = ColorMode.ONOFF
+        else:
+            self._attr_supported_features = LightEntityFeature.TRANSITION
+            self._attr_color_mode = ColorMode.BRIGHTNESS
+        self._attr_supported_color_modes = {self._attr_color_mode}
+        self._attr_entity_registry_enabled_default = not router.in_disabled_groups(
+            device.address
+        )
 
-        self.register_subscription()
-
-    def register_subscription(self):
-        """Register subscription."""
-
-        async def async_router_callback_device(device):
-
-            _LOGGER.debug("Received status update for %s", device)
+    async def async_added_to_hass(self):
+        """Make the light reachable from router-wide updates."""
+        self.router.lights[self.device.address] = self
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                self.router.availability_signal,
+                self._async_availability_changed,
+            )
+        )
 
-            self.async_write_ha_state()
+    @callback
+    def _async_availability_changed(self):
+        """Write state when the router connection goes up or down."""
+        self.router.state_writer.async_schedule_write(self)
 
-        self.router.api.devices.register_subscription(
-            self.device.address, async_router_callback_device
-        )
+    async def async_will_remove_from_hass(self):
+        """Stop receiving router-wide updates."""
+        self.router.lights.pop(self.device.address, None)
 
     @property
     def unique_id(self):
@@ -75,7 +183,12 @@ class HelvarLight(LightEntity):
         We use the device's bus network address which is at least guaranteed to be unique at any point in time.
 
         """
-        return f"{self.device.address}-light"
+        return _light_unique_id(self.device.address)
+
+    @property
+    def available(self):
+        """Return True if the router that owns this light is reachable."""
+        return self.router.is_available(self.device.address)
 
     @property
     def name(self):
@@ -88,9 +201,11 @@ class HelvarLight(LightEntity):
 
         This method is optional. Removing it indicates to Home Assistant
         that brightness is not supported for this light.
+
+        A level just asked for is shown until the router confirms or refutes it.
         """
 
-        return self.device.brightness
+        return self.router.optimistic.brightness(self.device)
 
     @property
     def is_on(self):
@@ -101,52 +216,30 @@ class HelvarLight(LightEntity):
         return False
 
     @property
-    def supported_color_modes(self):
-        """Colour modes."""
+    def extra_state_attributes(self):
+        """Return the emergency state of an emergency fitting."""
+        if self.kind != KIND_EMERGENCY:
+            return None
+        return emergency_status(self.device)
 
-        return [ColorMode.BRIGHTNESS]
-
-    @property
-    def color_mode(self):
-        """Return the color mode of the light."""
+    async def async_turn_on(self, **kwargs):
+        """Instruct the light to turn on."""
 
-        # We only support brightness for now.
-        return ColorMode.BRIGHTNESS
+        if self.kind == KIND_SWITCH:
+            brightness = 255
+        else:
+            brightness = kwargs.get(ATTR_BRIGHTNESS, 255)
 
-    async def async_turn_on(self, **kwargs):
-        """We'll just select scene 1 for a group, for now."""
-
-        brightness = kwargs.get(ATTR_BRIGHTNESS, 255)
-
-        # if self.is_group:
-        #     await self._router.api.groups.set_scene(
-        #         aiohelvar.parser.address.SceneAddress(
-        #             self._group.group_id, DEFAULT_ON_GROUP_BLOCK, DEFAULT_ON_GROUP_SCENE
-        #         )
-        #     )
-        # else:
-        # For now, set the device level directly. But we may want to set the device scene as we do with
-        # groups.
-
-        await self.router.api.devices.set_device_brightness(
-            self.device.address, brightness
+        await self.router.scheduler.async_set_brightness(
+            self.device.address, brightness, _fade_time(kwargs)
         )
 
     async def async_turn_off(self, **kwargs):
         """Instruct the light to turn off."""
 
-        # if self.is_group:
-        #     await self._router.api.groups.set_scene(
-        #         aiohelvar.parser.address.SceneAddress(
-        #             self._group.group_id,
-        #             DEFAULT_OFF_GROUP_BLOCK,
-        #             DEFAULT_OFF_GROUP_SCENE,
-        #         )
-        #     )
-        # else:
-        # For now, set the device level directly. But we may want to set the device scene as we do with
-        # groups.
-        await self.router.api.devices.set_device_brightness(self.device.address, 0)
+        await self.router.scheduler.async_set_brightness(
+            self.device.address, 0, _fade_time(kwargs)
+        )
 
     # async def async_update(self):
     #     """Fetch new state data for this light.
@@ -156,3 +249,91 @@ class HelvarLight(LightEntity):
     #     # the underlying objects are automatically updated, and all properties read directly from
     #     # those objects.
     #     return True
+
+
+class HelvarGroupLight(LightEntity):
+    """Representation of a Helvar group as one light.
+
+    The whole group is dimmed with a single group command, however many devices
+    are in it.
+    """
+
+    _attr_supported_features = LightEntityFeature.TRANSITION
+    _attr_supported_color_modes = {ColorMode.BRIGHTNESS}
+    _attr_color_mode = ColorMode.BRIGHTNESS
+
+    def __init__(self, group: aiohelvar.groups.Group, router):
+        """Initialize a HelvarGroupLight."""
+        self.router = router
+        self.group = group
+        self._attr_entity_registry_enabled_default = (
+            int(group.group_id) not in router.disabled_groups
+        )
+
+    async def async_added_to_hass(self):
+        """Make the group reachable from router-wide updates."""
+        self.router.group_lights[int(self.group.group_id)] = self
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                self.router.availability_signal,
+                self._async_availability_changed,
+            )
+        )
+
+    @callback
+    def _async_availability_changed(self):
+        """Write state when the router connection goes up or down."""
+        self.router.state_writer.async_schedule_write(self)
+
+    async def async_will_remove_from_hass(self):
+        """Stop receiving router-wide updates."""
+        self.router.group_lights.pop(int(self.group.group_id), None)
+
+    @property
+    def unique_id(self):
+        """Get unique id."""
+        return _group_light_unique_id(self.group.group_id)
+
+    @property
+    def available(self):
+        """Return True if the router is reachable."""
+        return self.router.available
+
+    @property
+    def name(self):
+        """Return the display name of this group."""
+        return f"Group: {self.group.name}"
+
+    @property
+    def brightness(self):
+        """Return the average brightness of the members that are on."""
+
+        levels = [
+            brightness
+            for brightness in (
+                self.router.optimistic.brightness(device)
+                for device in load_members(self.router.api, self.group)
+            )
+            if brightness > 0
+        ]
+        if not levels:
+            return 0
+        return round(sum(levels) / len(levels))
+
+    @property
+    def is_on(self):
+        """Return true if any member is on."""
+        return self.brightness > 0
+
+    async def async_turn_on(self, **kwargs):
+        """Set every device in the group to the same level."""
+        await self.router.scheduler.async_set_group_brightness(
+            self.group.group_id, kwargs.get(ATTR_BRIGHTNESS, 255), _fade_time(kwargs)
+        )
+
+    async def async_turn_off(self, **kwargs):
+        """Turn every device in the group off."""
+        await self.router.scheduler.async_set_group_brightness(
+            self.group.group_id, 0, _fade_time(kwargs)
+        )
@@ -0,0 +1,291 @@
+"""Optimistic device levels for a Helvar router."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+import logging
+import time
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds, on top of any fade and the reconciler's backlog, to wait for a level
+# that was sent to be read back before the prediction is given up on. Covers the
+# reconciler's delay for recently changed devices and a few rounds of backoff.
+CONFIRM_TIMEOUT = 15.0
+# Brightness steps a level read back may be off by and still match. Levels are
+# sent with one decimal place and truncated when converted back.
+TOLERANCE = 1
+
+
+@dataclass(slots=True)
+class Prediction:
+    """A level a device was asked for, and what to go back to if it isn't."""
+
+    brightness: int
+    previous: float
+    # When the fade should have finished, and when to stop waiting for the
+    # level to be read back, once the command has been sent.
+    settled: float | None = None
+    deadline: float | None = None
+
+
+def _router_key(address) -> str:
+    """Return the cluster.router an address belongs to, as shown in metrics."""
+    return f"{address.block}.{address.router}"
+
+
+class OptimisticLevels:
+    """Show the level a device was asked for until the router confirms it.
+
+    A command waits for a flush, the router's own spacing and any fade before
+    its level can be read back, so entities would show the old level for a round
+    trip or longer. Instead the level is predicted as soon as it is queued, and
+    held until one of:
+
+    - the reconciler reads the device back once the fade is over. A match
+      confirms the prediction, anything else is a divergence and the level read
+      wins.
+    - the command is held because the router is unreachable, or the link drops
+      before it is confirmed. The device goes back to its level before the
+      command and is queued for a query.
+    - nothing is read back within CONFIRM_TIMEOUT of the reconciler getting
+      through its backlog after the fade. The command was sent and nothing
+      contradicts it, so the prediction is dropped, and counted as expired.
+
+    Without level reconciliation nothing is read back, so a prediction is
+    confirmed once its command has been sent. While paused, such as while the
+    router is overloaded and reconciliation is paused too, nothing expires, and
+    deadlines are pushed back by however long the pause lasted.
+
+    Outcomes are counted for each router in the workgroup.
+    """
+
+    def __init__(self, hass, router):
+        """Initialize the predictions."""
+        self.hass = hass
+        self.router = router
+        self.read_back = bool(router.poll_rate)
+        self.paused = False
+        self.predictions = {}
+        # Outcome counts keyed by cluster.router.
+        self.stats = {}
+        self._unsub_expire = None
+        self._paused_at = None
+
+    @property
+    def divergence(self):
+        """Return the percentage of read back predictions that were wrong."""
+
+        confirmed = sum(stats["confirmed"] for stats in self.stats.values())
+        diverged = sum(stats["diverged"] for stats in self.stats.values())
+        if not confirmed + diverged:
+            return None
+        return round(diverged / (confirmed + diverged) * 100, 1)
+
+    def brightness(self, device) -> int:
+        """Return the predicted brightness of a device, or its known one."""
+
+        prediction = self.predictions.get(device.address)
+        return device.brightness if prediction is None else prediction.brightness
+
+    def _count(self, address, outcome):
+        stats = self.stats.setdefault(
+            _router_key(address),
+            {
+                "predicted": 0,
+                "confirmed": 0,
+                "diverged": 0,
+                "rolled_back": 0,
+                "expired": 0,
+            },
+        )
+        stats[outcome] += 1
+
+    @callback
+    def async_predict(self, address, brightness: int):
+        """Show a device at brightness until the router confirms it.
+
+        A prediction made while another is pending replaces it, but keeps the
+        level to roll back to. The fade is only known to matter once the command
+        is sent, so it is given to async_sent.
+        """
+
+        device = self.router.api_for(address).devices.devices.get(address)
+        if device is None or not device.is_load:
+            return
+
+        pending = self.predictions.get(address)
+        self.predictions[address] = Prediction(
+            brightness,
+            float(device.load_level) if pending is None else pending.previous,
+        )
+        self._count(address, "predicted")
+        self.router.async_schedule_device_write(address)
+
+    @callback
+    def async_sent(self, address, fade: float = 0):
+        """Note a predicted level has been sent, and when it should have settled.
+
+        The wait for the level to be read back starts now, and allows for every
+        device the reconciler has to query first.
+        """
+
+        prediction = self.predictions.get(address)
+        if prediction is None:
+            return
+
+        if not self.read_back:
+            del self.predictions[address]
+            self._count(address, "confirmed")
+            return
+
+        prediction.settled = time.monotonic() + fade
+        prediction.deadline = (
+            prediction.settled + self.router.reconciler.backlog + CONFIRM_TIMEOUT
+        )
+        self._schedule_expiry()
+
+    @callback
+    def async_confirm(self, address, level: float, queried: float):
+        """Compare a level read back from the router with the prediction.
+
+        queried is when the query was sent. Reads from before the fade finished
+        say nothing about the prediction and are ignored.
+        """
+
+        prediction = self.predictions.get(address)
+        if prediction is None or prediction.settled is None:
+            return
+        if queried < prediction.settled:
+            return
+
+        del self.predictions[address]
+        if abs(int(level * 2.55) - prediction.brightness) <= TOLERANCE:
+            self._count(address, "confirmed")
+            return
+
+        _LOGGER.debug(
+            "Predicted brightness %s for %s, router has level %s",
+            prediction.brightness,
+            address,
+            level,
+        )
+        self._count(address, "diverged")
+        # The reconciler corrects the level, which writes the state.
+
+    @callback
+    def async_roll_back(self, address):
+        """Go back to the level a device had before its pending prediction."""
+
+        prediction = self.predictions.pop(address, None)
+        if prediction is None:
+            return
+
+        _LOGGER.debug(
+            "Rolling back predicted brightness %s for %s",
+            prediction.brightness,
+            address,
+        )
+        self._count(address, "rolled_back")
+
+        # aiohelvar applies a level locally as soon as it is queued to send, so
+        # the old one is put back here too.
+        device = self.router.api_for(address).devices.devices.get(address)
+        if device is not None:
+            device.load_level = prediction.previous
+        self.router.async_schedule_device_write(address)
+        self.router.reconciler.async_mark_changed(address)
+
+    @callback
+    def async_roll_back_router(self, key):
+        """Roll back every prediction on a router, keyed by cluster and router id."""
+
+        for address in [
+            address
+            for address in self.predictions
+            if (address.block, address.router) == key
+        ]:
+            self.async_roll_back(address)
+
+    @callback
+    def async_set_paused(self, paused: bool):
+        """Stop predictions expiring, or let them expire again.
+
+        Deadlines are moved back by the time spent paused, so every prediction
+        still gets its full wait for a read back.
+        """
+
+        if paused == self.paused:
+            return
+        self.paused = paused
+
+        if paused:
+            self._paused_at = time.monotonic()
+            if self._unsub_expire is not None:
+                self._unsub_expire()
+                self._unsub_expire = None
+            return
+
+        elapsed = time.monotonic() - self._paused_at
+        self._paused_at = None
+        for prediction in self.predictions.values():
+            if prediction.deadline is not None:
+                prediction.deadline += elapsed
+        self._schedule_expiry()
+
+    @callback
+    def async_forget(self, address):
+        """Drop a prediction the router has since overridden, without counting it."""
+        self.predictions.pop(address, None)
+
+    def _schedule_expiry(self):
+        """Start the expiry timer for the earliest deadline, if it isn't running."""
+
+        if self._unsub_expire is not None or self.paused:
+            return
+
+        deadline = min(
+            (
+                prediction.deadline
+                for prediction in self.predictions.values()
+                if prediction.deadline is not None
+            ),
+            default=None,
+        )
+        if deadline is None:
+            return
+        self._unsub_expire = async_call_later(
+            self.hass, max(deadline - time.monotonic(), 0), self._async_expire
+        )
+
+    @callback
+    def _async_expire(self, _now):
+        """Drop sent predictions that nothing has read back in time.
+
+        The level stays as sent, as aiohelvar applied it when sending.
+        """
+
+        self._unsub_expire = None
+        if self.paused:
+            return
+
+        now = time.monotonic()
+        for address in [
+            address
+            for address, prediction in self.predictions.items()
+            if prediction.deadline is not None and prediction.deadline <= now
+        ]:
+            del self.predictions[address]
+            self._count(address, "expired")
+            self.router.async_schedule_device_write(address)
+        self._schedule_expiry()
+
+    @callback
+    def async_shutdown(self):
+        """Stop the expiry timer."""
+
+        if self._unsub_expire is not None:
+            self._unsub_expire()
+            self._unsub_expire = None
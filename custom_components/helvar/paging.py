@@ -0,0 +1,63 @@
+"""Adding and removing Helvar entities in bulk."""
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Iterable
+
+from homeassistant.core import callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.entity import Entity
+
+from .const import DOMAIN, ENTITY_PAGE_SIZE
+
+
+async def async_add_paged(
+    async_add_entities,
+    entities: Iterable[Entity],
+    page_size: int = ENTITY_PAGE_SIZE,
+) -> int:
+    """Add entities to Home Assistant a page at a time.
+
+    entities can be a generator, so each entity is only created when its page is
+    reached. The event loop gets a turn between pages, so a site with thousands of
+    devices doesn't hold up startup. Returns the number of entities added.
+    """
+
+    added = 0
+    page = []
+
+    for entity in entities:
+        page.append(entity)
+        if len(page) < page_size:
+            continue
+        async_add_entities(page)
+        added += len(page)
+        page = []
+        await asyncio.sleep(0)
+
+    if page:
+        async_add_entities(page)
+        added += len(page)
+
+    return added
+
+
+@callback
+def async_remove_entities(hass, platform: str, unique_ids: Iterable[str]) -> int:
+    """Remove entities from Home Assistant by unique id.
+
+    They are removed from the entity registry, which also removes any that are
+    added, so disabled entities go too. Returns the number removed.
+    """
+
+    registry = er.async_get(hass)
+    removed = 0
+
+    for unique_id in unique_ids:
+        entity_id = registry.async_get_entity_id(platform, DOMAIN, unique_id)
+        if entity_id is None:
+            continue
+        registry.async_remove(entity_id)
+        removed += 1
+
+    return removed
@@ -0,0 +1,181 @@
+"""Pipelined HelvarNet requests for a Helvar router."""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+import logging
+import time
+
+import aiohelvar
+from aiohelvar.parser.command_type import COMMAND_TYPES_DONT_LISTEN_FOR_RESPONSE
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds to wait for a reply before giving up on a query.
+QUERY_TIMEOUT = 10.0
+# Number of recent samples latency percentiles are worked out from.
+SAMPLE_SIZE = 1000
+# Seconds event rates are averaged over.
+RATE_WINDOW = 60.0
+
+
+class LatencyTracker:
+    """Rolling record of command round-trip times."""
+
+    def __init__(self, size: int = SAMPLE_SIZE):
+        """Initialize the tracker."""
+        self.samples = deque(maxlen=size)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def record(self, latency: float):
+        """Record one round-trip time, in seconds."""
+        self.samples.append(latency)
+
+    def percentile(self, percent: float):
+        """Return the given percentile of recent latencies, or None with no samples."""
+
+        if not self.samples:
+            return None
+
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+        return ordered[index]
+
+    def percentiles(self):
+        """Return the p50, p95 and p99 latencies."""
+        return {
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class RateTracker:
+    """Rolling count of events per second.
+
+    Events are kept for as long as they are inside the window, however many
+    there are, so a busy router's rate isn't capped.
+    """
+
+    def __init__(self, window: float = RATE_WINDOW):
+        """Initialize the tracker.
+
+        window is the number of seconds the rate is averaged over.
+        """
+        self.window = window
+        self.times = deque()
+        self.total = 0
+
+    def record(self):
+        """Record one event now."""
+
+        now = time.monotonic()
+        self.times.append(now)
+        self.total += 1
+        self._expire(now)
+
+    def rate(self):
+        """Return events per second over the last window seconds."""
+
+        self._expire(time.monotonic())
+        return len(self.times) / self.window
+
+    def _expire(self, now):
+        """Drop events older than the window."""
+
+        times = self.times
+        while times and now - times[0] > self.window:
+            times.popleft()
+
+
+class CommandPipeline:
+    """Keep several requests in flight on one router connection.
+
+    aiohelvar matches replies to requests, so queries can overlap. The window
+    bounds how many wait for a reply at once, so a burst of queries can't swamp
+    the router. Commands the router doesn't reply to don't take a slot at all.
+
+    Latency and commands sent are tracked for the workgroup as a whole, and for
+    each router, keyed by cluster and router id.
+    """
+
+    def __init__(self, window: int):
+        """Initialize the pipeline.
+
+        window is the most queries allowed to wait for a reply at once.
+        """
+        self.window = window
+        self.latency = LatencyTracker()
+        self.commands = RateTracker()
+        self.router_latency = {}
+        self.router_commands = {}
+        self.stats = {"queries": 0, "sent": 0, "timeouts": 0}
+        self._slots = asyncio.Semaphore(window)
+        self._in_flight = 0
+
+    def latency_for(self, key) -> LatencyTracker:
+        """Return the latency tracker of one router."""
+        return self.router_latency.setdefault(key, LatencyTracker())
+
+    def commands_for(self, key) -> RateTracker:
+        """Return the sent command tracker of one router."""
+        return self.router_commands.setdefault(key, RateTracker())
+
+    def record_command(self, api):
+        """Record a command sent to a router, however it was sent."""
+        self.commands.record()
+        self.commands_for(_router_key(api)).record()
+
+    @property
+    def in_flight(self):
+        """Return the number of queries waiting for a reply."""
+        return self._in_flight
+
+    async def async_send(self, api, command):
+        """Send a command, waiting for its reply only if the router sends one."""
+
+        if command.command_type in COMMAND_TYPES_DONT_LISTEN_FOR_RESPONSE:
+            await self.async_send_message(api, str(command))
+            return None
+
+        return await self.async_query(api, command)
+
+    async def async_send_message(self, api, message: str):
+        """Send a raw HelvarNet message the router doesn't reply to."""
+        await api.send_string(message)
+        self.stats["sent"] += 1
+        self.record_command(api)
+
+    async def async_query(self, api, command, timeout: float = QUERY_TIMEOUT):
+        """Send a query once a slot is free, and return the reply.
+
+        Raises asyncio.TimeoutError if no reply arrives within timeout seconds, or
+        aiohelvar.CommandResponseTimeout if aiohelvar gives up first.
+        """
+
+        async with self._slots:
+            self._in_flight += 1
+            started = time.monotonic()
+            try:
+                task = await api.send_command(command)
+                response = await asyncio.wait_for(task, timeout)
+            except (asyncio.TimeoutError, aiohelvar.CommandResponseTimeout):
+                self.stats["timeouts"] += 1
+                _LOGGER.debug("No reply to %s within %ss", command, timeout)
+                raise
+            finally:
+                self._in_flight -= 1
+
+        latency = time.monotonic() - started
+        self.latency.record(latency)
+        self.latency_for(_router_key(api)).record(latency)
+        self.stats["queries"] += 1
+        self.record_command(api)
+        return response
+
+
+def _router_key(api):
+    """Return the cluster and router id of an aiohelvar router."""
+    return (api.cluster_id, api.router_id)
@@ -0,0 +1,51 @@
+"""HelvarNet messages for commands aiohelvar doesn't implement."""
+from __future__ import annotations
+
+# HelvarNet command ids.
+DIRECT_LEVEL_GROUP = 13
+STORE_AS_SCENE_GROUP = 203
+
+HELVARNET_VERSION = 2
+
+# Longest fade time a HelvarNet message can carry, in hundredths of a second.
+MAX_FADE_TIME = 65535
+
+
+def brightness_to_level(brightness: int) -> float:
+    """Convert a 0-255 brightness to a 0-100 load level, as aiohelvar does."""
+    return round(brightness / 255 * 100, 1)
+
+
+def level_to_brightness(level: float) -> int:
+    """Convert a 0-100 load level to a 0-255 brightness."""
+    return round(level / 100 * 255)
+
+
+def transition_to_fade_time(transition: float) -> int:
+    """Convert a transition in seconds to a fade time in hundredths of a second.
+
+    The fade time is clamped to what a HelvarNet message can carry.
+    """
+    return min(max(round(transition * 100), 0), MAX_FADE_TIME)
+
+
+def direct_level_group(group_id: int, level: float, fade_time: int) -> str:
+    """Return a message setting every device in a group to a load level.
+
+    fade_time is in hundredths of a second.
+    """
+    return (
+        f">V:{HELVARNET_VERSION},C:{DIRECT_LEVEL_GROUP},"
+        f"G:{group_id},L:{level},F:{fade_time}#"
+    )
+
+
+def store_as_scene_group(scene_address, force: bool = False) -> str:
+    """Return a message storing the current level of every group member as a scene.
+
+    Unless force is set, members the scene is set to ignore are left out.
+    """
+    return (
+        f">V:{HELVARNET_VERSION},C:{STORE_AS_SCENE_GROUP},O:{int(force)},"
+        f"G:{scene_address.group},B:{scene_address.block},S:{scene_address.scene}#"
+    )
@@ -0,0 +1,228 @@
+"""Background reconciliation of device levels for a Helvar router."""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+import logging
+import time
+
+import aiohelvar
+from aiohelvar.parser.command import Command
+from aiohelvar.parser.command_type import CommandType
+
+from homeassistant.core import callback
+
+from .events import SOURCE_POLL
+
+_LOGGER = logging.getLogger(__name__)
+
+# Give the router this long (plus any fade) before re-reading a device we changed.
+RECENT_CHANGE_DELAY = 2.0
+# Seconds to wait for a level query before counting it as lost.
+QUERY_TIMEOUT = 5.0
+# Replies slower than this make the poller back off.
+SLOW_RESPONSE = 1.0
+MAX_BACKOFF = 32
+
+
+class LevelReconciler:
+    """Query device load levels within a budget and correct any that have drifted.
+
+    Levels change behind our back through wall panels, sensors and router timers.
+    Devices that were recently changed are queried first, then devices with a light
+    entity, least recently queried first, then everything else. A cycle ends when
+    every light device has had its turn.
+
+    Queries are started at the budgeted rate without waiting for earlier replies,
+    so a slow router doesn't eat into the budget, up to the pipeline window.
+
+    No queries are started while paused, such as while the router is overloaded.
+    """
+
+    def __init__(self, hass, router, rate: float):
+        """Initialize the reconciler.
+
+        rate is the query budget in queries per second.
+        """
+        self.hass = hass
+        self.router = router
+        self.rate = rate
+        self.backoff = 1
+        self.paused = False
+        self.last_polled = {}
+        self.last_cycle = None
+        self.stats = {"queries": 0, "corrections": 0, "timeouts": 0, "cycles": 0}
+        self._recent = {}
+        self._queue = deque()
+        self._cycle_started = None
+        self._cycle_polled = set()
+        self._polling = set()
+
+    @property
+    def interval(self):
+        """Return the current delay between queries, in seconds."""
+        return self.backoff / self.rate
+
+    @property
+    def backlog(self):
+        """Return the seconds it takes to query every recently changed device."""
+        return len(self._recent) * self.interval
+
+    @callback
+    def async_mark_changed(self, address, delay: float = 0):
+        """Query a device soon because we just changed it.
+
+        delay is any fade time, in seconds, to wait on top of the usual delay.
+        """
+        self._recent.pop(address, None)
+        self._recent[address] = time.monotonic() + RECENT_CHANGE_DELAY + delay
+
+    async def async_run(self):
+        """Query devices forever at the configured rate."""
+
+        _LOGGER.debug("Reconciling Helvar device levels at %s queries/s", self.rate)
+
+        while True:
+            if not self.paused and len(self._polling) < self.router.pipeline.window:
+                address = self._next_address()
+                if address is not None:
+                    self._start_poll(address)
+            await asyncio.sleep(self.interval)
+
+    def _start_poll(self, address):
+        """Query a device without waiting for the reply."""
+
+        self._polling.add(address)
+        task = self.hass.async_create_task(self.async_poll(address))
+        task.add_done_callback(lambda _task: self._polling.discard(address))
+
+    def _next_address(self):
+        """Return the address to query next, or None if there's nothing to do.
+
+        Devices still waiting for the reply to their last query are skipped, and
+        kept for later. A new cycle is only started if there are lights to query.
+        """
+
+        now = time.monotonic()
+        for address, ready in self._recent.items():
+            if ready <= now and address not in self._polling:
+                del self._recent[address]
+                return address
+
+        if not self._queue:
+            devices = self.router.api.devices.get_light_devices()
+            if not devices:
+                return None
+            self._finish_cycle()
+            self._start_cycle(devices)
+
+        for _ in range(len(self._queue)):
+            address = self._queue.popleft()
+            if address not in self._polling:
+                return address
+            self._queue.append(address)
+        return None
+
+    def _start_cycle(self, devices):
+        """Queue every light device, visible and least recently queried first."""
+
+        devices.sort(
+            key=lambda device: (
+                device.address not in self.router.lights,
+                self.last_polled.get(device.address, 0),
+            )
+        )
+
+        self._queue = deque(device.address for device in devices)
+        self._cycle_started = time.monotonic()
+        self._cycle_polled = set()
+
+    def _finish_cycle(self):
+        """Record coverage and staleness for the cycle that just ended."""
+
+        if self._cycle_started is None:
+            return
+
+        now = time.monotonic()
+        addresses = [
+            device.address for device in self.router.api.devices.get_light_devices()
+        ]
+
+        self.stats["cycles"] += 1
+        self.last_cycle = {
+            "duration": now - self._cycle_started,
+            "coverage": len(self._cycle_polled & set(addresses)) / len(addresses)
+            if addresses
+            else 1.0,
+            "staleness": max(
+                (
+                    now - self.last_polled.get(address, self._cycle_started)
+                    for address in addresses
+                ),
+                default=0.0,
+            ),
+        }
+
+        _LOGGER.debug(
+            "Reconciliation cycle took %.1fs: %.0f%% coverage, %.1fs stalest",
+            self.last_cycle["duration"],
+            self.last_cycle["coverage"] * 100,
+            self.last_cycle["staleness"],
+        )
+
+    def _adjust_backoff(self, latency):
+        """Slow down while the router is slow to reply, and speed up again after."""
+
+        if latency > SLOW_RESPONSE:
+            backoff = min(self.backoff * 2, MAX_BACKOFF)
+        else:
+            backoff = max(self.backoff // 2, 1)
+
+        if backoff != self.backoff:
+            _LOGGER.debug(
+                "Router replied in %.2fs, reconciliation backoff now %sx",
+                latency,
+                backoff,
+            )
+        self.backoff = backoff
+
+    async def async_poll(self, address):
+        """Query one device's load level and correct our copy if it has drifted."""
+
+        api = self.router.api_for(address)
+        started = time.monotonic()
+
+        try:
+            response = await self.router.pipeline.async_query(
+                api,
+                Command(CommandType.QUERY_DEVICE_LOAD_LEVEL, command_address=address),
+                QUERY_TIMEOUT,
+            )
+        except (asyncio.TimeoutError, aiohelvar.CommandResponseTimeout):
+            self.stats["timeouts"] += 1
+            self._adjust_backoff(QUERY_TIMEOUT)
+            return
+
+        self._adjust_backoff(time.monotonic() - started)
+        self.stats["queries"] += 1
+        self.last_polled[address] = time.monotonic()
+        self._cycle_polled.add(address)
+
+        try:
+            level = float(response.result)
+        except (ValueError, TypeError):
+            _LOGGER.debug("Unexpected load level %s for %s", response.result, address)
+            return
+
+        self.router.optimistic.async_confirm(address, level, started)
+
+        device = api.devices.devices.get(address)
+        if device is None or device.load_level == level:
+            return
+
+        _LOGGER.debug(
+            "Level of %s drifted from %s to %s", address, device.load_level, level
+        )
+        self.stats["corrections"] += 1
+        await api.devices.update_device_load_level(address, level)
+        self.router.events.async_level_changed(device, SOURCE_POLL)
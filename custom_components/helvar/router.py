@@ -1,11 +1,61 @@
 """Helvar Router."""
+import asyncio
 import logging
+import time
 
 import aiohelvar
 
+from homeassistant.core import callback
 from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.helpers.dispatcher import async_dispatcher_send
 
-from .const import CONF_HOST, CONF_PORT
+from .capabilities import detect_kind
+from .const import (
+    CONF_DISABLED_GROUPS,
+    CONF_FLUSH_INTERVAL,
+    CONF_HOST,
+    CONF_PIPELINE_WINDOW,
+    CONF_POLL_RATE,
+    CONF_PORT,
+    CONF_ROUTERS,
+    CONF_STATE_WRITE_WINDOW,
+    CONF_SYNC_INTERVAL,
+    DEFAULT_FLUSH_INTERVAL,
+    DEFAULT_PIPELINE_WINDOW,
+    DEFAULT_POLL_RATE,
+    DEFAULT_STATE_WRITE_WINDOW,
+    DEFAULT_SYNC_INTERVAL,
+    SIGNAL_AVAILABILITY,
+    SIGNAL_SCENES_UPDATED,
+    SIGNAL_TOPOLOGY_UPDATED,
+)
+from .discovery import WorkgroupDiscovery
+from .events import SOURCE_SCENE, NotificationEvents
+from .optimistic import OptimisticLevels
+from .pipeline import CommandPipeline, RateTracker
+from .reconcile import LevelReconciler
+from .scene_levels import SceneLevelTable
+from .scene_names import SceneNameIndex
+from .scheduler import CommandScheduler
+from .state_writer import StateWriter
+from .supervisor import ConnectionSupervisor
+from .sync import (
+    async_apply_configuration,
+    async_read_configuration,
+    configuration_checksum,
+    diff_configuration,
+)
+from .topology import (
+    TopologyDiff,
+    TopologyStore,
+    address_from_string,
+    address_to_string,
+    apply_topology,
+    diff_topology,
+    dump_topology,
+    restore_topology,
+)
+from .watchdog import LatencyWatchdog
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -17,32 +67,276 @@ class HelvarRouter:
         """Initialize the system."""
         self.config_entry = config_entry
         self.hass = hass
-        self.available = True
         self.api = None
+        self.routers = {}
+        self.supervisors = {}
+        self.pipeline = CommandPipeline(self.pipeline_window)
+        self.scheduler = CommandScheduler(hass, self, self.flush_interval)
+        self.state_writer = StateWriter(hass, self.state_write_window)
+        self.scene_levels = SceneLevelTable()
+        self.scene_names = SceneNameIndex()
+        self.reconciler = LevelReconciler(hass, self, self.poll_rate)
+        self.optimistic = OptimisticLevels(hass, self)
+        self.watchdog = LatencyWatchdog(self)
+        # Light entities by device address, and group light entities by group id.
+        # Device updates are dispatched through these by one shared callback
+        # rather than a callback per entity.
+        self.lights = {}
+        self.group_lights = {}
+        self._device_callback = self._async_device_updated
+        self._device_groups = {}
+        # The kind of each device, detected when it is first tracked.
+        self.capabilities = {}
+        self._subscribed_devices = set()
+        # Scene recalls reported by the router, the only live notifications it sends.
+        self.notifications = RateTracker()
+        self.events = NotificationEvents(hass, self)
+        self._subscribed_groups = set()
+        self.topology_store = TopologyStore(hass, config_entry.entry_id)
+        self.topology_diff = None
+        # The discovery of the workgroup from the routers, if one has been run.
+        self.discovery = None
+        # Checksum of the configuration the cached topology was read from.
+        self.checksum = None
+        self.metrics = {
+            "topology_source": None,
+            "startup_duration": None,
+            "discovery_duration": None,
+        }
 
     @property
     def host(self):
         """Return the host of this router."""
         return self.config_entry.data[CONF_HOST]
 
+    @property
+    def hosts(self):
+        """Return the hosts of every router in the workgroup, this one first."""
+        return [self.host, *self.config_entry.data.get(CONF_ROUTERS, [])]
+
     @property
     def port(self):
         """Return the host of this router."""
         return self.config_entry.data[CONF_PORT]
 
+    @property
+    def flush_interval(self):
+        """Return the command flush interval in seconds."""
+        return (
+            self.config_entry.options.get(CONF_FLUSH_INTERVAL, DEFAULT_FLUSH_INTERVAL)
+            / 1000
+        )
+
+    @property
+    def state_write_window(self):
+        """Return how long to batch entity state writes for, in seconds."""
+        return (
+            self.config_entry.options.get(
+                CONF_STATE_WRITE_WINDOW, DEFAULT_STATE_WRITE_WINDOW
+            )
+            / 1000
+        )
+
+    @property
+    def poll_rate(self):
+        """Return the device level query budget in queries per second."""
+        return self.config_entry.options.get(CONF_POLL_RATE, DEFAULT_POLL_RATE)
+
+    @property
+    def pipeline_window(self):
+        """Return how many queries may wait for a reply at once."""
+        return self.config_entry.options.get(
+            CONF_PIPELINE_WINDOW, DEFAULT_PIPELINE_WINDOW
+        )
+
+    @property
+    def sync_interval(self):
+        """Return the time between configuration checks in seconds, 0 if disabled."""
+        return (
+            self.config_entry.options.get(CONF_SYNC_INTERVAL, DEFAULT_SYNC_INTERVAL)
+            * 60
+        )
+
+    @property
+    def disabled_groups(self):
+        """Return the ids of the groups whose entities are disabled by default."""
+        return {
+            int(group_id)
+            for group_id in self.config_entry.options.get(CONF_DISABLED_GROUPS, [])
+        }
+
+    def in_disabled_groups(self, address):
+        """Return True if a device is only in groups whose entities are disabled.
+
+        Devices that aren't in any group are never disabled.
+        """
+        group_ids = self._device_groups.get(address)
+        return bool(group_ids) and self.disabled_groups.issuperset(group_ids)
+
+    def device_kind(self, device):
+        """Return the kind of a device, detecting it the first time it is asked."""
+
+        kind = self.capabilities.get(device.address)
+        if kind is None:
+            kind = self.capabilities[device.address] = detect_kind(device)
+        return kind
+
+    def groups_of(self, address):
+        """Return the ids of the groups a device is in."""
+        return self._device_groups.get(address, ())
+
+    @property
+    def scenes_updated_signal(self):
+        """Return the dispatcher signal sent when scenes or their names change."""
+        return SIGNAL_SCENES_UPDATED.format(self.config_entry.entry_id)
+
+    @property
+    def topology_updated_signal(self):
+        """Return the dispatcher signal sent when devices or groups come or go."""
+        return SIGNAL_TOPOLOGY_UPDATED.format(self.config_entry.entry_id)
+
+    @property
+    def available(self):
+        """Return True if the connection to the first router is up."""
+        supervisor = self.supervisors.get(self._key(self.api))
+        return supervisor is None or supervisor.available
+
+    @property
+    def availability_signal(self):
+        """Return the dispatcher signal sent when a router connection goes up or down."""
+        return SIGNAL_AVAILABILITY.format(self.config_entry.entry_id)
+
+    @property
+    def queue_depth(self):
+        """Return the number of commands waiting to be sent to the routers."""
+        return self.scheduler.queue_depth + sum(
+            router.commands_to_send.qsize() for router in self.routers.values()
+        )
+
+    @property
+    def reconnects(self):
+        """Return how many times router connections have been re-established."""
+        return sum(
+            supervisor.stats["reconnects"] for supervisor in self.supervisors.values()
+        )
+
+    def queue_depth_for(self, key):
+        """Return the number of commands waiting to be sent to one router.
+
+        key is the cluster and router id. Group commands and scene recalls go to
+        the first router.
+        """
+
+        api = self.routers.get(key)
+        depth = sum(
+            1
+            for address in self.scheduler.pending
+            if (address.block, address.router) == key
+        )
+        if api is not None and api is self.api:
+            depth += len(self.scheduler.pending_groups) + len(
+                self.scheduler.pending_scenes
+            )
+        return depth + (api.commands_to_send.qsize() if api is not None else 0)
+
+    def reconnects_for(self, key):
+        """Return how many times one router's connection has been re-established."""
+        supervisor = self.supervisors.get(key)
+        return 0 if supervisor is None else supervisor.stats["reconnects"]
+
+    def is_available(self, address):
+        """Return True if the connection to the router that owns an address is up."""
+        supervisor = self.supervisors.get((address.block, address.router))
+        if supervisor is None:
+            return self.available
+        return supervisor.available
+
+    @staticmethod
+    def _key(api):
+        """Return the cluster and router id of an aiohelvar router."""
+        return (api.cluster_id, api.router_id) if api is not None else None
+
+    @callback
+    def async_link_changed(self, api):
+        """Tell entities that a router connection went up or down."""
+        _LOGGER.info(
+            "Helvar router at %s is %s",
+            api.host,
+            "available" if self.supervisors[self._key(api)].available else "unavailable",
+        )
+        if not self.supervisors[self._key(api)].available:
+            # Anything sent but not confirmed may never have reached the devices.
+            self.optimistic.async_roll_back_router(self._key(api))
+        async_dispatcher_send(self.hass, self.availability_signal)
+
+    async def async_link_restored(self, api):
+        """Send the commands that were held back while a router was unreachable."""
+        await self.scheduler.async_flush()
+
+    @callback
+    def async_scenes_updated(self):
+        """Tell entities that the router's scene configuration has changed."""
+        async_dispatcher_send(self.hass, self.scenes_updated_signal)
+
+    def api_for(self, address):
+        """Return the aiohelvar router that owns a device address."""
+        return self.routers.get((address.block, address.router), self.api)
+
+    def _create_routers(self):
+        """Create an aiohelvar router for each router in the workgroup.
+
+        The first is the one the entry was set up with. It holds the registry of
+        every device, group and scene in the workgroup, and is used for group
+        commands. The others are only used for their own devices.
+        """
+        return [aiohelvar.Router(host, self.port) for host in self.hosts]
+
     async def async_setup(self, tries=0):
-        """Set up a helvar router based on host parameter."""
+        """Set up a helvar router based on host parameter.
+
+        If a topology was cached by a previous run, entities are created from it
+        straight away and the routers are re-scanned in the background. Otherwise
+        only the workgroup's configuration is read before the entry is set up, and
+        the devices are discovered in the background, each becoming an entity as
+        soon as it has been read.
+        """
         host = self.host
-        port = self.port
         hass = self.hass
 
-        router = aiohelvar.Router(host, port)
+        started = time.monotonic()
+
+        topology = await self.topology_store.async_load()
+
+        routers = self._create_routers()
+
+        if topology is not None:
+            try:
+                restore_topology(routers[0], topology)
+                self.checksum = topology.get("checksum")
+            except (KeyError, TypeError, ValueError):
+                _LOGGER.warning(
+                    "Cached topology for Helvar router at %s is invalid, "
+                    "discovering from the router instead",
+                    host,
+                )
+                topology = None
+                routers = self._create_routers()
+
+        discovery = None
 
         try:
-            await router.connect()
-            await router.initialize()
+            await asyncio.gather(*(router.connect() for router in routers))
+            if topology is None:
+                discovery = WorkgroupDiscovery(
+                    self.pipeline, routers, self._async_devices_discovered
+                )
+                await discovery.async_read_configuration()
 
-        except ConnectionError as err:
+        except (
+            ConnectionError,
+            asyncio.TimeoutError,
+            aiohelvar.CommandResponseTimeout,
+        ) as err:
             _LOGGER.error("Error connecting to the Helvar router at %s", host)
             raise ConfigEntryNotReady from err
 
@@ -50,14 +344,438 @@ class HelvarRouter:
             _LOGGER.exception("Unknown error connecting with Helvar router at %s", host)
             return False
 
-        self.api = router
+        self.api = routers[0]
+        self.routers = {self._key(router): router for router in routers}
+        self.supervisors = {
+            key: ConnectionSupervisor(self, router)
+            for key, router in self.routers.items()
+        }
+        self.discovery = discovery
+        self._share_devices()
+        self._track_scene_levels()
+        self.scene_names.rebuild(self.api)
+        self._track_devices()
+        if discovery is not None:
+            # Devices are discovered before their groups are registered, but
+            # their entities need to know which groups they'll be in.
+            self._index_device_groups(
+                (address_from_string(address), int(group_id))
+                for group_id, group in discovery.configuration["groups"].items()
+                for address in group["devices"]
+            )
         # self.sensor_manager = SensorManager(self)
 
+        self.metrics["topology_source"] = "router" if topology is None else "cache"
+        self.metrics["startup_duration"] = time.monotonic() - started
+
+        _LOGGER.info(
+            "Helvar workgroup %s (%s routers) set up from %s in %.2fs",
+            self.api.workgroup_name,
+            len(routers),
+            self.metrics["topology_source"],
+            self.metrics["startup_duration"],
+        )
+
+        if topology is None:
+            self.config_entry.async_create_background_task(
+                hass,
+                self._async_discover(discovery, started),
+                "helvar discover workgroup",
+            )
+        else:
+            self.config_entry.async_create_background_task(
+                hass, self._async_rescan(), "helvar rescan"
+            )
+
+        for key, supervisor in self.supervisors.items():
+            self.config_entry.async_create_background_task(
+                hass, supervisor.async_run(), f"helvar supervise {key}"
+            )
+
+        if self.poll_rate:
+            self.config_entry.async_create_background_task(
+                hass, self.reconciler.async_run(), "helvar reconcile levels"
+            )
+
+        self.config_entry.async_create_background_task(
+            hass, self.watchdog.async_run(), "helvar latency watchdog"
+        )
+
+        if self.sync_interval:
+            self.config_entry.async_create_background_task(
+                hass, self._async_sync_periodically(), "helvar sync configuration"
+            )
+
         hass.async_create_task(
             hass.config_entries.async_forward_entry_setups(self.config_entry, ["light"]),
         )
         hass.async_create_task(
             hass.config_entries.async_forward_entry_setups(self.config_entry, ["select"]),
         )
+        hass.async_create_task(
+            hass.config_entries.async_forward_entry_setups(self.config_entry, ["sensor"]),
+        )
 
         return True
+
+    def _share_devices(self):
+        """Register each device with the router that owns it as well as the first.
+
+        aiohelvar updates a device through the registry of the router the command
+        was sent to, so both need to know about it.
+        """
+        for device in self.api.devices.devices.values():
+            owner = self.api_for(device.address)
+            if owner is not self.api:
+                owner.devices.register_device(device)
+
+    async def _async_discover(self, discovery, started):
+        """Discover the devices, groups and scenes, then cache the topology."""
+
+        try:
+            await discovery.async_read_devices()
+        except (asyncio.TimeoutError, aiohelvar.CommandResponseTimeout) as err:
+            # The discovery is still marked done, so the next configuration check
+            # picks up whatever it didn't register.
+            _LOGGER.warning(
+                "Discovery of Helvar router at %s failed: %s", self.host, err
+            )
+            return
+
+        self.metrics["discovery_duration"] = time.monotonic() - started
+        _LOGGER.info(
+            "Discovery of Helvar workgroup %s finished in %.2fs: %s devices, "
+            "%s didn't answer",
+            self.api.workgroup_name,
+            self.metrics["discovery_duration"],
+            len(self.api.devices.devices),
+            discovery.failed,
+        )
+
+        configuration = discovery.configuration
+        self._async_topology_changed(
+            TopologyDiff(
+                added_groups=list(configuration["groups"]),
+                changed_scenes=list(configuration["scenes"]),
+            )
+        )
+
+        await self._async_save_topology(discovery)
+
+    async def _async_save_topology(self, discovery):
+        """Cache the topology of the workgroup after a discovery.
+
+        The configuration's checksum is only kept if every device answered, so
+        the next sync picks up the ones that didn't.
+        """
+
+        if not discovery.failed:
+            self.checksum = configuration_checksum(discovery.configuration)
+        await self.topology_store.async_save(
+            {**dump_topology(self.api), "checksum": self.checksum}
+        )
+
+    @callback
+    def _async_devices_discovered(self, devices):
+        """Follow updates to newly discovered devices and add their entities."""
+
+        for device in devices:
+            self.device_kind(device)
+            if device.address in self._subscribed_devices:
+                continue
+            if self.api.devices.register_subscription(
+                device.address, self._device_callback
+            ):
+                self._subscribed_devices.add(device.address)
+
+        async_dispatcher_send(
+            self.hass,
+            self.topology_updated_signal,
+            TopologyDiff(
+                added_devices=[address_to_string(device.address) for device in devices]
+            ),
+        )
+
+    def _track_scene_levels(self):
+        """Rebuild the scene level table and follow scene recalls on every group."""
+
+        self.scene_levels.rebuild(self.api)
+
+        for group_id in self.api.groups.groups:
+            if group_id in self._subscribed_groups:
+                continue
+            if self.api.groups.register_subscription(
+                group_id, self._async_group_scene_changed
+            ):
+                self._subscribed_groups.add(group_id)
+
+    def _track_devices(self):
+        """Index the groups of every device and follow updates to each device.
+
+        Every device gets the same callback, which looks up the entities to write
+        in the address-indexed tables. Devices in the same groups share one tuple
+        of group ids. Kinds already detected are kept for devices that remain.
+        """
+
+        self.capabilities = {
+            address: self.capabilities.get(address) or detect_kind(device)
+            for address, device in self.api.devices.devices.items()
+        }
+
+        self._index_device_groups(
+            (address, int(group.group_id))
+            for group in self.api.groups.groups.values()
+            for address in group.devices
+        )
+
+        for address in self.api.devices.devices:
+            if address in self._subscribed_devices:
+                continue
+            if self.api.devices.register_subscription(address, self._device_callback):
+                self._subscribed_devices.add(address)
+
+    def _index_device_groups(self, memberships):
+        """Index the groups of each device from (address, group id) pairs."""
+
+        group_ids = {}
+        for address, group_id in memberships:
+            group_ids.setdefault(address, []).append(group_id)
+
+        shared = {}
+        self._device_groups = {
+            address: shared.setdefault(tuple(ids), tuple(ids))
+            for address, ids in group_ids.items()
+        }
+
+    async def _async_device_updated(self, device):
+        """Write the state of the light and group lights that show a device."""
+        self.async_schedule_device_write(device.address)
+
+    @callback
+    def async_schedule_device_write(self, address):
+        """Schedule a state write for the light and group lights that show a device."""
+
+        light = self.lights.get(address)
+        if light is not None:
+            self.state_writer.async_schedule_write(light)
+
+        for group_id in self._device_groups.get(address, ()):
+            group_light = self.group_lights.get(group_id)
+            if group_light is not None:
+                self.state_writer.async_schedule_write(group_light)
+
+    async def _async_group_scene_changed(self, group):
+        """Write the lights, and fire events, for the members a recall set."""
+
+        self.notifications.record()
+
+        group_light = self.group_lights.get(int(group.group_id))
+        if group_light is not None:
+            self.state_writer.async_schedule_write(group_light)
+
+        scene_address = group.get_last_scene_address()
+        if scene_address is None:
+            return
+
+        self.events.async_scene_recalled(scene_address)
+
+        devices = self.scene_levels.scene_devices(self.api, scene_address)
+
+        _LOGGER.debug(
+            "Scene %s sets the level of %s devices", scene_address, len(devices)
+        )
+
+        for device in devices:
+            self.optimistic.async_forget(device.address)
+            light = self.lights.get(device.address)
+            if light is not None:
+                self.state_writer.async_schedule_write(light)
+            self.events.async_level_changed(device, SOURCE_SCENE, scene_address)
+
+    async def _async_configuration_updated(self, item):
+        """Tell the subscribers of a device or group that its configuration changed.
+
+        A group callback is otherwise a scene recall, so the router's own is left
+        out, and the group light is written directly instead.
+        """
+
+        for subscriber in list(item.subscriptions):
+            if subscriber != self._async_group_scene_changed:
+                await subscriber(item)
+
+        if isinstance(item, aiohelvar.groups.Group):
+            group_light = self.group_lights.get(int(item.group_id))
+            if group_light is not None:
+                self.state_writer.async_schedule_write(group_light)
+
+    async def _async_rescan(self):
+        """Walk the routers on new connections and reconcile the cached topology."""
+
+        started = time.monotonic()
+        scans = self._create_routers()
+        discovery = WorkgroupDiscovery(self.pipeline, scans)
+
+        try:
+            await asyncio.gather(*(scan.connect() for scan in scans))
+            await discovery.async_read_devices()
+        except (
+            OSError,
+            asyncio.TimeoutError,
+            aiohelvar.CommandResponseTimeout,
+        ) as err:
+            _LOGGER.warning(
+                "Background re-scan of Helvar router at %s failed: %s", self.host, err
+            )
+            return
+        finally:
+            for scan in scans:
+                if scan.connected:
+                    await scan.disconnect()
+
+        self.metrics["discovery_duration"] = time.monotonic() - started
+
+        topology = dump_topology(scans[0])
+        self.topology_diff = diff_topology(dump_topology(self.api), topology)
+        # Devices that didn't answer are still configured, so they are kept.
+        self.topology_diff.removed_devices = [
+            address
+            for address in self.topology_diff.removed_devices
+            if address not in discovery.configuration["devices"]
+        ]
+
+        _LOGGER.info(
+            "Re-scan of Helvar workgroup %s finished in %.2fs: %s",
+            self.api.workgroup_name,
+            self.metrics["discovery_duration"],
+            self.topology_diff,
+        )
+
+        for item in apply_topology(self.api, scans[0], self.topology_diff):
+            await self._async_configuration_updated(item)
+
+        self._async_topology_changed(self.topology_diff)
+
+        await self._async_save_topology(discovery)
+
+    async def _async_sync_periodically(self):
+        """Check the routers for configuration changes every sync interval."""
+
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            if not self.available or self.watchdog.degraded:
+                continue
+            if self.discovery is not None and not self.discovery.done:
+                continue
+            try:
+                await self.async_sync()
+            except (asyncio.TimeoutError, aiohelvar.CommandResponseTimeout) as err:
+                _LOGGER.warning(
+                    "Configuration check of Helvar router at %s failed: %s",
+                    self.host,
+                    err,
+                )
+
+    async def async_sync(self):
+        """Pick up configuration changes without re-discovering the workgroup.
+
+        The cheap parts of the configuration are read over the live connections
+        and checksummed. If the checksum has changed, only what differs is fetched
+        and applied, and entities are added and removed to match. Returns the
+        differences, or None if nothing changed.
+        """
+
+        started = time.monotonic()
+        routers = [self.api, *(r for r in self.routers.values() if r is not self.api)]
+
+        configuration = await async_read_configuration(self.pipeline, routers)
+        checksum = configuration_checksum(configuration)
+
+        if checksum == self.checksum:
+            _LOGGER.debug("Helvar workgroup %s is unchanged", self.api.workgroup_name)
+            return None
+
+        diff = diff_configuration(self.api, configuration)
+
+        for item in await async_apply_configuration(
+            self.pipeline, self.api, configuration, diff, self.api_for
+        ):
+            await self._async_configuration_updated(item)
+
+        self._async_topology_changed(diff)
+        self.checksum = checksum
+
+        _LOGGER.info(
+            "Sync of Helvar workgroup %s finished in %.2fs: %s",
+            self.api.workgroup_name,
+            time.monotonic() - started,
+            diff,
+        )
+
+        await self.topology_store.async_save(
+            {**dump_topology(self.api), "checksum": checksum}
+        )
+        return diff
+
+    @callback
+    def _async_topology_changed(self, diff):
+        """Update entities for devices and groups that were added or removed.
+
+        Entities are told first, so they can be removed while the devices and
+        groups they show still exist.
+        """
+
+        if diff.added_devices or diff.added_groups:
+            self._share_devices()
+        self._track_scene_levels()
+        self._track_devices()
+
+        if diff.changed_scenes:
+            self.scene_names.update(
+                self.api,
+                (
+                    aiohelvar.SceneAddress.fromString(scene)
+                    for scene in diff.changed_scenes
+                ),
+            )
+            self.async_scenes_updated()
+
+        if not (
+            diff.added_devices
+            or diff.removed_devices
+            or diff.added_groups
+            or diff.removed_groups
+        ):
+            return
+
+        async_dispatcher_send(self.hass, self.topology_updated_signal, diff)
+
+        for address_string in diff.removed_devices:
+            address = address_from_string(address_string)
+            for api in {self.api, self.api_for(address)}:
+                api.devices.devices.pop(address, None)
+            self._subscribed_devices.discard(address)
+
+        for group_id in diff.removed_groups:
+            self.api.groups.groups.pop(int(group_id), None)
+            self._subscribed_groups.discard(int(group_id))
+            for scene_address in [
+                scene_address
+                for scene_address in self.api.scenes.scenes
+                if scene_address.group == int(group_id)
+            ]:
+                del self.api.scenes.scenes[scene_address]
+            self.scene_names.remove_group(int(group_id))
+
+        if diff.removed_devices or diff.removed_groups:
+            self._track_scene_levels()
+            self._track_devices()
+
+    async def async_reset(self):
+        """Flush outstanding commands and disconnect before the entry is unloaded."""
+        await self.scheduler.async_shutdown()
+        self.state_writer.async_shutdown()
+        self.optimistic.async_shutdown()
+
+        for router in self.routers.values():
+            if router.connected:
+                await router.disconnect()
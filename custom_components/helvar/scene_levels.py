@@ -0,0 +1,137 @@
+"""Predicted device levels for Helvar group scenes."""
+from __future__ import annotations
+
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+# Scene level meaning "leave the device alone".
+IGNORE_LEVEL = "*"
+# Scene level meaning "the level the device had before it was last turned off".
+LAST_LEVEL = "L"
+# Scene levels a device needs for every scene of a group to have one: 8 blocks of
+# 16 scenes, indexed from 1.
+SCENE_LEVEL_COUNT = 8 * 16 + 1
+
+
+class SceneLevelTable:
+    """Per group, block and scene table of the levels each member device goes to.
+
+    The router doesn't report device levels after a scene recall, only the scene.
+    aiohelvar works out the new level of each member itself, but raises on a
+    member with fewer scene levels than the scene's index, and then never tells
+    the group's subscribers. Rebuilding the table pads those members' levels with
+    IGNORE_LEVEL, so every recall is applied, once, by aiohelvar. The table then
+    says which members a recall set.
+    """
+
+    def __init__(self):
+        """Initialize an empty table."""
+        self._members = {}
+        self._scenes = {}
+
+    def __len__(self):
+        return len(self._scenes)
+
+    def rebuild(self, api):
+        """Rebuild the table from the scene levels of every group member.
+
+        Devices with the same scene levels, which is most devices in a group, are
+        given one shared list of them. Lists too short for every scene are padded
+        with IGNORE_LEVEL first.
+        """
+
+        self._members = {}
+        self._scenes = {}
+        rows = {}
+
+        for group in api.groups.groups.values():
+            members = []
+            for address in group.devices:
+                device = api.devices.devices.get(address)
+                if device is None or not device.is_load or device.levels is None:
+                    continue
+                if len(device.levels) < SCENE_LEVEL_COUNT:
+                    device.levels = [*device.levels] + [IGNORE_LEVEL] * (
+                        SCENE_LEVEL_COUNT - len(device.levels)
+                    )
+                device.levels = rows.setdefault(tuple(device.levels), device.levels)
+                members.append((address, device.levels))
+            self._members[int(group.group_id)] = members
+
+    def levels_for_scene(self, scene_address):
+        """Return {address: level} for the members a scene sets.
+
+        Levels are load levels between 0 and 100, or LAST_LEVEL. Members the
+        scene ignores are left out.
+        """
+
+        levels = self._scenes.get(scene_address)
+        if levels is not None:
+            return levels
+
+        index = scene_address.to_device_int()
+        levels = {}
+
+        for address, device_levels in self._members.get(scene_address.group, ()):
+            if index >= len(device_levels):
+                continue
+
+            level = device_levels[index]
+            if level == IGNORE_LEVEL:
+                continue
+            if level == LAST_LEVEL:
+                levels[address] = LAST_LEVEL
+                continue
+
+            try:
+                levels[address] = float(level)
+            except (ValueError, TypeError):
+                _LOGGER.debug(
+                    "Ignoring level %s of %s in scene %s", level, address, scene_address
+                )
+
+        self._scenes[scene_address] = levels
+        return levels
+
+    def scene_devices(self, api, scene_address):
+        """Return the devices a scene sets the level of.
+
+        aiohelvar has already applied the scene to them by the time the group's
+        subscribers are told of a recall.
+        """
+
+        devices = []
+        for address in self.levels_for_scene(scene_address):
+            device = api.devices.devices.get(address)
+            if device is not None:
+                devices.append(device)
+        return devices
+
+    def store_scene(self, api, scene_address, force: bool = False):
+        """Record the current level of every member of a group as a scene's level.
+
+        Mirrors a store on the router, so the table doesn't have to be re-read.
+        Members the scene ignores keep ignoring it unless force is set. Returns the
+        devices whose scene level was stored.
+        """
+
+        group = api.groups.groups.get(scene_address.group)
+        index = scene_address.to_device_int()
+        devices = []
+
+        for address in group.devices if group is not None else ():
+            device = api.devices.devices.get(address)
+            if device is None or not device.is_load or index >= len(device.levels):
+                continue
+            if device.levels[index] == IGNORE_LEVEL and not force:
+                continue
+
+            # Level lists are shared between devices, so each gets its own copy.
+            levels = list(device.levels)
+            levels[index] = f"{device.load_level:g}"
+            device.levels = levels
+            devices.append(device)
+
+        self.rebuild(api)
+        return devices
@@ -0,0 +1,91 @@
+"""Rendered scene names for the group selects of a Helvar router."""
+from __future__ import annotations
+
+
+def render_scene_name(scene):
+    """Render scene name for hass."""
+    if scene is None:
+        return None
+    if scene.name:
+        return f"{scene.name} - {scene.address}"
+    return f"Unnamed - {scene.address}"
+
+
+class SceneNameIndex:
+    """The rendered name of every scene in a workgroup, and each group's options.
+
+    Group selects read the name of their group's last scene on every state
+    write, and aiohelvar finds a group's scenes by looking through every scene in
+    the workgroup. Here each name is rendered once and kept per group, and only
+    scenes that are added, renamed or removed are rendered again.
+    """
+
+    def __init__(self):
+        """Initialize an empty index."""
+        self.names = {}
+        self._groups = {}
+        self._options = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def rebuild(self, api):
+        """Render every scene the router knows about."""
+
+        self.names = {}
+        self._groups = {}
+        self._options = {}
+        self.update(api, api.scenes.scenes)
+
+    def update(self, api, scene_addresses):
+        """Render the scenes at some addresses again, or drop those that are gone."""
+
+        for scene_address in scene_addresses:
+            scene = api.scenes.scenes.get(scene_address)
+            group_scenes = self._groups.setdefault(scene_address.group, {})
+            self._options.pop(scene_address.group, None)
+
+            if scene is None:
+                self.names.pop(scene_address, None)
+                group_scenes.pop(scene_address, None)
+                continue
+
+            self.names[scene_address] = render_scene_name(scene)
+            group_scenes[scene_address] = scene
+
+    def remove_group(self, group_id: int):
+        """Drop every scene of a group that has gone."""
+
+        for scene_address in self._groups.pop(group_id, {}):
+            self.names.pop(scene_address, None)
+        self._options.pop(group_id, None)
+
+    def name(self, scene_address):
+        """Return the rendered name of a scene, or None if it isn't known."""
+        return self.names.get(scene_address)
+
+    def options(self, group_id: int) -> dict:
+        """Return {rendered name: scene address} for a group's scenes.
+
+        Named scenes come first, by name, then unnamed ones by address, as
+        aiohelvar orders them.
+        """
+
+        options = self._options.get(group_id)
+        if options is not None:
+            return options
+
+        scenes = self._groups.get(group_id, {}).values()
+        named = sorted(
+            (scene for scene in scenes if scene.name is not None),
+            key=lambda scene: scene.name,
+        )
+        unnamed = sorted(
+            (scene for scene in scenes if scene.name is None),
+            key=lambda scene: str(scene.address),
+        )
+
+        options = self._options[group_id] = {
+            self.names[scene.address]: scene.address for scene in (*named, *unnamed)
+        }
+        return options
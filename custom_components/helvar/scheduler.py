@@ -0,0 +1,386 @@
+"""Coalescing command scheduler for a Helvar router."""
+from __future__ import annotations
+
+import logging
+
+import aiohelvar
+from aiohelvar.static import DEFAULT_FADE_TIME
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+
+from .const import (
+    DEFAULT_OFF_GROUP_BLOCK,
+    DEFAULT_OFF_GROUP_SCENE,
+    DEFAULT_ON_GROUP_BLOCK,
+    DEFAULT_ON_GROUP_SCENE,
+)
+from .capabilities import load_members
+from .protocol import brightness_to_level, direct_level_group
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class CommandScheduler:
+    """Coalesce device level writes and flush them to the router at a fixed rate.
+
+    Only the latest pending level per device address is kept. Anything queued for an
+    address before the next flush is merged into that single command. Each level
+    carries a fade time the router runs itself, so a long transition is still one
+    command.
+
+    When a flush covers every member of a Helvar group at the same level, and that
+    level is what the group's default on or off scene sets, the members are sent as
+    one scene recall instead of one command per device.
+
+    Group levels are sent as a single group command, ahead of device levels, and
+    replace any level still pending for a member. Scene recalls go first of all,
+    and replace any level still pending for their group, so levels queued for
+    single members after a recall override it.
+
+    Commands for a router whose connection is down are held, still coalesced, and
+    sent when the router reports the link is back.
+
+    Device and group levels are predicted as soon as they are queued, so entities
+    show them straight away, and the predictions are told when each goes out.
+
+    Levels are queued as a brightness, and sent as the load level aiohelvar works
+    out from it, unless the caller gives the exact load level to send.
+    """
+
+    def __init__(self, hass, router, interval: float):
+        """Initialize the scheduler.
+
+        interval is the flush period in seconds.
+        """
+        self.hass = hass
+        self.router = router
+        self.interval = interval
+        self.pending = {}
+        self.pending_groups = {}
+        self.pending_scenes = {}
+        self.stats = {
+            "queued": 0,
+            "sent": 0,
+            "merged": 0,
+            "group_commands": 0,
+            "packed": 0,
+            "deferred": 0,
+        }
+        self._unsub_flush = None
+
+    @property
+    def queue_depth(self):
+        """Return the number of commands waiting for the next flush."""
+        return len(self.pending) + len(self.pending_groups) + len(self.pending_scenes)
+
+    async def async_set_brightness(
+        self,
+        address,
+        brightness: int,
+        fade_time: int | None = None,
+        level: float | None = None,
+    ):
+        """Queue a brightness change for a device.
+
+        fade_time is in hundredths of a second, or None for the router's default.
+        level is the load level to send, or None to work it out from brightness.
+        """
+
+        self.stats["queued"] += 1
+
+        if address in self.pending:
+            self.stats["merged"] += 1
+
+        self.pending[address] = (brightness, fade_time, level)
+        self.router.optimistic.async_predict(address, brightness)
+        self._schedule_flush()
+
+    async def async_set_group_brightness(
+        self,
+        group_id,
+        brightness: int,
+        fade_time: int | None = None,
+        level: float | None = None,
+    ):
+        """Queue a brightness change for every device in a group.
+
+        fade_time is in hundredths of a second, or None for the router's default.
+        level is the load level to send, or None to work it out from brightness.
+        """
+
+        self.stats["queued"] += 1
+
+        if (
+            group_id in self.pending_groups
+            or self.pending_scenes.pop(group_id, None) is not None
+        ):
+            self.stats["merged"] += 1
+
+        group = self.router.api.groups.groups.get(group_id)
+        for address in group.devices if group is not None else ():
+            if self.pending.pop(address, None) is not None:
+                self.stats["merged"] += 1
+            self.router.optimistic.async_predict(address, brightness)
+
+        self.pending_groups[group_id] = (brightness, fade_time, level)
+        self._schedule_flush()
+
+    async def async_recall_scene(self, scene_address, fade_time: int | None = None):
+        """Queue a scene recall for a group.
+
+        fade_time is in hundredths of a second, or None for the router's default.
+        """
+
+        self.stats["queued"] += 1
+
+        group_id = scene_address.group
+        if (
+            self.pending_scenes.pop(group_id, None) is not None
+            or self.pending_groups.pop(group_id, None) is not None
+        ):
+            self.stats["merged"] += 1
+
+        # The router reports the recall, which sets the members' levels.
+        group = self.router.api.groups.groups.get(group_id)
+        for address in group.devices if group is not None else ():
+            self.router.optimistic.async_forget(address)
+
+        self.pending_scenes[group_id] = (scene_address, fade_time)
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        """Start the flush timer if it isn't already running."""
+        if self._unsub_flush is None:
+            self._unsub_flush = async_call_later(
+                self.hass, self.interval, self._async_flush_callback
+            )
+
+    @callback
+    def _async_flush_callback(self, _now):
+        """Flush pending commands when the timer fires."""
+        self._unsub_flush = None
+        self.hass.async_create_task(self.async_flush())
+
+    async def async_flush(self):
+        """Send every pending command to the router."""
+
+        if self._unsub_flush is not None:
+            self._unsub_flush()
+            self._unsub_flush = None
+
+        pending, self.pending = self.pending, {}
+        pending_groups, self.pending_groups = self.pending_groups, {}
+        pending_scenes, self.pending_scenes = self.pending_scenes, {}
+
+        if not pending and not pending_groups and not pending_scenes:
+            return
+
+        _LOGGER.debug(
+            "Flushing %s scene, %s group and %s device commands",
+            len(pending_scenes),
+            len(pending_groups),
+            len(pending),
+        )
+
+        for group_id, (scene_address, fade_time) in pending_scenes.items():
+            if not self.router.available:
+                self.pending_scenes.setdefault(group_id, (scene_address, fade_time))
+                self.stats["deferred"] += 1
+                continue
+
+            await self._async_send_scene(scene_address, fade_time)
+
+        for group_id, (brightness, fade_time, level) in pending_groups.items():
+            if not self.router.available:
+                self.pending_groups.setdefault(group_id, (brightness, fade_time, level))
+                self.stats["deferred"] += 1
+                group = self.router.api.groups.groups.get(group_id)
+                for address in group.devices if group is not None else ():
+                    self.router.optimistic.async_roll_back(address)
+                continue
+
+            await self._async_send_group_level(group_id, brightness, fade_time, level)
+            self.stats["group_commands"] += 1
+
+        if self.router.available:
+            for scene_address, fade_time in self._pack_group_commands(pending):
+                await self._async_send_scene(scene_address, fade_time)
+
+        for address, (brightness, fade_time, level) in pending.items():
+            if not self.router.is_available(address):
+                # Held until the link is back. Anything queued since wins.
+                self.pending.setdefault(address, (brightness, fade_time, level))
+                self.stats["deferred"] += 1
+                self.router.optimistic.async_roll_back(address)
+                continue
+
+            await self._async_send_device_level(address, brightness, fade_time, level)
+            self.stats["sent"] += 1
+            self.router.pipeline.record_command(self.router.api_for(address))
+            self.router.reconciler.async_mark_changed(address, _fade_seconds(fade_time))
+            self.router.optimistic.async_sent(address, _fade_seconds(fade_time))
+
+    async def _async_send_scene(self, scene_address, fade_time):
+        """Recall a scene, and re-read the group's members once it has faded."""
+
+        if fade_time is None:
+            await self.router.api.groups.set_scene(scene_address)
+        else:
+            await self.router.api.groups.set_scene(scene_address, fade_time)
+        self.stats["group_commands"] += 1
+        self.router.pipeline.record_command(self.router.api)
+
+        group = self.router.api.groups.groups.get(scene_address.group)
+        for address in group.devices if group is not None else ():
+            self.router.reconciler.async_mark_changed(address, _fade_seconds(fade_time))
+            self.router.optimistic.async_sent(address, _fade_seconds(fade_time))
+
+    async def _async_send_device_level(self, address, brightness, fade_time, level):
+        """Send a device level, as a brightness unless an exact level was queued."""
+
+        devices = self.router.api_for(address).devices
+        if level is None:
+            if fade_time is None:
+                await devices.set_device_brightness(address, brightness)
+            else:
+                await devices.set_device_brightness(address, brightness, fade_time)
+        elif fade_time is None:
+            await devices.set_device_load_level(address, str(level))
+        else:
+            await devices.set_device_load_level(address, str(level), fade_time)
+
+    async def _async_send_group_level(self, group_id, brightness, fade_time, level):
+        """Send a group level and apply it to our copy of every member.
+
+        The router doesn't report levels set this way, so members are updated
+        locally, as aiohelvar does for device levels.
+        """
+
+        api = self.router.api
+        if level is None:
+            level = brightness_to_level(brightness)
+        if fade_time is None:
+            fade_time = DEFAULT_FADE_TIME
+
+        await self.router.pipeline.async_send_message(
+            api, direct_level_group(group_id, level, fade_time)
+        )
+
+        group = api.groups.groups.get(group_id)
+        if group is None:
+            return
+
+        for address in group.devices:
+            device = api.devices.devices.get(address)
+            if device is None or not device.is_load:
+                continue
+            if level == 0 and device.load_level > 0:
+                device.last_load_level = float(device.load_level)
+            await api.devices.update_device_load_level(address, level)
+            self.router.reconciler.async_mark_changed(address, _fade_seconds(fade_time))
+            self.router.optimistic.async_sent(address, _fade_seconds(fade_time))
+
+    def _pack_group_commands(self, pending):
+        """Take complete groups out of pending and return scene recalls for them.
+
+        Returns (scene address, fade time) pairs. Members must share a fade time
+        as well as a level, and an exact level must be the scene's own. Only
+        members with a load count, as scenes don't change sensors and buttons,
+        which nothing is queued for anyway.
+
+        Larger groups are tried first so a whole floor wins over the rooms inside it.
+        """
+
+        scene_addresses = []
+        groups = sorted(
+            self.router.api.groups.groups.values(),
+            key=lambda group: len(group.devices),
+            reverse=True,
+        )
+
+        for group in groups:
+            # What a scene does to a member that isn't known can't be told.
+            members = load_members(self.router.api, group, strict=True)
+            if not members:
+                continue
+            members = [device.address for device in members]
+
+            levels = {pending.get(address) for address in members}
+            if len(levels) != 1 or None in levels:
+                continue
+
+            brightness, fade_time, level = levels.pop()
+            scene_address = self._scene_for_brightness(
+                group, members, brightness, level
+            )
+            if scene_address is None:
+                continue
+
+            _LOGGER.debug(
+                "Sending %s device commands as a recall of %s",
+                len(members),
+                scene_address,
+            )
+
+            for address in members:
+                del pending[address]
+
+            self.stats["packed"] += len(members)
+            scene_addresses.append((scene_address, fade_time))
+
+        return scene_addresses
+
+    def _scene_for_brightness(
+        self, group, members, brightness: int, level: float | None = None
+    ):
+        """Return the default group scene that sets every load member to brightness.
+
+        If level is given, the scene must set every member to exactly that level.
+        """
+
+        if brightness == 0:
+            block, scene = DEFAULT_OFF_GROUP_BLOCK, DEFAULT_OFF_GROUP_SCENE
+        else:
+            block, scene = DEFAULT_ON_GROUP_BLOCK, DEFAULT_ON_GROUP_SCENE
+
+        scene_address = aiohelvar.SceneAddress(group.group_id, block, scene)
+
+        for address in members:
+            device = self.router.api.devices.devices[address]
+            if not _scene_sets_brightness(device, scene_address, brightness, level):
+                return None
+
+        return scene_address
+
+    async def async_shutdown(self):
+        """Send anything still pending and stop the flush timer."""
+        await self.async_flush()
+
+
+def _fade_seconds(fade_time):
+    """Return a fade time in seconds, treating the router's default as none."""
+    return 0 if fade_time is None else fade_time / 100
+
+
+def _scene_sets_brightness(
+    device, scene_address, brightness: int, level: float | None = None
+):
+    """Return True if the device's level for the scene matches brightness.
+
+    If level is given, the scene's level must be exactly that instead.
+    """
+
+    index = scene_address.to_device_int()
+    if not device.levels or index >= len(device.levels):
+        return False
+
+    try:
+        scene_level = float(device.levels[index])
+    except (ValueError, TypeError):
+        # "*" (ignore) and "L" (last level) can't be predicted.
+        return False
+
+    if level is not None:
+        return scene_level == level
+    return round(scene_level * 2.55) == brightness
@@ -4,11 +4,14 @@ import logging
 import aiohelvar
 
 # Import the device class from the component that you want to support
-from homeassistant.components.select import SelectEntity
+from homeassistant.components.select import DOMAIN as SELECT_DOMAIN, SelectEntity
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 
 from .const import (  # DEFAULT_OFF_GROUP_BLOCK,; DEFAULT_OFF_GROUP_SCENE,; DEFAULT_ON_GROUP_BLOCK,; DEFAULT_ON_GROUP_SCENE,; VALID_OFF_GROUP_SCENES,
     DOMAIN as HELVAR_DOMAIN,
 )
+from .paging import async_add_paged, async_remove_entities
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -22,11 +25,46 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
 
     router = hass.data[HELVAR_DOMAIN][config_entry.entry_id]
 
-    groups = [HelvarGroup(group, router) for group in router.api.groups.groups.values()]
+    # Groups registered from here on come through the topology signal.
+    groups = list(router.api.groups.groups.values())
 
-    _LOGGER.info("Adding %s groups", len(groups))
+    @callback
+    def async_topology_updated(diff):
+        """Add and remove selects for groups that came or went."""
 
-    async_add_entities(groups)
+        async_remove_entities(
+            hass,
+            SELECT_DOMAIN,
+            (_select_unique_id(group_id) for group_id in diff.removed_groups),
+        )
+
+        added = [
+            HelvarGroup(group, router)
+            for group in (
+                router.api.groups.groups.get(int(group_id))
+                for group_id in diff.added_groups
+            )
+            if group is not None
+        ]
+        if added:
+            async_add_entities(added)
+
+    config_entry.async_on_unload(
+        async_dispatcher_connect(
+            hass, router.topology_updated_signal, async_topology_updated
+        )
+    )
+
+    added = await async_add_paged(
+        async_add_entities, (HelvarGroup(group, router) for group in groups)
+    )
+
+    _LOGGER.info("Added %s groups", added)
+
+
+def _select_unique_id(group_id):
+    """Return the unique id of the scene select for a group."""
+    return f"{group_id}-select"
 
 
 class HelvarGroup(SelectEntity):
@@ -37,36 +75,73 @@ class HelvarGroup(SelectEntity):
         self.router = router
         self.group = group
         self._attr_current_option = None
+        self._options = []
+        self._option_addresses = {}
+        self._attr_entity_registry_enabled_default = (
+            int(group.group_id) not in router.disabled_groups
+        )
+        self._build_options()
+
+    async def async_added_to_hass(self):
+        """Follow the group, and rebuild the options on a scene change.
+
+        Disabled entities are never added, so they never subscribe.
+        """
         self.register_subscription()
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                self.router.scenes_updated_signal,
+                self._async_scenes_updated,
+            )
+        )
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                self.router.availability_signal,
+                self._async_availability_changed,
+            )
+        )
+
+    @callback
+    def _async_availability_changed(self):
+        """Write state when the router connection goes up or down."""
+        self.router.state_writer.async_schedule_write(self)
+
+    @callback
+    def _async_scenes_updated(self):
+        """Handle a scene configuration change on the router."""
+        self._build_options()
+        self.async_write_ha_state()
+
+    def _build_options(self):
+        """Take the group's options, and the address of each, from the name index."""
+        self._option_addresses = self.router.scene_names.options(
+            int(self.group.group_id)
+        )
+        self._options = list(self._option_addresses)
 
     @property
     def current_option(self):
         """Get current selected option."""
-        current_scene_address = self.group.get_last_scene_address()
-        current_scene = self.router.api.scenes.get_scene(current_scene_address)
-
-        return _render_scene_name(current_scene)
+        return self.router.scene_names.name(self.group.get_last_scene_address())
 
     @property
     def unique_id(self):
         """Get unique id."""
-        return f"{self.group.group_id}-select"
+        return _select_unique_id(self.group.group_id)
 
     @property
     def options(self):
         """Get the options."""
-        scenes = self.router.api.groups.get_scenes_for_group(
-            self.group.group_id, only_named=False
-        )
-
-        return [_render_scene_name(scene) for scene in scenes]
+        return self._options
 
     def register_subscription(self):
         """Register subscription."""
 
         async def async_router_callback_group(group_id):
             _LOGGER.info("Group %s update callback has been received", group_id)
-            self.async_write_ha_state()
+            self.router.state_writer.async_schedule_write(self)
 
         result = self.router.api.groups.register_subscription(
             self.group.group_id, async_router_callback_group
@@ -76,6 +151,18 @@ class HelvarGroup(SelectEntity):
             _LOGGER.error(
                 "Could not register for a callback for group %s", self.group.group_id
             )
+            return
+
+        self.async_on_remove(
+            lambda: self.router.api.groups.unregister_subscription(
+                self.group.group_id, async_router_callback_group
+            )
+        )
+
+    @property
+    def available(self):
+        """Return True if the router is reachable."""
+        return self.router.available
 
     @property
     def name(self):
@@ -85,11 +172,16 @@ class HelvarGroup(SelectEntity):
     async def async_select_option(self, option: str) -> None:
         """Change the selected option."""
 
-        # translate UI string back to address. (Hass should really be using key:value pairs...)
-        scene_address = _scene_string_to_address(option)
+        scene_address = self._option_addresses.get(option)
 
-        # call scene change for group
-        await self.router.api.groups.set_scene(scene_address)
+        if scene_address is None:
+            _LOGGER.error(
+                "Unknown scene %s for group %s", option, self.group.group_id
+            )
+            return
+
+        # Held by the scheduler while the router is unreachable.
+        await self.router.scheduler.async_recall_scene(scene_address)
 
     # async def async_update(self):
     #     """Fetch new state data for this light.
@@ -99,19 +191,3 @@ class HelvarGroup(SelectEntity):
     #     # the underlying objects are automatically updated, and all properties read directly from
     #     # those objects. Nothing to do here.
     #     return True
-
-
-def _render_scene_name(scene):
-    """Render scene name for hass."""
-    if scene is None:
-        return None
-    if scene.name:
-        return f"{scene.name} - {scene.address}"
-    return f"Unnamed - {scene.address}"
-
-
-def _scene_string_to_address(scene_string):
-    """Convert hass name for scene to a SceneAddress."""
-
-    scene_address = scene_string.rsplit(" - ", maxsplit=1)[1].strip(" ")
-    return aiohelvar.SceneAddress.fromString(scene_address)
@@ -0,0 +1,229 @@
+"""Diagnostic sensors for the link to a Helvar router."""
+from __future__ import annotations
+
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import timedelta
+import logging
+
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
+)
+from homeassistant.const import PERCENTAGE, EntityCategory, UnitOfTime
+
+from .const import DOMAIN as HELVAR_DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+# The values are read from counters kept in memory, so polling is cheap.
+SCAN_INTERVAL = timedelta(seconds=30)
+
+
+def _latency(percent):
+    """Return a function reading a router's latency percentile in milliseconds."""
+
+    def value(router, key):
+        latency = router.pipeline.latency_for(key).percentile(percent)
+        return None if latency is None else round(latency * 1000, 1)
+
+    return value
+
+
+def _discovery_duration(router):
+    duration = router.metrics["discovery_duration"]
+    return None if duration is None else round(duration, 2)
+
+
+def _discovery_progress(router):
+    return None if router.discovery is None else router.discovery.percent
+
+
+def _discovery_subnets(router):
+    """Return the devices discovered and failed so far on each subnet."""
+    return None if router.discovery is None else router.discovery.progress
+
+
+def _link_mode(router):
+    return "degraded" if router.watchdog.degraded else "normal"
+
+
+def _watchdog_stats(router):
+    """Return the rolling latency in milliseconds and how often the mode changed."""
+    latency = router.watchdog.latency
+    return {
+        "rolling_latency": None if latency is None else round(latency * 1000, 1),
+        **router.watchdog.stats,
+    }
+
+
+@dataclass(frozen=True, kw_only=True)
+class HelvarSensorEntityDescription(SensorEntityDescription):
+    """Describes a Helvar diagnostic sensor."""
+
+    value_fn: Callable
+    attributes_fn: Callable | None = None
+    # Measured for each router, and given the router's key, rather than once for
+    # the workgroup.
+    per_router: bool = False
+
+
+SENSORS = (
+    HelvarSensorEntityDescription(
+        key="latency_p50",
+        per_router=True,
+        name="command latency p50",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=_latency(50),
+    ),
+    HelvarSensorEntityDescription(
+        key="latency_p95",
+        per_router=True,
+        name="command latency p95",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=_latency(95),
+    ),
+    HelvarSensorEntityDescription(
+        key="latency_p99",
+        per_router=True,
+        name="command latency p99",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=_latency(99),
+    ),
+    HelvarSensorEntityDescription(
+        key="command_rate",
+        per_router=True,
+        name="commands per second",
+        native_unit_of_measurement="commands/s",
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda router, key: round(router.pipeline.commands_for(key).rate(), 2),
+    ),
+    HelvarSensorEntityDescription(
+        key="queue_depth",
+        per_router=True,
+        name="command queue depth",
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda router, key: router.queue_depth_for(key),
+    ),
+    HelvarSensorEntityDescription(
+        key="notification_rate",
+        name="notifications per second",
+        native_unit_of_measurement="notifications/s",
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda router: round(router.notifications.rate(), 2),
+    ),
+    HelvarSensorEntityDescription(
+        key="reconnects",
+        per_router=True,
+        name="reconnects",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda router, key: router.reconnects_for(key),
+    ),
+    HelvarSensorEntityDescription(
+        key="discovery_duration",
+        name="last discovery duration",
+        device_class=SensorDeviceClass.DURATION,
+        native_unit_of_measurement=UnitOfTime.SECONDS,
+        value_fn=_discovery_duration,
+    ),
+    HelvarSensorEntityDescription(
+        key="discovery_progress",
+        name="discovery progress",
+        native_unit_of_measurement=PERCENTAGE,
+        value_fn=_discovery_progress,
+        attributes_fn=_discovery_subnets,
+    ),
+    HelvarSensorEntityDescription(
+        key="prediction_divergence",
+        name="prediction divergence",
+        native_unit_of_measurement=PERCENTAGE,
+        value_fn=lambda router: router.optimistic.divergence,
+        attributes_fn=lambda router: router.optimistic.stats,
+    ),
+    HelvarSensorEntityDescription(
+        key="link_mode",
+        name="link mode",
+        device_class=SensorDeviceClass.ENUM,
+        options=["normal", "degraded"],
+        value_fn=_link_mode,
+        attributes_fn=_watchdog_stats,
+    ),
+)
+
+
+async def async_setup_entry(hass, config_entry, async_add_entities):
+    """Set up Helvar diagnostic sensors from a config entry.
+
+    Link sensors are created for each router in the workgroup, the rest once.
+    """
+
+    router = hass.data[HELVAR_DOMAIN][config_entry.entry_id]
+
+    async_add_entities(
+        HelvarDiagnosticSensor(router, description, key)
+        for description in SENSORS
+        for key in (router.routers if description.per_router else (None,))
+    )
+
+
+class HelvarDiagnosticSensor(SensorEntity):
+    """A measurement of how the link to a Helvar router is performing."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    entity_description: HelvarSensorEntityDescription
+
+    def __init__(self, router, description: HelvarSensorEntityDescription, key=None):
+        """Initialize the sensor.
+
+        key is the cluster and router id of the router a link sensor measures.
+        """
+        self.router = router
+        self.entity_description = description
+        self.key = key
+
+    @property
+    def _primary(self):
+        """Return True if the sensor is for the whole workgroup or its first router."""
+        return self.key is None or self.router.routers.get(self.key) is self.router.api
+
+    @property
+    def unique_id(self):
+        """Get unique id.
+
+        The first router's sensors keep the ids they had before the other routers
+        had sensors of their own.
+        """
+        entry_id = self.router.config_entry.entry_id
+        if self._primary:
+            return f"{entry_id}-{self.entity_description.key}"
+        cluster, router = self.key
+        return f"{entry_id}-{cluster}.{router}-{self.entity_description.key}"
+
+    @property
+    def name(self):
+        """Return the display name of this sensor."""
+        host = self.router.host if self._primary else self.router.routers[self.key].host
+        return f"Helvar {host} {self.entity_description.name}"
+
+    @property
+    def native_value(self):
+        """Return the current measurement."""
+        if self.entity_description.per_router:
+            return self.entity_description.value_fn(self.router, self.key)
+        return self.entity_description.value_fn(self.router)
+
+    @property
+    def extra_state_attributes(self):
+        """Return the breakdown of the measurement, if it has one."""
+        if self.entity_description.attributes_fn is None:
+            return None
+        return self.entity_description.attributes_fn(self.router)
@@ -0,0 +1,313 @@
+"""Services for Helvar workgroups."""
+from __future__ import annotations
+
+import logging
+
+import aiohelvar
+import voluptuous as vol
+
+from homeassistant.components.light import ATTR_TRANSITION, VALID_TRANSITION
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+)
+from homeassistant.exceptions import HomeAssistantError, ServiceValidationError
+from homeassistant.helpers import config_validation as cv
+
+from .const import DOMAIN
+from .protocol import (
+    level_to_brightness,
+    store_as_scene_group,
+    transition_to_fade_time,
+)
+from .topology import SCENE_BLOCKS, SCENES_PER_BLOCK, address_from_string
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_BULK_SET = "bulk_set"
+SERVICE_STORE_SCENE = "store_scene"
+SERVICE_RECALL_SCENE = "recall_scene"
+
+ATTR_CONFIG_ENTRY_ID = "config_entry_id"
+ATTR_TARGETS = "targets"
+ATTR_ADDRESS = "address"
+ATTR_GROUP = "group"
+ATTR_LEVEL = "level"
+ATTR_BLOCK = "block"
+ATTR_SCENE = "scene"
+ATTR_FORCE = "force"
+
+# Outcomes of each target of a bulk set.
+STATUS_SENT = "sent"
+STATUS_REPLACED = "replaced"
+STATUS_DEFERRED = "deferred"
+STATUS_FAILED = "failed"
+
+# Transitions are taken as the light services take them, and clamped to the
+# longest fade time HelvarNet allows when they are sent.
+_TRANSITION = VALID_TRANSITION
+_BLOCK = vol.All(vol.Coerce(int), vol.Range(min=SCENE_BLOCKS[0], max=SCENE_BLOCKS[-1]))
+_SCENE = vol.All(
+    vol.Coerce(int), vol.Range(min=SCENES_PER_BLOCK[0], max=SCENES_PER_BLOCK[-1])
+)
+
+
+def _valid_target(target):
+    """Check a target has something to set, and only recalls scenes on groups."""
+
+    if (ATTR_ADDRESS in target) == (ATTR_GROUP in target):
+        raise vol.Invalid("each target needs exactly one of address or group")
+    if (ATTR_LEVEL in target) == (ATTR_SCENE in target):
+        raise vol.Invalid("each target needs exactly one of level or scene")
+    if ATTR_SCENE in target and ATTR_GROUP not in target:
+        raise vol.Invalid("scenes can only be recalled on a group")
+    return target
+
+
+TARGET_SCHEMA = vol.All(
+    vol.Schema(
+        {
+            vol.Optional(ATTR_ADDRESS): cv.string,
+            vol.Optional(ATTR_GROUP): vol.Coerce(int),
+            vol.Optional(ATTR_LEVEL): vol.All(
+                vol.Coerce(float), vol.Range(min=0, max=100)
+            ),
+            vol.Optional(ATTR_BLOCK, default=1): _BLOCK,
+            vol.Optional(ATTR_SCENE): _SCENE,
+            vol.Optional(ATTR_TRANSITION): _TRANSITION,
+        }
+    ),
+    _valid_target,
+)
+
+BULK_SET_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Optional(ATTR_TRANSITION): _TRANSITION,
+        vol.Required(ATTR_TARGETS): vol.All(
+            cv.ensure_list, vol.Length(min=1), [TARGET_SCHEMA]
+        ),
+    }
+)
+
+_SCENE_FIELDS = {
+    vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+    vol.Required(ATTR_GROUP): vol.Coerce(int),
+    vol.Optional(ATTR_BLOCK, default=1): _BLOCK,
+    vol.Required(ATTR_SCENE): _SCENE,
+}
+
+STORE_SCENE_SCHEMA = vol.Schema(
+    {**_SCENE_FIELDS, vol.Optional(ATTR_FORCE, default=False): cv.boolean}
+)
+
+RECALL_SCENE_SCHEMA = vol.Schema(
+    {**_SCENE_FIELDS, vol.Optional(ATTR_TRANSITION): _TRANSITION}
+)
+
+
+def async_setup_services(hass: HomeAssistant):
+    """Register the Helvar services."""
+
+    async def async_bulk_set(call: ServiceCall) -> ServiceResponse:
+        return await async_handle_bulk_set(hass, call)
+
+    async def async_store_scene(call: ServiceCall) -> ServiceResponse:
+        return await async_handle_store_scene(hass, call)
+
+    async def async_recall_scene(call: ServiceCall) -> None:
+        await async_handle_recall_scene(hass, call)
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_BULK_SET,
+        async_bulk_set,
+        schema=BULK_SET_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_STORE_SCENE,
+        async_store_scene,
+        schema=STORE_SCENE_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_RECALL_SCENE,
+        async_recall_scene,
+        schema=RECALL_SCENE_SCHEMA,
+    )
+
+
+def _router_for(hass, entry_id):
+    """Return the router of a config entry, or the only one if none is given."""
+
+    routers = {
+        key: router
+        for key, router in hass.data.get(DOMAIN, {}).items()
+        if router is not None
+    }
+
+    if entry_id is not None:
+        router = routers.get(entry_id)
+        if router is None:
+            raise ServiceValidationError(f"No Helvar workgroup with entry {entry_id}")
+        return router
+
+    if len(routers) != 1:
+        raise ServiceValidationError(
+            f"{len(routers)} Helvar workgroups are set up, pick one with "
+            f"{ATTR_CONFIG_ENTRY_ID}"
+        )
+    return next(iter(routers.values()))
+
+
+def _scene_address(router, data):
+    """Return the scene address a call names, if its group exists."""
+
+    if data[ATTR_GROUP] not in router.api.groups.groups:
+        raise ServiceValidationError(f"No Helvar group {data[ATTR_GROUP]}")
+    return aiohelvar.SceneAddress(data[ATTR_GROUP], data[ATTR_BLOCK], data[ATTR_SCENE])
+
+
+async def async_handle_store_scene(hass, call: ServiceCall) -> ServiceResponse:
+    """Store the current level of every member of a group as one of its scenes.
+
+    Anything still queued is sent first, so levels just set are the ones stored.
+    The router stores the scene itself, with one command however many members
+    the group has, and our copy of the members' scene levels is updated to
+    match. Returns the scene address and the devices stored.
+    """
+
+    router = _router_for(hass, call.data.get(ATTR_CONFIG_ENTRY_ID))
+    scene_address = _scene_address(router, call.data)
+
+    if not router.available:
+        raise HomeAssistantError(f"Helvar router at {router.host} is unreachable")
+
+    await router.scheduler.async_flush()
+    await router.pipeline.async_send_message(
+        router.api, store_as_scene_group(scene_address, call.data[ATTR_FORCE])
+    )
+
+    devices = router.scene_levels.store_scene(
+        router.api, scene_address, call.data[ATTR_FORCE]
+    )
+
+    _LOGGER.debug("Stored %s device levels as scene %s", len(devices), scene_address)
+
+    return {
+        "scene_address": str(scene_address),
+        "devices": [str(device.address) for device in devices],
+    }
+
+
+async def async_handle_recall_scene(hass, call: ServiceCall):
+    """Recall a group scene, as one command however many members it sets."""
+
+    router = _router_for(hass, call.data.get(ATTR_CONFIG_ENTRY_ID))
+    scene_address = _scene_address(router, call.data)
+
+    transition = call.data.get(ATTR_TRANSITION)
+    await router.scheduler.async_recall_scene(
+        scene_address,
+        None if transition is None else transition_to_fade_time(transition),
+    )
+
+
+async def async_handle_bulk_set(hass, call: ServiceCall) -> ServiceResponse:
+    """Set many devices and groups to levels or scenes in one batch.
+
+    Every target is queued with the router's command scheduler and then flushed
+    at once, so device levels that cover whole groups are packed into scene
+    recalls, and later targets replace earlier ones for the same devices. Levels
+    are sent exactly as given. Returns the outcome of each target, in order, and
+    the number of commands sent.
+    """
+
+    router = _router_for(hass, call.data.get(ATTR_CONFIG_ENTRY_ID))
+    scheduler = router.scheduler
+    default_transition = call.data.get(ATTR_TRANSITION)
+
+    results = []
+    queued = []
+
+    for target in call.data[ATTR_TARGETS]:
+        result = {
+            key: target[key] for key in (ATTR_ADDRESS, ATTR_GROUP) if key in target
+        }
+        results.append(result)
+
+        transition = target.get(ATTR_TRANSITION, default_transition)
+        fade_time = None if transition is None else transition_to_fade_time(transition)
+
+        try:
+            queued.append((result, await _async_queue(router, target, fade_time)))
+        except ValueError as err:
+            result["status"] = STATUS_FAILED
+            result["error"] = str(err)
+
+    # Anything no longer pending as queued was replaced by a later target.
+    for result, (table, key, value) in queued:
+        if getattr(scheduler, table).get(key) != value:
+            result["status"] = STATUS_REPLACED
+
+    sent = scheduler.stats["sent"] + scheduler.stats["group_commands"]
+    await scheduler.async_flush()
+    commands = scheduler.stats["sent"] + scheduler.stats["group_commands"] - sent
+
+    # Commands for a router that is down are held by the scheduler.
+    for result, (table, key, _value) in queued:
+        if "status" not in result:
+            deferred = key in getattr(scheduler, table)
+            result["status"] = STATUS_DEFERRED if deferred else STATUS_SENT
+
+    _LOGGER.debug("Bulk set of %s targets sent as %s commands", len(results), commands)
+
+    return {"results": results, "commands": commands}
+
+
+async def _async_queue(router, target, fade_time):
+    """Queue one target with the scheduler.
+
+    Returns the name of the scheduler's pending table it went into, its key
+    there and the value queued. Raises ValueError if the target doesn't exist.
+    """
+
+    scheduler = router.scheduler
+    api = router.api
+
+    if ATTR_ADDRESS in target:
+        try:
+            address = address_from_string(target[ATTR_ADDRESS].lstrip("@"))
+        except (ValueError, TypeError) as err:
+            raise ValueError(f"invalid address {target[ATTR_ADDRESS]}") from err
+        device = api.devices.devices.get(address)
+        if device is None:
+            raise ValueError("unknown device")
+        if not device.is_load:
+            raise ValueError("device has no level")
+
+        level = target[ATTR_LEVEL]
+        brightness = level_to_brightness(level)
+        await scheduler.async_set_brightness(address, brightness, fade_time, level)
+        return "pending", address, (brightness, fade_time, level)
+
+    group_id = target[ATTR_GROUP]
+    if group_id not in api.groups.groups:
+        raise ValueError("unknown group")
+
+    if ATTR_SCENE in target:
+        scene_address = aiohelvar.SceneAddress(
+            group_id, target[ATTR_BLOCK], target[ATTR_SCENE]
+        )
+        await scheduler.async_recall_scene(scene_address, fade_time)
+        return "pending_scenes", group_id, (scene_address, fade_time)
+
+    level = target[ATTR_LEVEL]
+    brightness = level_to_brightness(level)
+    await scheduler.async_set_group_brightness(group_id, brightness, fade_time, level)
+    return "pending_groups", group_id, (brightness, fade_time, level)
@@ -0,0 +1,77 @@
+"""Batched entity state writes for a Helvar router."""
+from __future__ import annotations
+
+import logging
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class StateWriter:
+    """Merge entity state writes requested by router notifications.
+
+    A scene recall on a large group notifies every member device and the group in
+    the same event loop tick. Entities ask for a write here instead of writing
+    straight away, and each entity is written once when the window closes.
+    """
+
+    def __init__(self, hass, window: float):
+        """Initialize the writer.
+
+        window is how long to collect updates for, in seconds.
+        """
+        self.hass = hass
+        self.window = window
+        # A dict rather than a set so entities are written in the order they changed.
+        self.pending = {}
+        self.stats = {"received": 0, "written": 0}
+        self._unsub_write = None
+
+    @callback
+    def async_schedule_write(self, entity):
+        """Write the entity's state when the current window closes."""
+
+        self.stats["received"] += 1
+        self.pending[entity] = None
+
+        if self._unsub_write is None:
+            self._unsub_write = async_call_later(
+                self.hass, self.window, self._async_write_callback
+            )
+
+    @callback
+    def _async_write_callback(self, _now):
+        """Write pending entities when the timer fires."""
+        self._unsub_write = None
+        self.async_write()
+
+    @callback
+    def async_write(self):
+        """Write the state of every pending entity once."""
+
+        if self._unsub_write is not None:
+            self._unsub_write()
+            self._unsub_write = None
+
+        pending, self.pending = self.pending, {}
+
+        for entity in pending:
+            if entity.hass is None:
+                # Removed before the window closed.
+                continue
+            entity.async_write_ha_state()
+            self.stats["written"] += 1
+
+        _LOGGER.debug("Wrote state for %s entities", len(pending))
+
+    @callback
+    def async_shutdown(self):
+        """Drop pending writes and stop the timer."""
+
+        if self._unsub_write is not None:
+            self._unsub_write()
+            self._unsub_write = None
+
+        self.pending = {}
@@ -0,0 +1,136 @@
+"""Connection supervision for a Helvar router."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+
+import aiohelvar
+from aiohelvar.parser.command import Command
+from aiohelvar.parser.command_type import CommandType
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds between keepalive queries.
+KEEPALIVE_INTERVAL = 30
+# Seconds to wait for a keepalive reply before treating the link as dead.
+KEEPALIVE_TIMEOUT = 10
+# Seconds to wait for a reconnect, which reads the workgroup name, to finish.
+CONNECT_TIMEOUT = 15
+# Reconnect delays double from the minimum up to the maximum, in seconds.
+RECONNECT_DELAY_MIN = 1
+RECONNECT_DELAY_MAX = 300
+
+
+class ConnectionSupervisor:
+    """Keep one router connection alive, and reconnect it when it dies.
+
+    The router is queried for its time every KEEPALIVE_INTERVAL. If it doesn't
+    answer the link is marked down, and reconnects are tried with a jittered,
+    doubling delay until one succeeds.
+
+    aiohelvar runs a keepalive of its own on every connection, which reconnects
+    by itself. It is stopped, so the two never reconnect at once.
+    """
+
+    def __init__(self, router, api):
+        """Initialize the supervisor.
+
+        router is the HelvarRouter that's told about link changes, api the
+        aiohelvar router whose connection is supervised.
+        """
+        self.router = router
+        self.api = api
+        self.available = True
+        self.stats = {"keepalives": 0, "failures": 0, "reconnects": 0}
+        _stop_library_keepalive(api)
+
+    async def async_run(self):
+        """Supervise the connection forever."""
+
+        while True:
+            await asyncio.sleep(KEEPALIVE_INTERVAL)
+
+            if await self.async_ping():
+                continue
+
+            self.stats["failures"] += 1
+            _LOGGER.warning(
+                "Lost connection to Helvar router at %s, reconnecting", self.api.host
+            )
+            self._set_available(False)
+            await self.async_reconnect()
+            self._set_available(True)
+            await self.router.async_link_restored(self.api)
+
+    async def async_ping(self):
+        """Return True if the router answers a keepalive query in time."""
+
+        self.stats["keepalives"] += 1
+
+        try:
+            await self.router.pipeline.async_query(
+                self.api, Command(CommandType.QUERY_ROUTER_TIME), KEEPALIVE_TIMEOUT
+            )
+        except (asyncio.TimeoutError, aiohelvar.CommandResponseTimeout, OSError):
+            return False
+
+        return True
+
+    async def async_reconnect(self):
+        """Reconnect, waiting a little longer after each failed attempt."""
+
+        attempt = 0
+
+        while True:
+            delay = min(RECONNECT_DELAY_MAX, RECONNECT_DELAY_MIN * 2**attempt)
+            # Jitter so a site full of routers doesn't reconnect in lockstep.
+            await asyncio.sleep(delay / 2 + random.uniform(0, delay / 2))
+
+            try:
+                await self._async_disconnect()
+                await asyncio.wait_for(self.api.connect(), CONNECT_TIMEOUT)
+            except (
+                OSError,
+                asyncio.TimeoutError,
+                aiohelvar.CommandResponseTimeout,
+            ) as err:
+                attempt += 1
+                _LOGGER.debug(
+                    "Reconnect %s to Helvar router at %s failed: %s",
+                    attempt,
+                    self.api.host,
+                    err,
+                )
+                continue
+
+            _stop_library_keepalive(self.api)
+            self.stats["reconnects"] += 1
+            _LOGGER.info("Reconnected to Helvar router at %s", self.api.host)
+            return
+
+    async def _async_disconnect(self):
+        """Close what's left of the old connection."""
+
+        if not self.api.connected:
+            return
+
+        try:
+            await self.api.disconnect()
+        except (OSError, AttributeError):
+            # The connection may be half set up or already broken.
+            self.api.connected = False
+
+    def _set_available(self, available):
+        """Record link state and tell the router's entities."""
+        self.available = available
+        self.router.async_link_changed(self.api)
+
+
+def _stop_library_keepalive(api):
+    """Stop the keepalive aiohelvar starts on each connection."""
+
+    task = getattr(api, "_keep_alive_task", None)
+    if task is not None:
+        task.cancel()
+        api._keep_alive_task = None
@@ -0,0 +1,263 @@
+"""Incremental sync of a Helvar workgroup's configuration."""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+
+import aiohelvar
+from aiohelvar.devices import Device
+from aiohelvar.groups import Group, blockscene_to_block_and_scene
+from aiohelvar.parser.command import Command
+from aiohelvar.parser.command_parameter import CommandParameter, CommandParameterType
+from aiohelvar.parser.command_type import CommandType
+from aiohelvar.scenes import Scene
+
+from .topology import (
+    SCENE_BLOCKS,
+    SCENES_PER_BLOCK,
+    TopologyDiff,
+    address_from_string,
+    address_to_string,
+    dump_topology,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+SUBNETS = range(1, 5)
+
+
+def _group_command(command_type, group_id):
+    return Command(
+        command_type, [CommandParameter(CommandParameterType.GROUP, int(group_id))]
+    )
+
+
+async def _async_result(pipeline, api, command):
+    """Return the result of a query, or None if the router has nothing to say."""
+    response = await pipeline.async_query(api, command)
+    return response.result or None
+
+
+async def async_read_configuration(pipeline, routers) -> dict:
+    """Read the parts of a workgroup's configuration that are cheap to query.
+
+    That is the workgroup name, the type and address of every device, the name
+    and members of every group, and the scene names. It takes a few queries per
+    router and two per group, where a full discovery takes four or five per
+    device. Device names and scene levels can only be read device by device, so
+    they aren't included.
+    """
+
+    primary = routers[0]
+
+    async def async_read_subnet(api, subnet):
+        result = await _async_result(
+            pipeline,
+            api,
+            Command(
+                CommandType.QUERY_DEVICE_TYPES_AND_ADDRESSES,
+                command_address=aiohelvar.HelvarAddress(
+                    api.cluster_id, api.router_id, subnet
+                ),
+            ),
+        )
+        devices = {}
+        for entry in (result or "").split(","):
+            raw_type, _, device_id = entry.partition("@")
+            if device_id:
+                address = aiohelvar.HelvarAddress(
+                    api.cluster_id, api.router_id, subnet, device_id
+                )
+                devices[address_to_string(address)] = raw_type
+        return devices
+
+    async def async_read_group(group_id):
+        name, members = await asyncio.gather(
+            _async_result(
+                pipeline,
+                primary,
+                _group_command(CommandType.QUERY_GROUP_DESCRIPTION, group_id),
+            ),
+            _async_result(
+                pipeline, primary, _group_command(CommandType.QUERY_GROUP, group_id)
+            ),
+        )
+        return {
+            "name": name,
+            "devices": [
+                member.strip().lstrip("@")
+                for member in (members or "").split(",")
+                if member.strip()
+            ],
+        }
+
+    workgroup_name, group_list, scene_names = await asyncio.gather(
+        _async_result(pipeline, primary, Command(CommandType.QUERY_WORKGROUP_NAME)),
+        _async_result(pipeline, primary, Command(CommandType.QUERY_GROUPS)),
+        _async_result(pipeline, primary, Command(CommandType.QUERY_SCENE_NAMES)),
+    )
+
+    group_ids = [
+        str(int(group_id)) for group_id in (group_list or "").split(",") if group_id
+    ]
+    groups = await asyncio.gather(*(async_read_group(g) for g in group_ids))
+    subnets = await asyncio.gather(
+        *(async_read_subnet(api, subnet) for api in routers for subnet in SUBNETS)
+    )
+
+    scenes = {}
+    for part in (scene_names or "").strip("@").split("@"):
+        address, _, name = part.partition(":")
+        if not name:
+            continue
+        try:
+            scenes[str(aiohelvar.SceneAddress.fromString(address))] = name
+        except (ValueError, TypeError):
+            _LOGGER.debug("Ignoring scene name %s", part)
+
+    devices = {}
+    for subnet in subnets:
+        devices.update(subnet)
+
+    return {
+        "workgroup_name": workgroup_name,
+        "devices": devices,
+        "groups": dict(zip(group_ids, groups)),
+        "scenes": scenes,
+    }
+
+
+def configuration_checksum(configuration: dict) -> str:
+    """Return a checksum of a configuration read by async_read_configuration.
+
+    HelvarNet has no configuration checksum or modification time of its own.
+    """
+    return hashlib.sha1(json.dumps(configuration, sort_keys=True).encode()).hexdigest()
+
+
+def diff_configuration(api, configuration: dict) -> TopologyDiff:
+    """Compare a live router with a configuration read from the routers."""
+
+    live = dump_topology(api)
+    diff = TopologyDiff()
+
+    devices = configuration["devices"]
+    diff.added_devices.extend(sorted(devices.keys() - live["devices"].keys()))
+    diff.removed_devices.extend(sorted(live["devices"].keys() - devices.keys()))
+
+    groups = configuration["groups"]
+    diff.added_groups.extend(sorted(groups.keys() - live["groups"].keys(), key=int))
+    diff.removed_groups.extend(sorted(live["groups"].keys() - groups.keys(), key=int))
+    diff.changed_groups.extend(
+        sorted(
+            (
+                group_id
+                for group_id in groups.keys() & live["groups"].keys()
+                if groups[group_id]["name"] != live["groups"][group_id]["name"]
+                or groups[group_id]["devices"] != live["groups"][group_id]["devices"]
+            ),
+            key=int,
+        )
+    )
+
+    scenes = configuration["scenes"]
+    diff.changed_scenes.extend(
+        sorted(
+            scene
+            for scene in scenes.keys() | live["scenes"].keys()
+            if scenes.get(scene) != live["scenes"].get(scene)
+        )
+    )
+
+    return diff
+
+
+async def async_read_device(pipeline, api, address, raw_type) -> Device:
+    """Read the name, state, level and scene levels of a new device."""
+
+    device = Device(address, raw_type)
+
+    async def async_query(command_type):
+        return await _async_result(
+            pipeline, api, Command(command_type, command_address=address)
+        )
+
+    device.name = await async_query(CommandType.QUERY_DEVICE_DESCRIPTION)
+    device.state = await async_query(CommandType.QUERY_DEVICE_STATE) or 0
+
+    if device.is_load:
+        level = await async_query(CommandType.QUERY_DEVICE_LOAD_LEVEL)
+        device.load_level = float(level or 0)
+        levels = await async_query(CommandType.QUERY_SCENE_INFO)
+        if levels:
+            device.set_scene_levels(levels.split(","))
+
+    return device
+
+
+async def async_apply_configuration(pipeline, api, configuration, diff, api_for):
+    """Bring a live router up to date with a configuration, as diff describes.
+
+    New devices are read in full from the router that owns them, found with
+    api_for, and registered with both. New groups are registered with every
+    scene, like discovery does. Existing groups and scenes are updated in place
+    and returned so their subscribers can be told. Removed devices and groups
+    are left for the caller, which has entities to remove first.
+    """
+
+    updated = []
+
+    async def async_add_device(address_string):
+        address = address_from_string(address_string)
+        owner = api_for(address)
+        device = await async_read_device(
+            pipeline, owner, address, configuration["devices"][address_string]
+        )
+        api.devices.register_device(device)
+        if owner is not api:
+            owner.devices.register_device(device)
+
+    await asyncio.gather(*(async_add_device(a) for a in diff.added_devices))
+
+    for group_id in diff.added_groups:
+        group = Group(int(group_id))
+        api.groups.register_group(group)
+        for block in SCENE_BLOCKS:
+            for scene in SCENES_PER_BLOCK:
+                scene_address = aiohelvar.SceneAddress(int(group_id), block, scene)
+                api.scenes.register_scene(scene_address, Scene(scene_address))
+
+        last_scene = await _async_result(
+            pipeline,
+            api,
+            _group_command(CommandType.QUERY_LAST_SCENE_IN_GROUP, group_id),
+        )
+        if last_scene is not None:
+            block, scene = blockscene_to_block_and_scene(int(last_scene))
+            group.last_scene_address = aiohelvar.SceneAddress(
+                int(group_id), int(block), int(scene)
+            )
+
+    for group_id in (*diff.added_groups, *diff.changed_groups):
+        group = api.groups.groups[int(group_id)]
+        data = configuration["groups"][group_id]
+        group.name = data["name"]
+        group.devices = [address_from_string(a) for a in data["devices"]]
+        if group_id in diff.changed_groups:
+            updated.append(group)
+
+    for scene in diff.changed_scenes:
+        scene_address = aiohelvar.SceneAddress.fromString(scene)
+        if scene_address.group in api.groups.groups:
+            if not api.scenes.has_scene(scene_address):
+                api.scenes.register_scene(scene_address, Scene(scene_address))
+            api.scenes.update_scene_name(
+                scene_address, configuration["scenes"].get(scene)
+            )
+
+    if configuration["workgroup_name"]:
+        api.workgroup_name = configuration["workgroup_name"]
+
+    return updated
@@ -0,0 +1,269 @@
+"""Persistent cache of a Helvar workgroup's topology."""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import logging
+
+import aiohelvar
+from aiohelvar.devices import Device
+from aiohelvar.groups import Group
+from aiohelvar.scenes import Scene
+from aiohelvar.static import DigidimType
+
+from homeassistant.helpers.storage import Store
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+STORAGE_KEY = "helvar.topology.{}"
+
+# Mirrors the block range aiohelvar registers scenes for.
+SCENE_BLOCKS = range(1, 254)
+SCENES_PER_BLOCK = range(1, 17)
+
+
+class TopologyStore:
+    """Load and save the discovered topology of a router in HA storage."""
+
+    def __init__(self, hass, entry_id):
+        """Initialize the store."""
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY.format(entry_id))
+
+    async def async_load(self):
+        """Return the cached topology, or None if nothing has been saved."""
+        return await self._store.async_load()
+
+    async def async_save(self, topology: dict):
+        """Save a topology produced by dump_topology."""
+        await self._store.async_save(topology)
+
+    async def async_remove(self):
+        """Remove the cached topology."""
+        await self._store.async_remove()
+
+
+@dataclass(slots=True)
+class TopologyDiff:
+    """Differences between two dumped topologies, keyed by address or group id."""
+
+    added_devices: list = field(default_factory=list)
+    removed_devices: list = field(default_factory=list)
+    changed_devices: list = field(default_factory=list)
+    added_groups: list = field(default_factory=list)
+    removed_groups: list = field(default_factory=list)
+    changed_groups: list = field(default_factory=list)
+    changed_scenes: list = field(default_factory=list)
+
+    def __bool__(self):
+        return any(getattr(self, name) for name in self.__dataclass_fields__)
+
+    def __str__(self):
+        if not self:
+            return "no changes"
+
+        return ", ".join(
+            f"{len(getattr(self, name))} {name.replace('_', ' ')}"
+            for name in self.__dataclass_fields__
+            if getattr(self, name)
+        )
+
+
+def address_to_string(address) -> str:
+    """Return the storage form of a HelvarAddress."""
+    return str(address).lstrip("@")
+
+
+def address_from_string(string) -> aiohelvar.HelvarAddress:
+    """Return the HelvarAddress for its storage form."""
+    return aiohelvar.HelvarAddress(*string.lstrip("@").split("."))
+
+
+def _dump_device_type(device_type):
+    if isinstance(device_type, DigidimType):
+        return {
+            "part_number": device_type.part_number,
+            "name": device_type.name,
+            "is_load": device_type.is_load,
+        }
+    return device_type
+
+
+def _load_device_type(device_type):
+    if isinstance(device_type, dict):
+        return DigidimType(
+            device_type["part_number"], device_type["name"], device_type["is_load"]
+        )
+    return device_type
+
+
+def dump_topology(api) -> dict:
+    """Return a JSON serialisable copy of the devices, groups and scenes of a router."""
+
+    return {
+        "workgroup_name": api.workgroup_name,
+        "devices": {
+            address_to_string(device.address): {
+                "name": device.name,
+                "protocol": device.protocol,
+                "type": _dump_device_type(device.type),
+                "state": device.state,
+                "load_level": device.load_level,
+                "levels": list(device.levels or []),
+            }
+            for device in api.devices.devices.values()
+        },
+        "groups": {
+            str(group.group_id): {
+                "name": group.name,
+                "devices": [address_to_string(address) for address in group.devices],
+                "last_scene": str(group.last_scene_address)
+                if group.last_scene_address
+                else None,
+            }
+            for group in api.groups.groups.values()
+        },
+        "scenes": {
+            str(scene.address): scene.name
+            for scene in api.scenes.scenes.values()
+            if scene.name is not None
+        },
+    }
+
+
+def restore_topology(api, topology: dict):
+    """Register the devices, groups and scenes of a dumped topology with a router."""
+
+    if topology.get("workgroup_name"):
+        api.workgroup_name = topology["workgroup_name"]
+
+    for address, data in topology["devices"].items():
+        device = Device(address_from_string(address), name=data["name"])
+        device.protocol = data["protocol"]
+        device.type = _load_device_type(data["type"])
+        device.state = data["state"]
+        device.load_level = data["load_level"]
+        device.levels = data["levels"]
+        api.devices.register_device(device)
+
+    for group_id, data in topology["groups"].items():
+        group = Group(int(group_id))
+        group.name = data["name"]
+        group.devices = [address_from_string(address) for address in data["devices"]]
+        if data["last_scene"]:
+            group.last_scene_address = aiohelvar.SceneAddress.fromString(
+                data["last_scene"]
+            )
+        api.groups.register_group(group)
+
+        for block in SCENE_BLOCKS:
+            for scene in SCENES_PER_BLOCK:
+                scene_address = aiohelvar.SceneAddress(int(group_id), block, scene)
+                api.scenes.register_scene(scene_address, Scene(scene_address))
+
+    for scene_address, name in topology["scenes"].items():
+        api.scenes.update_scene_name(
+            aiohelvar.SceneAddress.fromString(scene_address), name
+        )
+
+
+def diff_topology(old: dict, new: dict) -> TopologyDiff:
+    """Compare two dumped topologies."""
+
+    diff = TopologyDiff()
+
+    for key, added, removed, changed in (
+        ("devices", diff.added_devices, diff.removed_devices, diff.changed_devices),
+        ("groups", diff.added_groups, diff.removed_groups, diff.changed_groups),
+    ):
+        old_items, new_items = old[key], new[key]
+        added.extend(sorted(new_items.keys() - old_items.keys()))
+        removed.extend(sorted(old_items.keys() - new_items.keys()))
+        changed.extend(
+            sorted(
+                item
+                for item in new_items.keys() & old_items.keys()
+                if _static_fields(old_items[item]) != _static_fields(new_items[item])
+            )
+        )
+
+    old_scenes, new_scenes = old["scenes"], new["scenes"]
+    diff.changed_scenes.extend(
+        sorted(
+            scene
+            for scene in old_scenes.keys() | new_scenes.keys()
+            if old_scenes.get(scene) != new_scenes.get(scene)
+        )
+    )
+
+    return diff
+
+
+def _static_fields(item: dict) -> dict:
+    """Return the configuration part of a dumped device or group.
+
+    Live state (levels reached, last scene) changes all the time and isn't a
+    topology change.
+    """
+    return {
+        key: value
+        for key, value in item.items()
+        if key not in ("state", "load_level", "last_scene")
+    }
+
+
+def _copy_attributes(live, scanned, attributes) -> bool:
+    """Copy attributes from scanned to live. Return True if any of them changed."""
+
+    changed = False
+    for attribute in attributes:
+        value = getattr(scanned, attribute)
+        if attribute == "type":
+            # DigidimType has no equality of its own.
+            if _dump_device_type(live.type) == _dump_device_type(value):
+                continue
+        elif getattr(live, attribute) == value:
+            continue
+        setattr(live, attribute, value)
+        changed = True
+    return changed
+
+
+def apply_topology(api, scanned_api, diff: TopologyDiff):
+    """Update a live router with what a fresh scan found.
+
+    Existing device and group objects are updated in place so the entities that
+    hold them keep working, and are returned so their subscribers can be told.
+    New ones are registered. Removed ones are left for the caller, which has
+    their entities to remove first.
+    """
+
+    updated = []
+
+    for address, device in scanned_api.devices.devices.items():
+        live = api.devices.devices.get(address)
+        if live is None:
+            api.devices.register_device(device)
+            continue
+        if _copy_attributes(
+            live,
+            device,
+            ("name", "protocol", "type", "state", "load_level", "levels"),
+        ):
+            updated.append(live)
+
+    for group_id, group in scanned_api.groups.groups.items():
+        live = api.groups.groups.get(group_id)
+        if live is None:
+            api.groups.register_group(group)
+            continue
+        if _copy_attributes(live, group, ("name", "devices", "last_scene_address")):
+            updated.append(live)
+
+    for scene_address, scene in scanned_api.scenes.scenes.items():
+        live = api.scenes.scenes.get(scene_address)
+        if live is None:
+            api.scenes.register_scene(scene_address, scene)
+            continue
+        live.name = scene.name
+
+    return updated
@@ -0,0 +1,141 @@
+"""Latency watchdog for a Helvar router."""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from itertools import islice
+import logging
+import statistics
+
+import aiohelvar
+from aiohelvar.parser.command import Command
+from aiohelvar.parser.command_type import CommandType
+
+from homeassistant.core import callback
+
+from .pipeline import QUERY_TIMEOUT
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds between checks of the rolling latency.
+CHECK_INTERVAL = 5
+# Number of most recent replies the rolling latency is the median of.
+WINDOW = 8
+# Rolling latency, in seconds, above which the router is treated as overloaded,
+# and below which it has recovered. The gap stops the mode flapping.
+DEGRADED_LATENCY = 2.0
+RECOVERED_LATENCY = 0.5
+# Seconds between command flushes while degraded. Levels queued in between are
+# merged, so only the last of them is sent.
+DEGRADED_FLUSH_INTERVAL = 2.0
+# Seconds to wait for the reply to a probe sent while degraded.
+PROBE_TIMEOUT = 10
+
+
+class LatencyWatchdog:
+    """Back off from a router while it is slow to reply, and recover after.
+
+    A router busy with a large DALI scan or a saturated bus can take seconds to
+    answer, and everything sent to it queues up behind the slow replies. Every
+    CHECK_INTERVAL the median of the last WINDOW replies, counting queries that
+    timed out as QUERY_TIMEOUT, is compared with DEGRADED_LATENCY. While it is
+    above, the router is in degraded mode:
+
+    - commands are flushed every DEGRADED_FLUSH_INTERVAL, so intermediate levels
+      are merged and only the final one for each device or group is sent.
+    - level reconciliation and configuration checks are paused.
+    - predicted levels don't expire, as nothing reads them back.
+
+    Nothing else is queried in degraded mode, so the router is probed once per
+    check if no other reply came in. It recovers once the rolling latency drops
+    below RECOVERED_LATENCY.
+    """
+
+    def __init__(self, router):
+        """Initialize the watchdog."""
+        self.router = router
+        self.degraded = False
+        self.samples = deque(maxlen=WINDOW)
+        self.stats = {"degraded": 0, "recovered": 0, "probes": 0}
+        self._queries = 0
+        self._timeouts = 0
+
+    @property
+    def latency(self):
+        """Return the rolling latency in seconds, or None with no replies yet."""
+        return statistics.median(self.samples) if self.samples else None
+
+    async def async_run(self):
+        """Check the rolling latency forever."""
+
+        while True:
+            await asyncio.sleep(CHECK_INTERVAL)
+            if self.degraded and self.router.available and not self._answered():
+                await self.async_probe()
+            self.async_check()
+
+    async def async_probe(self):
+        """Query the router's time, for its latency."""
+
+        self.stats["probes"] += 1
+        try:
+            await self.router.pipeline.async_query(
+                self.router.api, Command(CommandType.QUERY_ROUTER_TIME), PROBE_TIMEOUT
+            )
+        except (asyncio.TimeoutError, aiohelvar.CommandResponseTimeout):
+            # Counted by the pipeline, and so in the rolling latency.
+            pass
+
+    def _answered(self):
+        """Return the number of queries answered or timed out since the last check."""
+
+        stats = self.router.pipeline.stats
+        return stats["queries"] - self._queries + stats["timeouts"] - self._timeouts
+
+    @callback
+    def async_check(self):
+        """Take in replies since the last check, and change mode if need be."""
+
+        pipeline = self.router.pipeline
+        answered = min(pipeline.stats["queries"] - self._queries, WINDOW)
+        self.samples.extend(
+            reversed(list(islice(reversed(pipeline.latency.samples), answered)))
+        )
+        timeouts = min(pipeline.stats["timeouts"] - self._timeouts, WINDOW)
+        self.samples.extend([QUERY_TIMEOUT] * timeouts)
+        self._queries = pipeline.stats["queries"]
+        self._timeouts = pipeline.stats["timeouts"]
+
+        latency = self.latency
+        if latency is None:
+            return
+
+        if not self.degraded and latency > DEGRADED_LATENCY:
+            _LOGGER.warning(
+                "Helvar router at %s is replying in %.2fs, sending only final "
+                "levels and pausing background queries until it recovers",
+                self.router.host,
+                latency,
+            )
+            self.stats["degraded"] += 1
+            self._set_degraded(True)
+
+        elif self.degraded and latency < RECOVERED_LATENCY:
+            _LOGGER.info(
+                "Helvar router at %s is replying in %.2fs again, back to normal",
+                self.router.host,
+                latency,
+            )
+            self.stats["recovered"] += 1
+            self._set_degraded(False)
+
+    def _set_degraded(self, degraded):
+        """Move the scheduler, reconciler and predictions in or out of degraded mode."""
+
+        self.degraded = degraded
+        flush_interval = self.router.flush_interval
+        self.router.scheduler.interval = (
+            max(flush_interval, DEGRADED_FLUSH_INTERVAL) if degraded else flush_interval
+        )
+        self.router.reconciler.paused = degraded
+        self.router.optimistic.async_set_paused(degraded)
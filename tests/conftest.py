@@ -1,8 +1,12 @@
 """Test fixtures for Helvar integration."""
+import asyncio
 import pytest
-from unittest.mock import Mock, AsyncMock, MagicMock
+from unittest.mock import Mock, AsyncMock, MagicMock, patch
 import aiohelvar
 
+from custom_components.helvar.capabilities import KIND_DIMMER
+from custom_components.helvar.pipeline import CommandPipeline
+
 
 @pytest.fixture
 def mock_device():
@@ -23,6 +27,24 @@ def mock_router():
     router.api.devices.get_light_devices = Mock(return_value=[])
     router.api.devices.register_subscription = Mock()
     router.api.devices.set_device_brightness = AsyncMock()
+    router.api.devices.set_device_load_level = AsyncMock()
+    router.api.devices.devices = {}
+    router.api.groups = Mock()
+    router.api.groups.groups = {}
+    router.api.groups.register_subscription = Mock(return_value=True)
+    router.api.groups.set_scene = AsyncMock()
+    router.api_for = Mock(return_value=router.api)
+    router.state_writer = Mock()
+    router.scheduler = Mock()
+    router.scheduler.async_set_brightness = AsyncMock()
+    router.scheduler.async_recall_scene = AsyncMock()
+    router.pipeline = CommandPipeline(4)
+    router.disabled_groups = set()
+    router.in_disabled_groups = Mock(return_value=False)
+    router.device_kind = Mock(return_value=KIND_DIMMER)
+    # Nothing is predicted, so entities show their devices' own levels.
+    router.optimistic = Mock()
+    router.optimistic.brightness = Mock(side_effect=lambda device: device.brightness)
     return router
 
 
@@ -35,9 +57,11 @@ def mock_hass():
     # Mock async_create_task to prevent coroutines from being scheduled
     hass.async_create_task = Mock(return_value=None)
     hass.config_entries.async_forward_entry_setups = Mock(return_value=None)
+
     # async_forward_entry_unload needs to be async for asyncio.gather in unload
     async def mock_unload(*args, **kwargs):
         return True
+
     hass.config_entries.async_forward_entry_unload = mock_unload
     return hass
 
@@ -47,10 +71,48 @@ def mock_config_entry():
     """Create a mock config entry."""
     config_entry = Mock()
     config_entry.entry_id = "test_entry_id"
+    config_entry.options = {}
+    # Close background coroutines so they aren't left un-awaited.
+    config_entry.async_create_background_task = Mock(
+        side_effect=lambda hass, target, name: target.close()
+    )
     return config_entry
 
 
+@pytest.fixture
+def mock_topology_store():
+    """Patch the topology store so nothing is read from or written to disk."""
+    with patch("custom_components.helvar.router.TopologyStore") as store_class:
+        store = store_class.return_value
+        store.async_load = AsyncMock(return_value=None)
+        store.async_save = AsyncMock()
+        yield store
+
+
 @pytest.fixture
 def mock_add_entities():
     """Create a mock add_entities function."""
-    return Mock()
\ No newline at end of file
+    return Mock()
+
+
+@pytest.fixture
+def mock_call_later(request):
+    """Patch async_call_later in a module, so no timer is scheduled on the loop.
+
+    The module's path is the fixture's parameter, given by parametrizing it
+    indirectly.
+    """
+    with patch(f"{request.param}.async_call_later", return_value=Mock()) as call_later:
+        yield call_later
+
+
+@pytest.fixture
+def reply_future():
+    """Return a send_command side effect that is answered straight away."""
+
+    def create_reply_future(command):
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(Mock())
+        return future
+
+    return create_reply_future
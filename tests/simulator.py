@@ -0,0 +1,330 @@
+"""A HelvarNet router simulator for tests and benchmarks.
+
+It speaks enough of the HelvarNet TCP protocol for aiohelvar to discover a
+workgroup, set levels and recall scenes, and pushes scene recall notifications
+to every connected client like a router with notifications enabled. Replies
+are delayed by a configurable bus latency.
+"""
+import asyncio
+import ipaddress
+import re
+
+import aiohelvar
+from aiohelvar.devices import Device
+from aiohelvar.groups import Group
+from aiohelvar.scenes import Scene
+
+# HelvarNet command ids.
+RECALL_SCENE = 11
+DIRECT_LEVEL_GROUP = 13
+DIRECT_LEVEL_DEVICE = 14
+QUERY_DEVICE_TYPES_AND_ADDRESSES = 100
+QUERY_GROUP_DESCRIPTION = 105
+QUERY_DEVICE_DESCRIPTION = 106
+QUERY_WORKGROUP_NAME = 107
+QUERY_LAST_SCENE_IN_GROUP = 109
+QUERY_DEVICE_STATE = 110
+QUERY_DEVICE_LOAD_LEVEL = 152
+QUERY_GROUP = 164
+QUERY_GROUPS = 165
+QUERY_SCENE_NAMES = 166
+QUERY_SCENE_INFO = 167
+QUERY_ROUTER_TIME = 185
+
+# A DALI LED driver.
+LED_DRIVER_TYPE = 1537
+DEVICES_PER_SUBNET = 255
+SCENE_LEVEL_COUNT = 136
+
+# Every group gets these scenes, as (block, scene, name, level).
+SCENES = ((1, 1, "On", "100"), (1, 2, "Half", "50"), (1, 15, "Off", "0"))
+
+COMMAND_REGEX = re.compile(
+    r"^(?P<type>[<>?!])(?P<body>V:\d,C:(?P<command>\d+)[^=#]*)(=(?P<result>[^#]*))?#$"
+)
+
+
+def _scene_index(block, scene):
+    """Return the index of a block and scene in a device's scene levels."""
+    return (block - 1) * 16 + scene
+
+
+def _scene_levels():
+    levels = ["*"] * SCENE_LEVEL_COUNT
+    for block, scene, _name, level in SCENES:
+        levels[_scene_index(block, scene)] = level
+    return levels
+
+
+class SimulatedDevice:
+    """A load on one of the router's subnets."""
+
+    def __init__(self, subnet, device_id):
+        self.subnet = subnet
+        self.device_id = device_id
+        self.name = f"Light {subnet}.{device_id}"
+        self.load_level = 0.0
+        self.levels = _scene_levels()
+
+
+class HelvarSimulator:
+    """Emulate a Helvar 9xx router on a local TCP port.
+
+    The cluster and router ids come from the last two octets of host, as they
+    do for aiohelvar, so 127.0.0.1 and 127.0.0.2 make a workgroup of two.
+    Devices fill subnets of subnet_size, and are split into groups of group_size,
+    numbered from first_group.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        devices=100,
+        group_size=20,
+        first_group=1,
+        subnet_size=DEVICES_PER_SUBNET,
+        latency=0.0,
+        workgroup_name="Simulated",
+    ):
+        self.host = host
+        octets = str(ipaddress.ip_address(host)).split(".")
+        self.cluster_id, self.router_id = int(octets[2]), int(octets[3])
+        self.latency = latency
+        self.workgroup_name = workgroup_name
+        self.port = None
+        self.devices = {}
+        self.groups = {}
+        self.group_names = {}
+        self.last_scenes = {}
+        self.received = {}
+        self._server = None
+        self._writers = set()
+        self._handlers = set()
+
+        for index in range(devices):
+            subnet, device_id = divmod(index, subnet_size)
+            device = SimulatedDevice(subnet + 1, device_id + 1)
+            self.devices[(device.subnet, device.device_id)] = device
+
+        keys = list(self.devices)
+        for offset, start in enumerate(range(0, len(keys), group_size)):
+            group_id = first_group + offset
+            self.groups[group_id] = keys[start : start + group_size]
+            self.group_names[group_id] = f"Group {group_id}"
+            self.last_scenes[group_id] = (1, 15)
+
+    @property
+    def command_count(self):
+        """Return the number of commands received."""
+        return sum(self.received.values())
+
+    def address(self, subnet, device_id):
+        """Return the HelvarNet address string of a device."""
+        return f"@{self.cluster_id}.{self.router_id}.{subnet}.{device_id}"
+
+    def populate(self, api):
+        """Register the simulated workgroup with an aiohelvar router.
+
+        This gives the result of a full discovery without sending a command.
+        """
+        for device in self.devices.values():
+            address = aiohelvar.HelvarAddress(
+                self.cluster_id, self.router_id, device.subnet, device.device_id
+            )
+            registered = Device(address, raw_type=LED_DRIVER_TYPE, name=device.name)
+            registered.load_level = device.load_level
+            registered.levels = list(device.levels)
+            api.devices.register_device(registered)
+
+        for group_id, members in self.groups.items():
+            group = Group(group_id)
+            group.name = self.group_names[group_id]
+            group.devices = [
+                aiohelvar.HelvarAddress(
+                    self.cluster_id, self.router_id, subnet, device_id
+                )
+                for subnet, device_id in members
+            ]
+            group.last_scene_address = aiohelvar.SceneAddress(
+                group_id, *self.last_scenes[group_id]
+            )
+            api.groups.register_group(group)
+
+            for block, scene, name, _level in SCENES:
+                address = aiohelvar.SceneAddress(group_id, block, scene)
+                api.scenes.register_scene(address, Scene(address, name=name))
+
+    async def start(self, port=0):
+        """Start listening. Port 0 picks a free port."""
+        self._server = await asyncio.start_server(self._handle, self.host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """Close every client connection and stop listening.
+
+        Connections that don't close within a second have their handlers
+        cancelled, so nothing is left running. Does nothing if never started.
+        """
+        if self._server is None:
+            return
+        for writer in list(self._writers):
+            writer.close()
+        if self._handlers:
+            _done, pending = await asyncio.wait(self._handlers, timeout=1)
+            for handler in pending:
+                handler.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        self._server.close()
+        await self._server.wait_closed()
+
+    def push_scene_recall(self, group_id, block, scene, fade_time=0):
+        """Recall a scene as if from a wall panel, notifying every client."""
+        self._recall_scene(group_id, block, scene)
+        self._broadcast(
+            f">V:2,C:{RECALL_SCENE},G:{group_id},B:{block},S:{scene},F:{fade_time}#"
+        )
+
+    async def _handle(self, reader, writer):
+        handler = asyncio.current_task()
+        self._handlers.add(handler)
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b"#")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                for reply in self._process(line.decode()):
+                    self._send(writer, reply)
+        finally:
+            self._handlers.discard(handler)
+            self._writers.discard(writer)
+            writer.close()
+
+    def _send(self, writer, message):
+        """Send a message to one client after the bus latency."""
+
+        def write():
+            if not writer.is_closing():
+                writer.write(message.encode())
+
+        if self.latency:
+            asyncio.get_running_loop().call_later(self.latency, write)
+        else:
+            write()
+
+    def _broadcast(self, message):
+        for writer in list(self._writers):
+            self._send(writer, message)
+
+    def _process(self, line):
+        """Apply a command and return the messages to send in reply."""
+
+        match = COMMAND_REGEX.match(line)
+        if match is None:
+            return []
+
+        command = int(match.group("command"))
+        self.received[command] = self.received.get(command, 0) + 1
+        body = match.group("body")
+        params, address = self._parse_body(body)
+
+        if command == RECALL_SCENE:
+            group_id, block, scene = (int(params[key]) for key in "GBS")
+            self._recall_scene(group_id, block, scene)
+            self._broadcast(f">{body}#")
+            return []
+
+        if command == DIRECT_LEVEL_GROUP:
+            for key in self.groups.get(int(params["G"]), ()):
+                self.devices[key].load_level = float(params["L"])
+            return []
+
+        if command == DIRECT_LEVEL_DEVICE:
+            device = self.devices.get(address[2:])
+            if device is not None:
+                device.load_level = float(params["L"])
+            return []
+
+        result = self._query(command, params, address)
+        if result is None:
+            return [f"!{body}=1#"]
+        return [f"?{body}={result}#"]
+
+    @staticmethod
+    def _parse_body(body):
+        params = {}
+        address = None
+        for part in body.split(","):
+            if part.startswith("@"):
+                address = tuple(int(a) for a in part[1:].split("."))
+            else:
+                key, _, value = part.partition(":")
+                params[key] = value
+        return params, address
+
+    def _query(self, command, params, address):
+        """Return the result of a query, or None if it can't be answered."""
+
+        if command == QUERY_WORKGROUP_NAME:
+            return self.workgroup_name
+        if command == QUERY_ROUTER_TIME:
+            return "1700000000"
+        if command == QUERY_GROUPS:
+            return ",".join(str(group_id) for group_id in self.groups)
+        if command == QUERY_SCENE_NAMES:
+            return "".join(
+                f"@{group_id}.{block}.{scene}:{name}"
+                for group_id in self.groups
+                for block, scene, name, _level in SCENES
+            )
+
+        if command in (
+            QUERY_GROUP_DESCRIPTION,
+            QUERY_GROUP,
+            QUERY_LAST_SCENE_IN_GROUP,
+        ):
+            group_id = int(params["G"])
+            if group_id not in self.groups:
+                return None
+            if command == QUERY_GROUP_DESCRIPTION:
+                return self.group_names[group_id]
+            if command == QUERY_GROUP:
+                return ",".join(
+                    self.address(subnet, device_id)
+                    for subnet, device_id in self.groups[group_id]
+                )
+            block, scene = self.last_scenes[group_id]
+            return str((block - 1) * 16 + scene - 1)
+
+        if command == QUERY_DEVICE_TYPES_AND_ADDRESSES:
+            subnet = address[2]
+            return ",".join(
+                f"{LED_DRIVER_TYPE}@{device_id}"
+                for device_subnet, device_id in self.devices
+                if device_subnet == subnet
+            )
+
+        device = self.devices.get(address[2:]) if address else None
+        if device is None:
+            return None
+        if command == QUERY_DEVICE_DESCRIPTION:
+            return device.name
+        if command == QUERY_DEVICE_STATE:
+            return "0"
+        if command == QUERY_DEVICE_LOAD_LEVEL:
+            return f"{device.load_level:.1f}"
+        if command == QUERY_SCENE_INFO:
+            return ",".join(device.levels)
+        return None
+
+    def _recall_scene(self, group_id, block, scene):
+        if group_id not in self.groups:
+            return
+        self.last_scenes[group_id] = (block, scene)
+        index = _scene_index(block, scene)
+        for key in self.groups[group_id]:
+            device = self.devices[key]
+            level = device.levels[index]
+            if level not in ("*", "L"):
+                device.load_level = float(level)
@@ -0,0 +1,435 @@
+"""Benchmarks of the integration against a simulated HelvarNet router.
+
+They are marked benchmark, and left out of a plain test run. Run them with
+``pytest tests/test_benchmarks.py -m benchmark --benchmark-only --no-cov``.
+aiohelvar spaces out the commands it sends by 10ms, so command counts dominate
+most of these.
+"""
+import asyncio
+import gc
+import json
+import pytest
+import time
+import tracemalloc
+from unittest.mock import Mock, patch
+
+import aiohelvar
+from aiohelvar.groups import Group
+from aiohelvar.scenes import Scene
+
+from custom_components.helvar.light import HelvarGroupLight, HelvarLight
+from custom_components.helvar.router import HelvarRouter
+from custom_components.helvar.scene_names import SceneNameIndex, render_scene_name
+from custom_components.helvar.select import HelvarGroup
+from custom_components.helvar.topology import dump_topology
+
+from .simulator import (
+    DIRECT_LEVEL_DEVICE,
+    DIRECT_LEVEL_GROUP,
+    RECALL_SCENE,
+    HelvarSimulator,
+)
+
+# Devices on the simulated router, and how many share each group.
+SITE_DEVICES = 1000
+GROUP_SIZE = 50
+# Seconds the simulated router takes to answer a query or act on a command.
+BUS_LATENCY = 0.02
+# Devices on the site that is discovered from scratch, which is slow.
+DISCOVERY_DEVICES = 40
+# Devices on each simulated router of the workgroups memory is measured on.
+DEVICES_PER_ROUTER = 1000
+# Groups, and blocks and scenes in each, of the workgroup scene selects read.
+SCENE_GROUPS = 512
+SCENE_BLOCKS = 16
+SCENES_PER_BLOCK = 16
+
+
+pytestmark = pytest.mark.benchmark
+
+
+def _drain(loop):
+    """Cancel the tasks aiohelvar and the simulator leave running, and wait."""
+    tasks = asyncio.all_tasks(loop)
+    for task in tasks:
+        task.cancel()
+
+    async def wait():
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    loop.run_until_complete(wait())
+
+
+@pytest.fixture
+def bench_loop():
+    """Create an event loop benchmarked code can be run on."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    _drain(loop)
+    loop.close()
+
+
+@pytest.fixture
+def simulator(bench_loop):
+    """Start a simulated router with a large site."""
+    simulator = HelvarSimulator(
+        devices=SITE_DEVICES, group_size=GROUP_SIZE, latency=BUS_LATENCY
+    )
+    bench_loop.run_until_complete(simulator.start())
+    yield simulator
+    bench_loop.run_until_complete(simulator.stop())
+
+
+@pytest.fixture
+def bench_hass(mock_hass, bench_loop):
+    """Create a mock Home Assistant instance with a real event loop."""
+    mock_hass.loop = bench_loop
+    return mock_hass
+
+
+@pytest.fixture
+def bench_entry(mock_config_entry, simulator):
+    """Create a config entry for the simulated router."""
+    mock_config_entry.data = {"host": simulator.host, "port": simulator.port}
+    mock_config_entry.options = {"poll_rate": 0}
+    return mock_config_entry
+
+
+@pytest.fixture
+def cached_topology(simulator, mock_topology_store):
+    """Cache the simulated site's topology so setup doesn't discover it."""
+    api = aiohelvar.Router(simulator.host, simulator.port)
+    simulator.populate(api)
+    mock_topology_store.async_load.return_value = dump_topology(api)
+    return mock_topology_store
+
+
+@pytest.fixture
+def written_states():
+    """Count light state writes, computing the state as Home Assistant would."""
+    writes = []
+
+    def async_write_ha_state(light):
+        writes.append((light.state, light.state_attributes))
+
+    with patch.object(HelvarLight, "async_write_ha_state", async_write_ha_state):
+        yield writes
+
+
+@pytest.fixture
+def site(bench_loop, bench_hass, bench_entry, cached_topology, written_states):
+    """Set up the integration against the simulator, with an entity per light."""
+    router = HelvarRouter(bench_hass, bench_entry)
+    assert bench_loop.run_until_complete(router.async_setup())
+
+    for device in router.api.devices.get_light_devices():
+        light = HelvarLight(device, router)
+        light.hass = bench_hass
+        router.lights[device.address] = light
+
+    yield router
+    bench_loop.run_until_complete(router.async_reset())
+
+
+async def _wait_for(condition, timeout=30):
+    """Wait until condition() is true."""
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.005)
+
+
+def _levels_reached(simulator, level, devices=None):
+    devices = simulator.devices.values() if devices is None else devices
+    return all(device.load_level == level for device in devices)
+
+
+def test_setup_from_cache(
+    benchmark, bench_loop, bench_hass, bench_entry, cached_topology
+):
+    """Benchmark starting up from a cached topology."""
+
+    def setup():
+        router = HelvarRouter(bench_hass, bench_entry)
+        assert bench_loop.run_until_complete(router.async_setup())
+        bench_loop.run_until_complete(router.async_reset())
+
+    benchmark.pedantic(setup, rounds=5)
+    benchmark.extra_info["devices"] = SITE_DEVICES
+
+
+def test_setup_with_discovery(
+    benchmark, bench_loop, bench_hass, mock_config_entry, mock_topology_store
+):
+    """Benchmark starting up and discovering a small site from scratch."""
+    simulator = HelvarSimulator(
+        devices=DISCOVERY_DEVICES, group_size=10, latency=BUS_LATENCY
+    )
+    bench_loop.run_until_complete(simulator.start())
+    mock_config_entry.data = {"host": simulator.host, "port": simulator.port}
+    mock_config_entry.options = {"poll_rate": 0, "sync_interval": 0}
+    tasks = []
+
+    def create_background_task(hass, target, name):
+        # Only the discovery is run. Supervising the connection never finishes.
+        if name == "helvar discover workgroup":
+            tasks.append(bench_loop.create_task(target))
+        else:
+            target.close()
+
+    mock_config_entry.async_create_background_task.side_effect = create_background_task
+
+    async def setup():
+        router = HelvarRouter(bench_hass, mock_config_entry)
+        assert await router.async_setup()
+        await tasks.pop()
+        assert router.discovery.done
+        assert len(router.api.devices.devices) == DISCOVERY_DEVICES
+        await router.async_reset()
+
+    try:
+        benchmark.pedantic(lambda: bench_loop.run_until_complete(setup()), rounds=1)
+    finally:
+        bench_loop.run_until_complete(simulator.stop())
+
+    benchmark.extra_info["commands"] = simulator.command_count
+
+
+def test_bulk_on_off_whole_groups(benchmark, bench_loop, simulator, site):
+    """Benchmark switching every light, which packs into group scene recalls."""
+    lights = list(site.lights.values())
+    rounds = []
+
+    async def switch():
+        on = len(rounds) % 2 == 0
+        rounds.append(on)
+        for light in lights:
+            if on:
+                await light.async_turn_on()
+            else:
+                await light.async_turn_off()
+        await site.scheduler.async_flush()
+        await _wait_for(lambda: _levels_reached(simulator, 100.0 if on else 0.0))
+
+    benchmark.pedantic(lambda: bench_loop.run_until_complete(switch()), rounds=4)
+    benchmark.extra_info["lights"] = len(lights)
+    benchmark.extra_info["commands"] = simulator.received.get(RECALL_SCENE, 0)
+
+
+def test_bulk_on_off_scattered(benchmark, bench_loop, simulator, site):
+    """Benchmark switching one light in ten, which needs a command per light."""
+    lights = list(site.lights.values())[::10]
+    devices = [
+        simulator.devices[(light.device.address.subnet, light.device.address.device)]
+        for light in lights
+    ]
+    rounds = []
+
+    async def switch():
+        on = len(rounds) % 2 == 0
+        rounds.append(on)
+        for light in lights:
+            if on:
+                await light.async_turn_on()
+            else:
+                await light.async_turn_off()
+        await site.scheduler.async_flush()
+        await _wait_for(
+            lambda: _levels_reached(simulator, 100.0 if on else 0.0, devices)
+        )
+
+    benchmark.pedantic(lambda: bench_loop.run_until_complete(switch()), rounds=2)
+    benchmark.extra_info["lights"] = len(lights)
+    benchmark.extra_info["commands"] = simulator.received.get(DIRECT_LEVEL_DEVICE, 0)
+
+
+def test_group_dimming(benchmark, bench_loop, simulator, site):
+    """Benchmark dimming every group to a level no scene has, a command each."""
+    rounds = []
+
+    async def dim():
+        brightness = 51 if len(rounds) % 2 == 0 else 204
+        rounds.append(brightness)
+        for group_id in simulator.groups:
+            await site.scheduler.async_set_group_brightness(group_id, brightness)
+        await site.scheduler.async_flush()
+        await _wait_for(
+            lambda: _levels_reached(simulator, 20.0 if brightness == 51 else 80.0)
+        )
+
+    benchmark.pedantic(lambda: bench_loop.run_until_complete(dim()), rounds=4)
+    benchmark.extra_info["groups"] = len(simulator.groups)
+    benchmark.extra_info["commands"] = simulator.received.get(DIRECT_LEVEL_GROUP, 0)
+
+
+def test_scene_recall_fan_out(benchmark, bench_loop, simulator, site):
+    """Benchmark following wall panel recalls of every group, to the state writes."""
+    rounds = []
+
+    async def recall():
+        scene = 1 if len(rounds) % 2 == 0 else 15
+        rounds.append(scene)
+        for group_id in simulator.groups:
+            simulator.push_scene_recall(group_id, 1, scene)
+        await _wait_for(lambda: len(site.state_writer.pending) == len(site.lights))
+        site.state_writer.async_write()
+
+    benchmark.pedantic(lambda: bench_loop.run_until_complete(recall()), rounds=4)
+    benchmark.extra_info["lights"] = len(site.lights)
+
+
+def test_state_write_rate(benchmark, site, written_states):
+    """Benchmark writing the state of every light in one batch."""
+    lights = list(site.lights.values())
+
+    def schedule():
+        for light in lights:
+            site.state_writer.async_schedule_write(light)
+
+    benchmark.pedantic(site.state_writer.async_write, setup=schedule, rounds=20)
+
+    assert len(written_states) == 20 * len(lights)
+    benchmark.extra_info["writes_per_second"] = len(lights) / benchmark.stats["mean"]
+
+
+def test_scene_select_state_reads(benchmark):
+    """Benchmark reading the scene select of every group, as after a notification.
+
+    The time aiohelvar's scene lookup and rendering each name takes for the same
+    reads is in the extra info, as are the time aiohelvar takes to find one
+    group's scenes and the time to pick up a renamed scene.
+    """
+    api = aiohelvar.Router("10.0.0.1", 50000)
+    for group_id in range(1, SCENE_GROUPS + 1):
+        group = Group(group_id)
+        group.last_scene_address = aiohelvar.SceneAddress(group_id, 1, 1)
+        api.groups.register_group(group)
+        for block in range(1, SCENE_BLOCKS + 1):
+            for scene in range(1, SCENES_PER_BLOCK + 1):
+                address = aiohelvar.SceneAddress(group_id, block, scene)
+                api.scenes.register_scene(
+                    address, Scene(address, name=f"Scene {block}.{scene}")
+                )
+
+    router = Mock()
+    router.api = api
+    router.disabled_groups = set()
+    router.scene_names = SceneNameIndex()
+    router.scene_names.rebuild(api)
+    selects = [HelvarGroup(group, router) for group in api.groups.groups.values()]
+
+    def read():
+        return [select.current_option for select in selects]
+
+    options = benchmark(read)
+
+    assert options[0] == "Scene 1.1 - @1.1.1"
+    started = time.perf_counter()
+    assert [
+        render_scene_name(api.scenes.get_scene(select.group.get_last_scene_address()))
+        for select in selects
+    ] == options
+    benchmark.extra_info["unindexed_seconds"] = time.perf_counter() - started
+
+    # aiohelvar looks through every scene in the workgroup for each group's.
+    started = time.perf_counter()
+    api.scenes.get_scenes_for_group(1, only_named=False)
+    benchmark.extra_info["unindexed_group_options_seconds"] = (
+        time.perf_counter() - started
+    )
+
+    renamed = aiohelvar.SceneAddress(1, 1, 1)
+    api.scenes.update_scene_name(renamed, "Renamed")
+    started = time.perf_counter()
+    router.scene_names.update(api, [renamed])
+    selects[0]._build_options()
+    benchmark.extra_info["rename_seconds"] = time.perf_counter() - started
+    assert selects[0].current_option == "Renamed - @1.1.1"
+
+    benchmark.extra_info["groups"] = len(selects)
+    benchmark.extra_info["scenes"] = len(router.scene_names)
+
+
+@pytest.mark.parametrize("devices", [1000, 5000, 10000])
+def test_memory_per_device(
+    benchmark, bench_loop, bench_hass, mock_config_entry, mock_topology_store, devices
+):
+    """Measure the memory a cached workgroup and its light entities take up.
+
+    The workgroup is split across simulated routers of DEVICES_PER_ROUTER devices.
+    """
+    simulators = [
+        HelvarSimulator(
+            host=f"127.0.0.{index + 1}",
+            devices=DEVICES_PER_ROUTER,
+            group_size=GROUP_SIZE,
+            first_group=1 + index * DEVICES_PER_ROUTER // GROUP_SIZE,
+        )
+        for index in range(devices // DEVICES_PER_ROUTER)
+    ]
+    try:
+        _measure_memory(
+            benchmark,
+            bench_loop,
+            bench_hass,
+            mock_config_entry,
+            mock_topology_store,
+            simulators,
+        )
+    finally:
+        # Stopped before the loop is drained, so their clients disconnect first.
+        for simulator in simulators:
+            bench_loop.run_until_complete(simulator.stop())
+        _drain(bench_loop)
+
+    benchmark.extra_info["bytes_per_device"] = benchmark.extra_info["bytes"] // devices
+
+
+def _measure_memory(
+    benchmark,
+    bench_loop,
+    bench_hass,
+    mock_config_entry,
+    mock_topology_store,
+    simulators,
+):
+    """Set up a router for the simulators, and record the memory it takes up."""
+    bench_loop.run_until_complete(simulators[0].start())
+    for simulator in simulators[1:]:
+        bench_loop.run_until_complete(simulator.start(simulators[0].port))
+
+    api = aiohelvar.Router(simulators[0].host, simulators[0].port)
+    for simulator in simulators:
+        simulator.populate(api)
+    # Load a fresh copy each time, as the store does, so it is measured too.
+    cached = json.dumps(dump_topology(api))
+    mock_topology_store.async_load.side_effect = lambda: json.loads(cached)
+    del api
+
+    mock_config_entry.data = {
+        "host": simulators[0].host,
+        "port": simulators[0].port,
+        "routers": [simulator.host for simulator in simulators[1:]],
+    }
+    mock_config_entry.options = {"poll_rate": 0}
+    usage = {}
+
+    def setup():
+        gc.collect()
+        tracemalloc.start()
+        router = HelvarRouter(bench_hass, mock_config_entry)
+        assert bench_loop.run_until_complete(router.async_setup())
+        lights = [
+            HelvarLight(device, router)
+            for device in router.api.devices.get_light_devices()
+        ] + [
+            HelvarGroupLight(group, router)
+            for group in router.api.groups.groups.values()
+        ]
+        gc.collect()
+        usage["entities"] = len(lights)
+        usage["bytes"], usage["peak_bytes"] = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        bench_loop.run_until_complete(router.async_reset())
+
+    benchmark.pedantic(setup, rounds=1)
+    benchmark.extra_info.update(usage)
@@ -0,0 +1,78 @@
+"""Tests for detecting what kind of thing each Helvar device is."""
+import pytest
+
+import aiohelvar
+from aiohelvar.devices import Device
+from aiohelvar.groups import Group
+
+from custom_components.helvar.capabilities import (
+    KIND_COLOUR,
+    KIND_CONTROL,
+    KIND_DIMMER,
+    KIND_EMERGENCY,
+    KIND_SENSOR,
+    KIND_SWITCH,
+    NS_EM_BATTERY_FAIL,
+    detect_kind,
+    emergency_status,
+    load_members,
+)
+
+ADDRESS = aiohelvar.HelvarAddress(0, 1, 1, 1)
+
+
+class TestDetectKind:
+    """Test device kinds are detected from the types routers report."""
+
+    @pytest.mark.parametrize(
+        ("raw_type", "kind"),
+        [
+            (0x0601, KIND_DIMMER),
+            (0x0201, KIND_EMERGENCY),
+            (0x0701, KIND_SWITCH),
+            (0x0801, KIND_COLOUR),
+            (0x00458002, KIND_DIMMER),
+            (0x00498602, KIND_SWITCH),
+            (0x00320002, KIND_SENSOR),
+            (0x00100802, KIND_CONTROL),
+            (0x04, KIND_DIMMER),
+        ],
+    )
+    def test_kinds(self, raw_type, kind):
+        """Test DALI types, DIGIDIM parts and other protocols."""
+        assert detect_kind(Device(ADDRESS, raw_type=raw_type)) == kind
+
+    def test_emergency_status(self):
+        """Test the emergency state is read from the device state flags."""
+        device = Device(ADDRESS, raw_type=0x0201)
+        device.state = NS_EM_BATTERY_FAIL | 0x02
+
+        assert emergency_status(device) == {
+            "in_emergency": False,
+            "battery_failed": True,
+            "lamp_failed": True,
+        }
+
+
+class TestLoadMembers:
+    """Test the members of a group that have a level are found."""
+
+    def test_load_members(self):
+        """Test members without a load, or that aren't known, are left out."""
+        api = aiohelvar.Router("10.0.0.1", 50000)
+        dimmer = Device(ADDRESS, raw_type=0x0601)
+        sensor = Device(aiohelvar.HelvarAddress(0, 1, 1, 2), raw_type=0x00320002)
+        for device in (dimmer, sensor):
+            api.devices.register_device(device)
+        group = Group(1)
+        group.devices = [
+            dimmer.address,
+            sensor.address,
+            aiohelvar.HelvarAddress(0, 1, 1, 3),
+        ]
+
+        assert load_members(api, group) == [dimmer]
+        assert load_members(api, group, strict=True) is None
+
+        group.devices.pop()
+        assert load_members(api, group, strict=True) == [dimmer]
@@ -0,0 +1,250 @@
+"""Tests for parallel discovery of a Helvar workgroup."""
+import asyncio
+import pytest
+from unittest.mock import Mock, patch
+
+import aiohelvar
+
+from custom_components.helvar import discovery as discovery_module
+from custom_components.helvar.discovery import WorkgroupDiscovery
+from custom_components.helvar.pipeline import CommandPipeline
+from custom_components.helvar.router import HelvarRouter
+
+from .simulator import QUERY_SCENE_INFO, HelvarSimulator
+
+
+async def _async_start_workgroup():
+    """Start two simulated routers of 30 lights each, and connect to both.
+
+    Each router's devices span two subnets. Groups are workgroup-wide, so only
+    those of the first router are read.
+    """
+    simulators = [
+        HelvarSimulator("127.0.0.1", devices=30, group_size=10, subnet_size=20),
+        HelvarSimulator(
+            "127.0.0.2", devices=30, group_size=10, first_group=10, subnet_size=20
+        ),
+    ]
+    await simulators[0].start()
+    await simulators[1].start(simulators[0].port)
+
+    routers = [aiohelvar.Router(s.host, s.port) for s in simulators]
+    await asyncio.gather(*(router.connect() for router in routers))
+    return simulators, routers
+
+
+async def _async_stop_workgroup(simulators, routers):
+    for router in routers:
+        await router.disconnect()
+    for simulator in simulators:
+        await simulator.stop()
+
+
+class TestWorkgroupDiscovery:
+    """Test discovering devices in parallel across routers and subnets."""
+
+    @pytest.mark.asyncio
+    async def test_discovers_every_router(self):
+        """Test every device ends up registered once, with the router that owns it."""
+        simulators, routers = await _async_start_workgroup()
+        batches = []
+        discovery = WorkgroupDiscovery(CommandPipeline(8), routers, batches.append)
+
+        await discovery.async_read_configuration()
+
+        assert discovery.percent == 0.0
+        assert discovery.progress == {
+            "0.1.1": {"devices": 20, "discovered": 0, "failed": 0},
+            "0.1.2": {"devices": 10, "discovered": 0, "failed": 0},
+            "0.2.1": {"devices": 20, "discovered": 0, "failed": 0},
+            "0.2.2": {"devices": 10, "discovered": 0, "failed": 0},
+        }
+        assert not routers[0].devices.devices
+
+        await discovery.async_read_devices()
+
+        assert discovery.done
+        assert discovery.percent == 100.0
+        assert discovery.failed == 0
+        assert discovery.progress["0.2.2"]["discovered"] == 10
+
+        primary, secondary = routers
+        assert len(primary.devices.devices) == 60
+        assert len(secondary.devices.devices) == 30
+        device = primary.devices.devices[aiohelvar.HelvarAddress(0, 2, 2, 10)]
+        assert device.name == "Light 2.10"
+        assert device.levels[1] == "100"
+        assert secondary.devices.devices[device.address] is device
+
+        discovered = [device.address for batch in batches for device in batch]
+        assert len(discovered) == len(set(discovered)) == 60
+        assert max(len(batch) for batch in batches) <= discovery_module.BATCH_SIZE
+
+        assert sorted(primary.groups.groups) == [1, 2, 3]
+        assert primary.groups.groups[3].name == "Group 3"
+        assert primary.scenes.get_scene(aiohelvar.SceneAddress(3, 1, 2)).name == "Half"
+        assert sum(s.received[QUERY_SCENE_INFO] for s in simulators) == 60
+
+        await _async_stop_workgroup(simulators, routers)
+
+    @pytest.mark.asyncio
+    async def test_queries_stay_within_window(self):
+        """Test no more queries wait for a reply at once than the window allows."""
+        simulators, routers = await _async_start_workgroup()
+        pipeline = CommandPipeline(4)
+        discovery = WorkgroupDiscovery(pipeline, routers)
+        most = 0
+
+        async def async_read_device(*args):
+            nonlocal most
+            most = max(most, pipeline.in_flight)
+            return await read_device(*args)
+
+        read_device = discovery_module.async_read_device
+        with patch.object(discovery_module, "async_read_device", async_read_device):
+            await discovery.async_read_devices()
+
+        assert 0 < most <= 4
+        await _async_stop_workgroup(simulators, routers)
+
+    @pytest.mark.asyncio
+    async def test_devices_that_dont_answer_are_counted(self):
+        """Test a device that times out is left out and counted as failed."""
+        simulators, routers = await _async_start_workgroup()
+        discovery = WorkgroupDiscovery(CommandPipeline(8), routers)
+        missing = aiohelvar.HelvarAddress(0, 1, 1, 7)
+        read_device = discovery_module.async_read_device
+
+        async def async_read_device(pipeline, api, address, raw_type):
+            if address == missing:
+                raise asyncio.TimeoutError
+            return await read_device(pipeline, api, address, raw_type)
+
+        with patch.object(discovery_module, "async_read_device", async_read_device):
+            await discovery.async_read_devices()
+
+        assert discovery.done
+        assert discovery.failed == 1
+        assert discovery.progress["0.1.1"] == {
+            "devices": 20,
+            "discovered": 19,
+            "failed": 1,
+        }
+        assert missing not in routers[0].devices.devices
+        assert len(routers[0].devices.devices) == 59
+
+        await _async_stop_workgroup(simulators, routers)
+
+
+class TestRouterDiscovery:
+    """Test a router set up without a cached topology."""
+
+    @pytest.mark.asyncio
+    async def test_devices_arrive_after_setup(
+        self, mock_hass, mock_config_entry, mock_topology_store
+    ):
+        """Test setup returns once the configuration is read, and devices follow."""
+        simulator = HelvarSimulator(devices=60, group_size=20)
+        await simulator.start()
+        mock_config_entry.data = {"host": simulator.host, "port": simulator.port}
+        mock_config_entry.options = {"poll_rate": 0, "sync_interval": 0}
+        tasks = {}
+
+        def create_background_task(hass, target, name):
+            if name == "helvar discover workgroup":
+                tasks[name] = asyncio.get_running_loop().create_task(target)
+            else:
+                target.close()
+
+        mock_config_entry.async_create_background_task.side_effect = (
+            create_background_task
+        )
+
+        router = HelvarRouter(mock_hass, mock_config_entry)
+        assert await router.async_setup()
+
+        assert router.metrics["topology_source"] == "router"
+        assert router.discovery.percent == 0.0
+        assert not router.api.devices.devices
+
+        updates = []
+        with patch(
+            "custom_components.helvar.router.async_dispatcher_send",
+            side_effect=lambda hass, signal, *args: updates.append((signal, args)),
+        ):
+            await tasks["helvar discover workgroup"]
+
+        added_devices = [
+            address
+            for signal, args in updates
+            if signal == router.topology_updated_signal
+            for address in args[0].added_devices
+        ]
+        assert len(added_devices) == 60
+        assert updates[-1][0] == router.topology_updated_signal
+        assert updates[-1][1][0].added_groups == ["1", "2", "3"]
+
+        address = aiohelvar.HelvarAddress(0, 1, 1, 1)
+        assert router._device_groups[address] == (1,)
+        assert router.metrics["discovery_duration"] is not None
+        saved = mock_topology_store.async_save.call_args.args[0]
+        assert len(saved["devices"]) == 60
+        assert saved["checksum"] == router.checksum is not None
+
+        # Updates to discovered devices are followed like cached ones.
+        light = Mock()
+        router.lights[address] = light
+        router.state_writer = Mock()
+        await router.api.devices.devices[address].update_subscribers()
+        await asyncio.sleep(0)
+        router.state_writer.async_schedule_write.assert_called_with(light)
+
+        await router.async_reset()
+        await simulator.stop()
+
+    @pytest.mark.asyncio
+    async def test_sync_runs_after_a_timeout(
+        self, mock_hass, mock_config_entry, mock_topology_store
+    ):
+        """Test a timeout reading the groups and scenes still lets sync pick them up."""
+        simulator = HelvarSimulator(devices=60, group_size=20)
+        await simulator.start()
+        mock_config_entry.data = {"host": simulator.host, "port": simulator.port}
+        mock_config_entry.options = {"poll_rate": 0, "sync_interval": 0}
+        tasks = {}
+
+        def create_background_task(hass, target, name):
+            if name == "helvar discover workgroup":
+                tasks[name] = asyncio.get_running_loop().create_task(target)
+            else:
+                target.close()
+
+        mock_config_entry.async_create_background_task.side_effect = (
+            create_background_task
+        )
+
+        router = HelvarRouter(mock_hass, mock_config_entry)
+        assert await router.async_setup()
+
+        with patch.object(
+            discovery_module,
+            "async_apply_configuration",
+            side_effect=asyncio.TimeoutError,
+        ), patch("custom_components.helvar.router.async_dispatcher_send"):
+            await tasks["helvar discover workgroup"]
+
+        assert router.discovery.done
+        assert isinstance(router.discovery.error, asyncio.TimeoutError)
+        assert len(router.api.devices.devices) == 60
+        assert not router.api.groups.groups
+        assert router.checksum is None
+
+        with patch("custom_components.helvar.router.async_dispatcher_send"):
+            diff = await router.async_sync()
+
+        assert diff.added_groups == ["1", "2", "3"]
+        assert sorted(router.api.groups.groups) == [1, 2, 3]
+        assert router.checksum is not None
+
+        await router.async_reset()
+        await simulator.stop()
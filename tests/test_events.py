@@ -0,0 +1,100 @@
+"""Tests for Home Assistant events fired from router notifications."""
+from unittest.mock import Mock
+
+import aiohelvar
+from aiohelvar.scenes import Scene
+
+from custom_components.helvar.const import EVENT_LEVEL_CHANGED, EVENT_SCENE_RECALLED
+from custom_components.helvar.events import NotificationEvents
+
+
+def _make_events(hass, options=None):
+    """Create events for a router with one device, in groups 4 and 5."""
+    router = Mock()
+    router.config_entry.entry_id = "entry"
+    router.config_entry.options = options or {}
+    router.groups_of = Mock(return_value=(4, 5))
+    scene_address = aiohelvar.SceneAddress(4, 1, 2)
+    router.api.scenes.scenes = {scene_address: Scene(scene_address, name="Half")}
+    return NotificationEvents(hass, router)
+
+
+def _device(cluster=0):
+    device = Mock()
+    device.address = aiohelvar.HelvarAddress(cluster, 1, 1, 3)
+    device.name = "Desk"
+    device.load_level = 50.0
+    return device
+
+
+class TestNotificationEvents:
+    """Test the NotificationEvents class."""
+
+    def test_scene_recalled(self, mock_hass):
+        """Test a recall fires an event naming the scene."""
+        events = _make_events(mock_hass)
+
+        events.async_scene_recalled(aiohelvar.SceneAddress(4, 1, 2))
+
+        mock_hass.bus.async_fire.assert_called_once_with(
+            EVENT_SCENE_RECALLED,
+            {
+                "group": 4,
+                "block": 1,
+                "scene": 2,
+                "scene_address": "@4.1.2",
+                "name": "Half",
+                "entry_id": "entry",
+            },
+        )
+
+    def test_level_changed(self, mock_hass):
+        """Test a level change fires an event with the device's new level."""
+        events = _make_events(mock_hass)
+        scene_address = aiohelvar.SceneAddress(4, 1, 2)
+
+        events.async_level_changed(_device(), "scene", scene_address)
+
+        mock_hass.bus.async_fire.assert_called_once_with(
+            EVENT_LEVEL_CHANGED,
+            {
+                "address": "@0.1.1.3",
+                "name": "Desk",
+                "level": 50.0,
+                "source": "scene",
+                "scene_address": "@4.1.2",
+                "entry_id": "entry",
+            },
+        )
+
+    def test_group_filter(self, mock_hass):
+        """Test only the chosen groups, and their devices, fire events."""
+        events = _make_events(mock_hass, {"event_groups": ["5"]})
+
+        events.async_scene_recalled(aiohelvar.SceneAddress(4, 1, 2))
+        events.async_level_changed(_device(), "poll")
+
+        assert [call.args[0] for call in mock_hass.bus.async_fire.call_args_list] == [
+            EVENT_LEVEL_CHANGED
+        ]
+        assert events.stats == {"fired": 1, "filtered": 1}
+
+    def test_cluster_filter(self, mock_hass):
+        """Test level changes on other clusters are filtered out."""
+        events = _make_events(mock_hass, {"event_clusters": ["2"]})
+
+        events.async_level_changed(_device(cluster=0), "poll")
+        events.async_level_changed(_device(cluster=2), "poll")
+
+        assert mock_hass.bus.async_fire.call_count == 1
+        assert events.stats["filtered"] == 1
+
+    def test_disabled(self, mock_hass):
+        """Test nothing is fired when events are turned off."""
+        events = _make_events(mock_hass, {"fire_events": False})
+
+        events.async_scene_recalled(aiohelvar.SceneAddress(4, 1, 2))
+        events.async_level_changed(_device(), "poll")
+
+        mock_hass.bus.async_fire.assert_not_called()
+        assert events.stats["filtered"] == 2
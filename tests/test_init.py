@@ -12,7 +12,9 @@ class TestHelvarInit:
     """Test the Helvar integration initialization."""
 
     @pytest.mark.asyncio
-    async def test_async_setup_entry_success(self, mock_hass, mock_config_entry):
+    async def test_async_setup_entry_success(
+        self, mock_hass, mock_config_entry, mock_topology_store
+    ):
         """Test successful setup of config entry."""
         mock_config_entry.data = {
             "host": "192.168.1.100",
@@ -23,11 +25,17 @@ class TestHelvarInit:
         mock_hass.data = {HELVAR_DOMAIN: {}}
         
         # Mock the aiohelvar.Router to prevent actual network connections
-        with patch('custom_components.helvar.router.aiohelvar.Router') as mock_aio_router:
+        with patch('custom_components.helvar.router.aiohelvar.Router') as mock_aio_router, patch(
+            'custom_components.helvar.router.WorkgroupDiscovery'
+        ) as mock_discovery:
             mock_router_instance = Mock()
             mock_router_instance.connect = AsyncMock()
-            mock_router_instance.initialize = AsyncMock()
+            mock_router_instance.devices.devices = {}
+            mock_router_instance.groups.groups = {}
+            mock_router_instance.scenes.scenes = {}
             mock_aio_router.return_value = mock_router_instance
+            mock_discovery.return_value.async_read_configuration = AsyncMock()
+            mock_discovery.return_value.configuration = {"groups": {}}
             
             # async_forward_entry_setups is already mocked in conftest.py
             
@@ -40,13 +48,54 @@ class TestHelvarInit:
             # Verify the aiohelvar router was created and connected
             mock_aio_router.assert_called_once_with("192.168.1.100", 50000)
             mock_router_instance.connect.assert_called_once()
-            mock_router_instance.initialize.assert_called_once()
+            mock_discovery.return_value.async_read_configuration.assert_called_once()
+
+            # The devices are discovered, and the topology cached, in the background
+            task_names = [
+                call.args[2]
+                for call in mock_config_entry.async_create_background_task.call_args_list
+            ]
+            assert "helvar discover workgroup" in task_names
+
+    @pytest.mark.asyncio
+    async def test_async_setup_entry_from_cache(
+        self, mock_hass, mock_config_entry, mock_topology_store
+    ):
+        """Test setup uses the cached topology instead of a full discovery."""
+        mock_config_entry.data = {"host": "192.168.1.100", "port": 50000}
+        mock_hass.data = {HELVAR_DOMAIN: {}}
+        mock_topology_store.async_load.return_value = {
+            "workgroup_name": "Cached",
+            "devices": {},
+            "groups": {},
+            "scenes": {},
+        }
+
+        with patch("custom_components.helvar.router.aiohelvar.Router") as mock_aio_router:
+            mock_router_instance = Mock()
+            mock_router_instance.connect = AsyncMock()
+            mock_router_instance.devices.devices = {}
+            mock_router_instance.groups.groups = {}
+            mock_router_instance.scenes.scenes = {}
+            mock_aio_router.return_value = mock_router_instance
+
+            result = await async_setup_entry(mock_hass, mock_config_entry)
+
+        assert result is True
+        mock_router_instance.connect.assert_called_once()
+        assert mock_router_instance.workgroup_name == "Cached"
+
+        router = mock_hass.data[HELVAR_DOMAIN][mock_config_entry.entry_id]
+        assert router.metrics["topology_source"] == "cache"
+        assert router.discovery is None
+        assert router.metrics["startup_duration"] is not None
 
     @pytest.mark.asyncio
     async def test_async_unload_entry_success(self, mock_hass, mock_config_entry):
         """Test successful unload of config entry."""
         # Setup initial state
         mock_router = Mock()
+        mock_router.async_reset = AsyncMock()
         mock_hass.data = {
             HELVAR_DOMAIN: {
                 mock_config_entry.entry_id: mock_router
@@ -63,9 +112,12 @@ class TestHelvarInit:
         
         # Verify data was cleaned up
         assert mock_config_entry.entry_id not in mock_hass.data[HELVAR_DOMAIN]
+        mock_router.async_reset.assert_called_once()
 
     @pytest.mark.asyncio
-    async def test_async_setup_entry_router_start_failure(self, mock_hass, mock_config_entry):
+    async def test_async_setup_entry_router_start_failure(
+        self, mock_hass, mock_config_entry, mock_topology_store
+    ):
         """Test setup failure when router fails to start."""
         mock_config_entry.data = {
             "host": "192.168.1.100",
@@ -1,11 +1,24 @@
 """Tests for the Helvar light platform."""
 import pytest
 from unittest.mock import Mock, AsyncMock, patch
-from homeassistant.components.light import ATTR_BRIGHTNESS, ColorMode
+from homeassistant.components.light import (
+    ATTR_BRIGHTNESS,
+    ATTR_TRANSITION,
+    ColorMode,
+    LightEntityFeature,
+)
 from homeassistant.const import STATE_ON, STATE_OFF
 
-from custom_components.helvar.light import HelvarLight, async_setup_entry
+import aiohelvar
+
+from custom_components.helvar.capabilities import KIND_EMERGENCY, KIND_SWITCH
+from custom_components.helvar.light import (
+    HelvarGroupLight,
+    HelvarLight,
+    async_setup_entry,
+)
 from custom_components.helvar.const import DOMAIN as HELVAR_DOMAIN
+from custom_components.helvar.topology import TopologyDiff
 
 
 class TestHelvarLight:
@@ -17,7 +30,7 @@ class TestHelvarLight:
         
         assert light.device == mock_device
         assert light.router == mock_router
-        mock_router.api.devices.register_subscription.assert_called_once()
+        mock_router.api.devices.register_subscription.assert_not_called()
 
     def test_unique_id(self, mock_device, mock_router):
         """Test unique_id property."""
@@ -34,6 +47,14 @@ class TestHelvarLight:
         light = HelvarLight(mock_device, mock_router)
         assert light.brightness == 128
 
+    def test_brightness_shows_prediction(self, mock_device, mock_router):
+        """Test a level just asked for is shown before the router confirms it."""
+        mock_router.optimistic.brightness = Mock(return_value=255)
+        light = HelvarLight(mock_device, mock_router)
+
+        assert light.brightness == 255
+        mock_router.optimistic.brightness.assert_called_once_with(mock_device)
+
     def test_is_on_when_brightness_greater_than_zero(self, mock_device, mock_router):
         """Test is_on returns True when brightness > 0."""
         mock_device.brightness = 100
@@ -49,7 +70,7 @@ class TestHelvarLight:
     def test_supported_color_modes(self, mock_device, mock_router):
         """Test supported_color_modes property."""
         light = HelvarLight(mock_device, mock_router)
-        assert light.supported_color_modes == [ColorMode.BRIGHTNESS]
+        assert light.supported_color_modes == {ColorMode.BRIGHTNESS}
 
     def test_color_mode(self, mock_device, mock_router):
         """Test color_mode property."""
@@ -63,8 +84,8 @@ class TestHelvarLight:
         
         await light.async_turn_on(**{ATTR_BRIGHTNESS: 200})
         
-        mock_router.api.devices.set_device_brightness.assert_called_once_with(
-            mock_device.address, 200
+        mock_router.scheduler.async_set_brightness.assert_called_once_with(
+            mock_device.address, 200, None
         )
 
     @pytest.mark.asyncio
@@ -74,8 +95,31 @@ class TestHelvarLight:
         
         await light.async_turn_on()
         
-        mock_router.api.devices.set_device_brightness.assert_called_once_with(
-            mock_device.address, 255
+        mock_router.scheduler.async_set_brightness.assert_called_once_with(
+            mock_device.address, 255, None
+        )
+
+    @pytest.mark.asyncio
+    async def test_async_turn_on_with_transition(self, mock_device, mock_router):
+        """Test a transition is passed on as a fade time in hundredths of a second."""
+        light = HelvarLight(mock_device, mock_router)
+
+        await light.async_turn_on(**{ATTR_BRIGHTNESS: 200, ATTR_TRANSITION: 600})
+
+        mock_router.scheduler.async_set_brightness.assert_called_once_with(
+            mock_device.address, 200, 60000
+        )
+        assert light.supported_features == LightEntityFeature.TRANSITION
+
+    @pytest.mark.asyncio
+    async def test_long_transition_is_clamped(self, mock_device, mock_router):
+        """Test a transition longer than HelvarNet allows is sent as the longest fade."""
+        light = HelvarLight(mock_device, mock_router)
+
+        await light.async_turn_on(**{ATTR_BRIGHTNESS: 200, ATTR_TRANSITION: 6553})
+
+        mock_router.scheduler.async_set_brightness.assert_called_once_with(
+            mock_device.address, 200, 65535
         )
 
     @pytest.mark.asyncio
@@ -85,26 +129,148 @@ class TestHelvarLight:
         
         await light.async_turn_off()
         
-        mock_router.api.devices.set_device_brightness.assert_called_once_with(
-            mock_device.address, 0
+        mock_router.scheduler.async_set_brightness.assert_called_once_with(
+            mock_device.address, 0, None
         )
 
     @pytest.mark.asyncio
-    async def test_subscription_callback(self, mock_device, mock_router):
-        """Test that subscription callback triggers state update."""
+    async def test_switch_is_on_off(self, mock_device, mock_router):
+        """Test a switching device is an on/off light that turns fully on."""
+        mock_router.device_kind.return_value = KIND_SWITCH
         light = HelvarLight(mock_device, mock_router)
-        
-        # Mock the async_write_ha_state method
-        light.async_write_ha_state = Mock()
-        
-        # Get the callback that was registered
-        callback = mock_router.api.devices.register_subscription.call_args[0][1]
-        
-        # Call the callback
-        await callback(mock_device)
-        
-        # Verify state update was triggered
-        light.async_write_ha_state.assert_called_once()
+
+        assert light.supported_color_modes == {ColorMode.ONOFF}
+        assert light.color_mode == ColorMode.ONOFF
+        assert light.supported_features == LightEntityFeature(0)
+
+        await light.async_turn_on(**{ATTR_BRIGHTNESS: 20})
+
+        mock_router.scheduler.async_set_brightness.assert_called_once_with(
+            mock_device.address, 255, None
+        )
+
+    def test_emergency_state_attributes(self, mock_device, mock_router):
+        """Test an emergency fitting reports its emergency state."""
+        assert HelvarLight(mock_device, mock_router).extra_state_attributes is None
+
+        mock_router.device_kind.return_value = KIND_EMERGENCY
+        mock_device.state = 0x00000400
+        mock_device.is_lamp_failure = False
+        light = HelvarLight(mock_device, mock_router)
+
+        assert light.extra_state_attributes == {
+            "in_emergency": True,
+            "battery_failed": False,
+            "lamp_failed": False,
+        }
+
+    def test_disabled_by_default_in_disabled_groups(self, mock_device, mock_router):
+        """Test a light only in disabled groups is disabled by default."""
+        assert HelvarLight(mock_device, mock_router).entity_registry_enabled_default
+
+        mock_router.in_disabled_groups.return_value = True
+        light = HelvarLight(mock_device, mock_router)
+
+        assert light.entity_registry_enabled_default is False
+        mock_router.in_disabled_groups.assert_called_with(mock_device.address)
+
+    @pytest.mark.asyncio
+    async def test_added_to_dispatch_table(self, mock_device, mock_router):
+        """Test the light is looked up by address while it is added."""
+        mock_router.lights = {}
+        light = HelvarLight(mock_device, mock_router)
+        light.hass = Mock()
+
+        with patch(
+            "custom_components.helvar.light.async_dispatcher_connect",
+            return_value=Mock(),
+        ):
+            await light.async_added_to_hass()
+        assert mock_router.lights == {mock_device.address: light}
+
+        await light.async_will_remove_from_hass()
+        assert mock_router.lights == {}
+
+
+class TestHelvarGroupLight:
+    """Test the HelvarGroupLight class."""
+
+    @pytest.fixture
+    def mock_group(self, mock_router):
+        """Create a group of two lights, one of them on."""
+        group = Mock()
+        group.group_id = 4
+        group.name = "Office"
+        group.devices = ["1.2.3.1", "1.2.3.2"]
+        for address, brightness in zip(group.devices, (0, 200)):
+            device = Mock()
+            device.address = address
+            device.is_load = True
+            device.brightness = brightness
+            mock_router.api.devices.devices[address] = device
+        return group
+
+    @pytest.mark.asyncio
+    async def test_added_to_dispatch_table(self, mock_group, mock_router):
+        """Test the group light is looked up by group id while it is added."""
+        mock_router.group_lights = {}
+        light = HelvarGroupLight(mock_group, mock_router)
+        light.hass = Mock()
+
+        with patch(
+            "custom_components.helvar.light.async_dispatcher_connect",
+            return_value=Mock(),
+        ):
+            await light.async_added_to_hass()
+        assert mock_router.group_lights == {4: light}
+        mock_router.api.groups.register_subscription.assert_not_called()
+
+        await light.async_will_remove_from_hass()
+        assert mock_router.group_lights == {}
+
+    def test_disabled_by_default_in_disabled_groups(self, mock_group, mock_router):
+        """Test the light of a disabled group is disabled by default."""
+        mock_router.disabled_groups = {4}
+
+        light = HelvarGroupLight(mock_group, mock_router)
+
+        assert light.entity_registry_enabled_default is False
+
+    def test_state_from_members(self, mock_group, mock_router):
+        """Test brightness is the average of the members that are on."""
+        light = HelvarGroupLight(mock_group, mock_router)
+
+        assert light.is_on is True
+        assert light.brightness == 200
+        assert light.unique_id == "4-group-light"
+        assert light.name == "Group: Office"
+        assert light.supported_features == LightEntityFeature.TRANSITION
+        assert light.supported_color_modes == {ColorMode.BRIGHTNESS}
+        assert light.color_mode == ColorMode.BRIGHTNESS
+
+    @pytest.mark.asyncio
+    async def test_turn_on_sets_group_level(self, mock_group, mock_router):
+        """Test turning on queues one group level with the transition as fade."""
+        mock_router.scheduler.async_set_group_brightness = AsyncMock()
+        light = HelvarGroupLight(mock_group, mock_router)
+
+        await light.async_turn_on(**{ATTR_BRIGHTNESS: 128, ATTR_TRANSITION: 2.5})
+
+        mock_router.scheduler.async_set_group_brightness.assert_called_once_with(
+            4, 128, 250
+        )
+
+    @pytest.mark.asyncio
+    async def test_turn_off_sets_group_level(self, mock_group, mock_router):
+        """Test turning off queues one group level of zero."""
+        mock_router.scheduler.async_set_group_brightness = AsyncMock()
+        light = HelvarGroupLight(mock_group, mock_router)
+
+        await light.async_turn_off()
+
+        mock_router.scheduler.async_set_group_brightness.assert_called_once_with(
+            4, 0, None
+        )
 
 
 class TestAsyncSetupEntry:
@@ -157,7 +323,7 @@ class TestAsyncSetupEntry:
         await async_setup_entry(mock_hass, mock_config_entry, mock_add_entities)
         
         # Verify that no entities were added
-        mock_add_entities.assert_called_once_with([])
+        mock_add_entities.assert_not_called()
 
 
 class TestHelvarLightIntegration:
@@ -176,8 +342,8 @@ class TestHelvarLightIntegration:
         
         # Turn on with brightness
         await light.async_turn_on(**{ATTR_BRIGHTNESS: 150})
-        mock_router.api.devices.set_device_brightness.assert_called_with(
-            mock_device.address, 150
+        mock_router.scheduler.async_set_brightness.assert_called_with(
+            mock_device.address, 150, None
         )
         
         # Simulate device brightness update
@@ -187,8 +353,8 @@ class TestHelvarLightIntegration:
         
         # Turn off
         await light.async_turn_off()
-        mock_router.api.devices.set_device_brightness.assert_called_with(
-            mock_device.address, 0
+        mock_router.scheduler.async_set_brightness.assert_called_with(
+            mock_device.address, 0, None
         )
         
         # Simulate device brightness update
@@ -208,4 +374,53 @@ class TestHelvarLightIntegration:
             assert light.brightness == brightness
             assert light.is_on == (brightness > 0)
             assert light.color_mode == ColorMode.BRIGHTNESS
-            assert ColorMode.BRIGHTNESS in light.supported_color_modes
\ No newline at end of file
+            assert ColorMode.BRIGHTNESS in light.supported_color_modes
+    @pytest.mark.asyncio
+    async def test_topology_updates_add_and_remove_lights(
+        self, mock_hass, mock_config_entry, mock_add_entities, mock_router
+    ):
+        """Test lights come and go with the devices and groups a sync finds."""
+        mock_hass.data = {HELVAR_DOMAIN: {mock_config_entry.entry_id: mock_router}}
+        new_device = Mock()
+        new_device.is_light = True
+        new_device.is_load = True
+        mock_router.api.devices.devices[aiohelvar.HelvarAddress(0, 1, 1, 9)] = new_device
+
+        with patch(
+            "custom_components.helvar.light.async_dispatcher_connect"
+        ) as dispatcher_connect:
+            await async_setup_entry(mock_hass, mock_config_entry, mock_add_entities)
+        async_topology_updated = dispatcher_connect.call_args[0][2]
+
+        diff = TopologyDiff(
+            added_devices=["0.1.1.9"], removed_devices=["0.1.1.3"], removed_groups=["7"]
+        )
+        with patch(
+            "custom_components.helvar.light.async_remove_entities"
+        ) as remove_entities:
+            async_topology_updated(diff)
+
+        remove_entities.assert_called_once_with(
+            mock_hass, "light", ["@0.1.1.3-light", "7-group-light"]
+        )
+        (added,) = mock_add_entities.call_args[0][0]
+        assert isinstance(added, HelvarLight)
+        assert added.device is new_device
+
+    @pytest.mark.asyncio
+    async def test_topology_signal_connected_before_lights_are_added(
+        self, mock_hass, mock_config_entry, mock_add_entities, mock_router
+    ):
+        """Test devices discovered while lights are being added aren't missed."""
+        mock_hass.data = {HELVAR_DOMAIN: {mock_config_entry.entry_id: mock_router}}
+        mock_router.api.devices.get_light_devices.return_value = [Mock()]
+
+        with patch(
+            "custom_components.helvar.light.async_dispatcher_connect"
+        ) as dispatcher_connect:
+            mock_add_entities.side_effect = (
+                lambda entities: dispatcher_connect.assert_called_once()
+            )
+            await async_setup_entry(mock_hass, mock_config_entry, mock_add_entities)
+
+        mock_add_entities.assert_called_once()
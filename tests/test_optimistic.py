@@ -0,0 +1,181 @@
+"""Tests for optimistic Helvar device levels."""
+import pytest
+from unittest.mock import Mock, patch
+
+import aiohelvar
+from aiohelvar.devices import Device
+
+from custom_components.helvar.optimistic import CONFIRM_TIMEOUT, OptimisticLevels
+
+FIRST = aiohelvar.HelvarAddress(0, 1, 1, 1)
+SECOND = aiohelvar.HelvarAddress(0, 2, 1, 1)
+
+
+# Every test here runs with the module's timer patched.
+pytestmark = pytest.mark.parametrize(
+    "mock_call_later",
+    ["custom_components.helvar.optimistic"],
+    ids=["optimistic"],
+    indirect=True,
+)
+
+
+def _make_levels(mock_hass, poll_rate=1.0):
+    """Create predictions for a router with a light on each of two routers."""
+    api = aiohelvar.Router("10.0.0.1", 50000)
+    for address in (FIRST, SECOND):
+        device = Device(address, raw_type=1537)
+        device.load_level = 20.0
+        api.devices.register_device(device)
+
+    router = Mock()
+    router.poll_rate = poll_rate
+    router.reconciler.backlog = 0.0
+    router.api_for = Mock(return_value=api)
+    return OptimisticLevels(mock_hass, router), api
+
+
+class TestOptimisticLevels:
+    """Test the OptimisticLevels class."""
+
+    def test_prediction_is_shown_straight_away(self, mock_hass, mock_call_later):
+        """Test a predicted level is shown, and written, before it is sent."""
+        levels, api = _make_levels(mock_hass)
+        device = api.devices.devices[FIRST]
+
+        levels.async_predict(FIRST, 200)
+
+        assert levels.brightness(device) == 200
+        assert device.brightness == 51
+        levels.router.async_schedule_device_write.assert_called_once_with(FIRST)
+        # The wait for a read back only starts once the level has been sent.
+        mock_call_later.assert_not_called()
+
+    def test_matching_read_back_confirms(self, mock_hass, mock_call_later):
+        """Test a level read back after the fade confirms the prediction."""
+        levels, api = _make_levels(mock_hass)
+        device = api.devices.devices[FIRST]
+
+        levels.async_predict(FIRST, 200)
+        levels.async_confirm(FIRST, 78.4, 0)
+        assert FIRST in levels.predictions
+
+        levels.async_sent(FIRST)
+        levels.async_confirm(FIRST, 78.4, float("inf"))
+
+        assert levels.brightness(device) == device.brightness
+        assert levels.stats == {
+            "0.1": {
+                "predicted": 1,
+                "confirmed": 1,
+                "diverged": 0,
+                "rolled_back": 0,
+                "expired": 0,
+            }
+        }
+        assert levels.divergence == 0.0
+
+    def test_different_read_back_diverges(self, mock_hass, mock_call_later):
+        """Test a different level read back is counted against its router."""
+        levels, _api = _make_levels(mock_hass)
+        assert levels.divergence is None
+
+        for address, level in ((FIRST, 78.4), (SECOND, 10.0)):
+            levels.async_predict(address, 200)
+            levels.async_sent(address)
+            levels.async_confirm(address, level, float("inf"))
+
+        assert not levels.predictions
+        assert levels.stats["0.1"]["confirmed"] == 1
+        assert levels.stats["0.2"]["diverged"] == 1
+        assert levels.divergence == 50.0
+
+    def test_wait_allows_for_the_reconciler_backlog(self, mock_hass, mock_call_later):
+        """Test the wait for a read back starts at the send, after the backlog."""
+        levels, _api = _make_levels(mock_hass)
+        levels.router.reconciler.backlog = 100.0
+
+        levels.async_predict(FIRST, 200)
+        levels.async_sent(FIRST, 2.0)
+
+        assert mock_call_later.call_args.args[1] == pytest.approx(
+            2.0 + 100.0 + CONFIRM_TIMEOUT, abs=1
+        )
+
+    def test_unconfirmed_prediction_expires(self, mock_hass, mock_call_later):
+        """Test a sent prediction nothing reads back is dropped, not rolled back."""
+        levels, api = _make_levels(mock_hass)
+        device = api.devices.devices[FIRST]
+
+        levels.async_predict(FIRST, 100)
+        levels.async_predict(FIRST, 200)
+        # aiohelvar applies the level as it is sent.
+        levels.async_sent(FIRST)
+        device.load_level = 78.4
+
+        with patch("custom_components.helvar.optimistic.time.monotonic") as now:
+            now.return_value = float("inf")
+            mock_call_later.call_args.args[2](None)
+
+        assert not levels.predictions
+        assert levels.brightness(device) == device.brightness == 199
+        assert levels.stats["0.1"]["predicted"] == 2
+        assert levels.stats["0.1"]["expired"] == 1
+        assert levels.stats["0.1"]["rolled_back"] == 0
+        levels.router.reconciler.async_mark_changed.assert_not_called()
+
+    def test_nothing_expires_while_paused(self, mock_hass, mock_call_later):
+        """Test a pause stops the expiry timer, and pushes deadlines back after."""
+        levels, _api = _make_levels(mock_hass)
+        levels.async_predict(FIRST, 200)
+
+        with patch("custom_components.helvar.optimistic.time.monotonic") as now:
+            now.return_value = 100.0
+            levels.async_sent(FIRST)
+            expire = mock_call_later.call_args.args[2]
+            levels.async_set_paused(True)
+            mock_call_later.return_value.assert_called_once()
+
+            # The timer can still fire as it is cancelled.
+            now.return_value = 1000.0
+            expire(None)
+            assert FIRST in levels.predictions
+
+            levels.async_set_paused(False)
+
+        assert levels.predictions[FIRST].deadline == 100.0 + 900.0 + CONFIRM_TIMEOUT
+        assert mock_call_later.call_args.args[1] == CONFIRM_TIMEOUT
+
+    def test_held_prediction_is_rolled_back(self, mock_hass, mock_call_later):
+        """Test a prediction that wasn't sent goes back to the level before it."""
+        levels, api = _make_levels(mock_hass)
+        device = api.devices.devices[FIRST]
+
+        levels.async_predict(FIRST, 100)
+        levels.async_predict(FIRST, 200)
+        levels.async_roll_back(FIRST)
+
+        assert levels.brightness(device) == device.brightness == 51
+        assert levels.stats["0.1"]["rolled_back"] == 1
+        levels.router.reconciler.async_mark_changed.assert_called_once_with(FIRST)
+
+    def test_link_down_rolls_back_its_router(self, mock_hass, mock_call_later):
+        """Test predictions are only rolled back on the router that went down."""
+        levels, _api = _make_levels(mock_hass)
+
+        levels.async_predict(FIRST, 200)
+        levels.async_predict(SECOND, 200)
+        levels.async_roll_back_router((0, 2))
+
+        assert list(levels.predictions) == [FIRST]
+        assert levels.stats["0.2"]["rolled_back"] == 1
+
+    def test_sending_confirms_without_read_back(self, mock_hass, mock_call_later):
+        """Test with level reconciliation off, sending is as good as it gets."""
+        levels, _api = _make_levels(mock_hass, poll_rate=0)
+
+        levels.async_predict(FIRST, 200)
+        levels.async_sent(FIRST)
+
+        assert not levels.predictions
+        assert levels.stats["0.1"]["confirmed"] == 1
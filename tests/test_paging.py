@@ -0,0 +1,87 @@
+"""Tests for paged entity registration."""
+import asyncio
+import pytest
+from unittest.mock import Mock, patch
+
+from custom_components.helvar.paging import async_add_paged, async_remove_entities
+
+
+class TestAddPaged:
+    """Test entities are added a page at a time."""
+
+    @pytest.mark.asyncio
+    async def test_adds_in_pages(self):
+        """Test every entity is added, in pages of at most page_size."""
+        async_add_entities = Mock()
+
+        added = await async_add_paged(async_add_entities, range(7), page_size=3)
+
+        assert added == 7
+        assert [call.args[0] for call in async_add_entities.call_args_list] == [
+            [0, 1, 2],
+            [3, 4, 5],
+            [6],
+        ]
+
+    @pytest.mark.asyncio
+    async def test_entities_are_created_page_by_page(self):
+        """Test a generator is only advanced as far as the page being added."""
+        created = []
+        pages = []
+
+        def entities():
+            for index in range(4):
+                created.append(index)
+                yield index
+
+        def async_add_entities(page):
+            pages.append((list(page), len(created)))
+
+        await async_add_paged(async_add_entities, entities(), page_size=2)
+
+        assert pages == [([0, 1], 2), ([2, 3], 4)]
+
+    @pytest.mark.asyncio
+    async def test_yields_between_pages(self):
+        """Test other tasks get to run between pages."""
+        ran = []
+
+        async def other():
+            ran.append(True)
+
+        task = asyncio.create_task(other())
+        async_add_entities = Mock(side_effect=lambda page: ran.append(len(page)))
+
+        await async_add_paged(async_add_entities, range(4), page_size=2)
+        await task
+
+        assert ran == [2, True, 2]
+
+    @pytest.mark.asyncio
+    async def test_nothing_to_add(self):
+        """Test nothing is added for no entities."""
+        async_add_entities = Mock()
+
+        assert await async_add_paged(async_add_entities, []) == 0
+        async_add_entities.assert_not_called()
+
+
+class TestRemoveEntities:
+    """Test entities are removed through the entity registry."""
+
+    def test_removes_registered_entities(self):
+        """Test registered entities are removed and unknown ones skipped."""
+        registry = Mock()
+        registry.async_get_entity_id = Mock(
+            side_effect=lambda platform, domain, unique_id: {
+                "1-select": "select.group_1"
+            }.get(unique_id)
+        )
+
+        with patch(
+            "custom_components.helvar.paging.er.async_get", return_value=registry
+        ):
+            removed = async_remove_entities(Mock(), "select", ["1-select", "2-select"])
+
+        assert removed == 1
+        registry.async_remove.assert_called_once_with("select.group_1")
@@ -0,0 +1,150 @@
+"""Tests for the Helvar command pipeline."""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+import aiohelvar
+from aiohelvar.parser.command import Command
+from aiohelvar.parser.command_type import CommandType
+
+from custom_components.helvar.pipeline import (
+    CommandPipeline,
+    LatencyTracker,
+    RateTracker,
+)
+
+
+def _make_api(delay=0.01):
+    """Create a mock router connection that replies after a delay."""
+    api = AsyncMock()
+    api.in_flight = 0
+    api.max_in_flight = 0
+
+    async def reply():
+        api.in_flight += 1
+        api.max_in_flight = max(api.max_in_flight, api.in_flight)
+        await asyncio.sleep(delay)
+        api.in_flight -= 1
+        return "reply"
+
+    async def send_command(command):
+        return asyncio.get_running_loop().create_task(reply())
+
+    api.send_command = AsyncMock(side_effect=send_command)
+    return api
+
+
+class TestLatencyTracker:
+    """Test the LatencyTracker class."""
+
+    def test_percentiles(self):
+        """Test percentiles are taken from recorded samples."""
+        tracker = LatencyTracker()
+        assert tracker.percentile(50) is None
+
+        for latency in range(1, 101):
+            tracker.record(latency / 1000)
+
+        percentiles = tracker.percentiles()
+        assert percentiles["p50"] == pytest.approx(0.051)
+        assert percentiles["p95"] == pytest.approx(0.096)
+        assert percentiles["p99"] == pytest.approx(0.1)
+
+    def test_keeps_recent_samples(self):
+        """Test old samples are dropped."""
+        tracker = LatencyTracker(size=10)
+        for latency in range(100):
+            tracker.record(latency)
+
+        assert len(tracker) == 10
+        assert tracker.percentile(0) == 90
+
+
+class TestRateTracker:
+    """Test the RateTracker class."""
+
+    def test_busy_rate_isnt_capped(self):
+        """Test every event inside the window counts, however many there are."""
+        tracker = RateTracker()
+
+        with patch("custom_components.helvar.pipeline.time.monotonic") as now:
+            for tick in range(3000):
+                now.return_value = tick / 50
+                tracker.record()
+
+            assert tracker.rate() == pytest.approx(50, abs=0.1)
+            assert tracker.total == 3000
+
+            # Events age out of the window.
+            now.return_value = 3000 / 50 + 60.5
+            assert tracker.rate() == 0
+            assert not tracker.times
+
+
+class TestCommandPipeline:
+    """Test the CommandPipeline class."""
+
+    @pytest.mark.asyncio
+    async def test_queries_overlap_within_window(self):
+        """Test queries run at the same time, but no more than the window allows."""
+        api = _make_api()
+        pipeline = CommandPipeline(3)
+        command = Command(CommandType.QUERY_ROUTER_TIME)
+
+        replies = await asyncio.gather(
+            *(pipeline.async_query(api, command) for _ in range(10))
+        )
+
+        assert replies == ["reply"] * 10
+        assert api.max_in_flight == 3
+        assert pipeline.in_flight == 0
+        assert pipeline.stats["queries"] == 10
+        assert len(pipeline.latency) == 10
+
+    @pytest.mark.asyncio
+    async def test_no_reply_commands_are_not_awaited(self):
+        """Test commands the router doesn't answer skip the window."""
+        api = _make_api()
+        pipeline = CommandPipeline(1)
+        command = Command(
+            CommandType.DIRECT_LEVEL_DEVICE,
+            command_address=aiohelvar.HelvarAddress(0, 1, 1, 1),
+        )
+
+        assert await pipeline.async_send(api, command) is None
+
+        api.send_string.assert_called_once_with(str(command))
+        api.send_command.assert_not_called()
+        assert pipeline.stats["sent"] == 1
+        assert pipeline.commands.total == 1
+
+    def test_router_command_rate_isnt_capped(self):
+        """Test each router's command rate counts every command in the window."""
+        pipeline = CommandPipeline(4)
+        first, second = AsyncMock(), AsyncMock()
+        first.cluster_id, first.router_id = 0, 1
+        second.cluster_id, second.router_id = 0, 2
+
+        with patch("custom_components.helvar.pipeline.time.monotonic") as now:
+            for tick in range(2400):
+                now.return_value = tick / 40
+                pipeline.record_command(first)
+            pipeline.record_command(second)
+
+            assert pipeline.commands_for((0, 1)).rate() == pytest.approx(40, abs=0.1)
+            assert pipeline.commands_for((0, 2)).rate() == pytest.approx(1 / 60)
+            assert pipeline.commands.rate() == pytest.approx(40, abs=0.1)
+
+    @pytest.mark.asyncio
+    async def test_timeout_frees_slot(self):
+        """Test a query that times out is counted and gives its slot back."""
+        api = _make_api(delay=1)
+        pipeline = CommandPipeline(1)
+        command = Command(CommandType.QUERY_ROUTER_TIME)
+
+        with pytest.raises(asyncio.TimeoutError):
+            await pipeline.async_query(api, command, timeout=0.01)
+
+        assert pipeline.stats["timeouts"] == 1
+        assert pipeline.in_flight == 0
+        assert len(pipeline.latency) == 0
@@ -0,0 +1,174 @@
+"""Tests for the Helvar level reconciler."""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+
+import aiohelvar
+from aiohelvar.devices import Device
+
+from custom_components.helvar.pipeline import CommandPipeline
+from custom_components.helvar.reconcile import MAX_BACKOFF, LevelReconciler
+
+
+def _make_router(levels):
+    """Create a mock router whose devices report the given load levels."""
+    api = aiohelvar.Router("10.0.0.1", 50000)
+    for device_id in range(1, 4):
+        api.devices.register_device(
+            Device(aiohelvar.HelvarAddress(0, 1, 1, device_id), raw_type=1537)
+        )
+
+    async def send_command(command):
+        response = Mock()
+        response.result = levels.get(command.command_address, "0")
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(response)
+        return future
+
+    api.send_command = AsyncMock(side_effect=send_command)
+    api.devices.update_device_load_level = AsyncMock()
+
+    router = Mock()
+    router.api = api
+    router.api_for = Mock(return_value=api)
+    router.lights = {}
+    router.pipeline = CommandPipeline(4)
+    return router
+
+
+class TestLevelReconciler:
+    """Test the LevelReconciler class."""
+
+    @pytest.mark.asyncio
+    async def test_drifted_level_is_corrected(self, mock_hass):
+        """Test a level that differs from ours is pushed to the device."""
+        address = aiohelvar.HelvarAddress(0, 1, 1, 2)
+        router = _make_router({address: "75.0"})
+        reconciler = LevelReconciler(mock_hass, router, 1.0)
+
+        await reconciler.async_poll(address)
+
+        router.api.devices.update_device_load_level.assert_called_once_with(
+            address, 75.0
+        )
+        assert reconciler.stats["corrections"] == 1
+        assert address in reconciler.last_polled
+        router.events.async_level_changed.assert_called_once_with(
+            router.api.devices.devices[address], "poll"
+        )
+        assert router.optimistic.async_confirm.call_args.args[:2] == (address, 75.0)
+
+    @pytest.mark.asyncio
+    async def test_matching_level_is_left_alone(self, mock_hass):
+        """Test a level that matches ours isn't corrected."""
+        address = aiohelvar.HelvarAddress(0, 1, 1, 2)
+        router = _make_router({address: "0"})
+        reconciler = LevelReconciler(mock_hass, router, 1.0)
+
+        await reconciler.async_poll(address)
+
+        router.api.devices.update_device_load_level.assert_not_called()
+        assert reconciler.stats["queries"] == 1
+
+    def test_priority_order(self, mock_hass):
+        """Test recently changed devices come first, then visible lights."""
+        router = _make_router({})
+        first, second, third = router.api.devices.devices
+        router.lights = {third: Mock()}
+        reconciler = LevelReconciler(mock_hass, router, 1.0)
+
+        with patch("custom_components.helvar.reconcile.RECENT_CHANGE_DELAY", 0):
+            reconciler.async_mark_changed(second)
+            order = [reconciler._next_address() for _ in range(4)]
+
+        assert order == [second, third, first, second]
+
+    def test_no_lights_starts_no_cycles(self, mock_hass):
+        """Test a router without lights doesn't churn through empty cycles."""
+        router = _make_router({})
+        router.api.devices.devices.clear()
+        reconciler = LevelReconciler(mock_hass, router, 1.0)
+
+        assert [reconciler._next_address() for _ in range(3)] == [None] * 3
+        assert reconciler.stats["cycles"] == 0
+        assert reconciler.last_cycle is None
+
+    def test_busy_address_is_kept(self, mock_hass):
+        """Test a device still being queried is skipped, and queried later."""
+        router = _make_router({})
+        first, second, third = router.api.devices.devices
+        reconciler = LevelReconciler(mock_hass, router, 1.0)
+        reconciler._polling.add(first)
+
+        with patch("custom_components.helvar.reconcile.RECENT_CHANGE_DELAY", 0):
+            reconciler.async_mark_changed(first)
+            assert reconciler._next_address() == second
+            assert reconciler._next_address() == third
+            assert reconciler._next_address() is None
+
+            reconciler._polling.clear()
+            assert reconciler._next_address() == first
+            assert reconciler._next_address() == first
+
+    def test_backlog(self, mock_hass):
+        """Test the backlog is the time to query every recently changed device."""
+        router = _make_router({})
+        reconciler = LevelReconciler(mock_hass, router, 2.0)
+        assert reconciler.backlog == 0
+
+        for address in router.api.devices.devices:
+            reconciler.async_mark_changed(address)
+
+        assert reconciler.backlog == 1.5
+
+    @pytest.mark.asyncio
+    async def test_cycle_reports_coverage(self, mock_hass):
+        """Test finishing a cycle records how many devices were queried."""
+        router = _make_router({})
+        reconciler = LevelReconciler(mock_hass, router, 1.0)
+
+        reconciler._next_address()
+        for address in list(router.api.devices.devices)[:2]:
+            await reconciler.async_poll(address)
+        reconciler._queue.clear()
+        reconciler._next_address()
+
+        assert reconciler.stats["cycles"] == 1
+        assert reconciler.last_cycle["coverage"] == pytest.approx(2 / 3)
+        assert reconciler.last_cycle["staleness"] >= 0
+
+    @pytest.mark.asyncio
+    async def test_backs_off_when_router_is_slow(self, mock_hass):
+        """Test timeouts slow the poller down and quick replies speed it up."""
+        router = _make_router({})
+        router.api.send_command = AsyncMock(
+            side_effect=aiohelvar.CommandResponseTimeout(None)
+        )
+        reconciler = LevelReconciler(mock_hass, router, 2.0)
+        address = aiohelvar.HelvarAddress(0, 1, 1, 1)
+
+        for _ in range(10):
+            await reconciler.async_poll(address)
+
+        assert reconciler.backoff == MAX_BACKOFF
+        assert reconciler.interval == MAX_BACKOFF / 2.0
+        assert reconciler.stats["timeouts"] == 10
+
+        reconciler._adjust_backoff(0.01)
+        assert reconciler.backoff == MAX_BACKOFF // 2
+
+    @pytest.mark.asyncio
+    async def test_paused_reconciler_sends_nothing(self, mock_hass):
+        """Test no queries are started while the reconciler is paused."""
+        router = _make_router({})
+        reconciler = LevelReconciler(mock_hass, router, 2.0)
+        reconciler.paused = True
+
+        with patch(
+            "custom_components.helvar.reconcile.asyncio.sleep",
+            AsyncMock(side_effect=[None, None, asyncio.CancelledError]),
+        ), pytest.raises(asyncio.CancelledError):
+            await reconciler.async_run()
+
+        mock_hass.async_create_task.assert_not_called()
+        assert reconciler.stats["queries"] == 0
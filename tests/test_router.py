@@ -0,0 +1,337 @@
+"""Tests for the Helvar router manager."""
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+
+import aiohelvar
+from aiohelvar.devices import Device, Devices
+from aiohelvar.groups import Group, Groups
+from aiohelvar.scenes import Scene, Scenes
+
+from custom_components.helvar.router import HelvarRouter
+from custom_components.helvar.topology import TopologyDiff
+
+
+def _make_aio_router(host, port):
+    """Create a mock aiohelvar router whose ids come from its IP address."""
+    router = Mock()
+    router.host = host
+    router.cluster_id, router.router_id = (int(o) for o in host.split(".")[2:])
+    router.connected = True
+    router.workgroup_name = "Workgroup"
+    router.connect = AsyncMock()
+    router.disconnect = AsyncMock()
+    router.devices = Devices(router)
+    router.groups = Groups(router)
+    router.scenes = Scenes(router)
+    return router
+
+
+def _patch_discovery():
+    """Patch out discovery, which the mock routers can't answer."""
+    discovery = Mock()
+    discovery.async_read_configuration = AsyncMock()
+    discovery.configuration = {"devices": {}, "groups": {}, "scenes": {}}
+    return patch(
+        "custom_components.helvar.router.WorkgroupDiscovery", return_value=discovery
+    )
+
+
+@pytest.fixture
+def workgroup_entry(mock_config_entry):
+    """Create a config entry for a workgroup of two routers."""
+    mock_config_entry.data = {
+        "host": "10.0.0.1",
+        "port": 50000,
+        "routers": ["10.0.0.2"],
+    }
+    return mock_config_entry
+
+
+class TestWorkgroup:
+    """Test managing several routers from one config entry."""
+
+    @pytest.mark.asyncio
+    async def test_setup_discovers_every_router(
+        self, mock_hass, workgroup_entry, mock_topology_store
+    ):
+        """Test every router is connected and its devices end up in one registry."""
+        with patch(
+            "custom_components.helvar.router.aiohelvar.Router",
+            side_effect=_make_aio_router,
+        ), _patch_discovery() as discovery_class:
+            router = HelvarRouter(mock_hass, workgroup_entry)
+            assert await router.async_setup() is True
+
+        primary = router.routers[(0, 1)]
+        secondary = router.routers[(0, 2)]
+
+        assert router.api is primary
+        primary.connect.assert_called_once()
+        secondary.connect.assert_called_once()
+
+        pipeline, routers, _on_devices = discovery_class.call_args.args
+        assert pipeline is router.pipeline
+        assert routers == [primary, secondary]
+        assert router.discovery is discovery_class.return_value
+        router.discovery.async_read_configuration.assert_called_once()
+
+        task_names = [
+            call.args[2]
+            for call in workgroup_entry.async_create_background_task.call_args_list
+        ]
+        assert "helvar discover workgroup" in task_names
+
+        address = aiohelvar.HelvarAddress(0, 2, 1, 1)
+        assert router.api_for(address) is secondary
+
+    @pytest.mark.asyncio
+    async def test_cached_devices_are_shared_with_their_router(
+        self, mock_hass, workgroup_entry, mock_topology_store
+    ):
+        """Test devices restored from cache are registered with the owning router."""
+        mock_topology_store.async_load.return_value = {
+            "workgroup_name": "Workgroup",
+            "devices": {
+                "0.2.1.7": {
+                    "name": "Desk",
+                    "protocol": "DALI",
+                    "type": "LED modules",
+                    "state": 0,
+                    "load_level": 0.0,
+                    "levels": [],
+                }
+            },
+            "groups": {},
+            "scenes": {},
+        }
+
+        with patch(
+            "custom_components.helvar.router.aiohelvar.Router",
+            side_effect=_make_aio_router,
+        ):
+            router = HelvarRouter(mock_hass, workgroup_entry)
+            assert await router.async_setup() is True
+
+        address = aiohelvar.HelvarAddress(0, 2, 1, 7)
+        assert address in router.routers[(0, 2)].devices.devices
+        assert router.discovery is None
+
+    @pytest.mark.asyncio
+    async def test_reset_disconnects_every_router(
+        self, mock_hass, workgroup_entry, mock_topology_store
+    ):
+        """Test unloading closes every router connection."""
+        with patch(
+            "custom_components.helvar.router.aiohelvar.Router",
+            side_effect=_make_aio_router,
+        ), _patch_discovery():
+            router = HelvarRouter(mock_hass, workgroup_entry)
+            await router.async_setup()
+
+        await router.async_reset()
+
+        for aio_router in router.routers.values():
+            aio_router.disconnect.assert_called_once()
+
+
+class TestScenePrediction:
+    """Test predicted device levels after a group scene recall."""
+
+    @pytest.mark.asyncio
+    async def test_group_recall_writes_member_lights(
+        self, mock_hass, mock_config_entry, mock_topology_store
+    ):
+        """Test a group scene notification updates member lights in one batch."""
+        mock_config_entry.data = {"host": "10.0.0.1", "port": 50000}
+
+        with patch(
+            "custom_components.helvar.router.aiohelvar.Router",
+            side_effect=_make_aio_router,
+        ), _patch_discovery():
+            router = HelvarRouter(mock_hass, mock_config_entry)
+            await router.async_setup()
+
+        api = router.api
+        address = aiohelvar.HelvarAddress(0, 1, 1, 5)
+        device = Device(address, raw_type=1537)
+        device.levels = ["0"] * 136
+        device.levels[aiohelvar.SceneAddress(4, 1, 1).to_device_int()] = "50"
+        api.devices.register_device(device)
+
+        group = Group(4)
+        group.devices = [address]
+        api.groups.register_group(group)
+
+        router._track_scene_levels()
+        light = Mock()
+        router.lights[address] = light
+        router.state_writer = Mock()
+
+        await api.groups.handle_scene_callback(aiohelvar.SceneAddress(4, 1, 1), 0)
+
+        assert device.load_level == 50.0
+        router.state_writer.async_schedule_write.assert_called_with(light)
+
+        fired = [call.args for call in mock_hass.bus.async_fire.call_args_list]
+        assert [event_type for event_type, _data in fired] == [
+            "helvar_scene_recalled",
+            "helvar_level_changed",
+        ]
+        assert fired[0][1]["scene_address"] == "@4.1.1"
+        assert fired[1][1]["address"] == "@0.1.1.5"
+        assert fired[1][1]["level"] == 50.0
+        assert fired[1][1]["source"] == "scene"
+
+
+async def _async_setup_grouped(hass, entry):
+    """Set up a router with two devices in group 4, one of them also in group 5."""
+    entry.data = {"host": "10.0.0.1", "port": 50000}
+
+    with patch(
+        "custom_components.helvar.router.aiohelvar.Router",
+        side_effect=_make_aio_router,
+    ), _patch_discovery():
+        router = HelvarRouter(hass, entry)
+        await router.async_setup()
+
+    addresses = [aiohelvar.HelvarAddress(0, 1, 1, i) for i in (1, 2)]
+    for address in addresses:
+        router.api.devices.register_device(Device(address, raw_type=1537))
+    for group_id, members in ((4, addresses), (5, addresses[:1])):
+        group = Group(group_id)
+        group.devices = members
+        router.api.groups.register_group(group)
+
+    router._track_devices()
+    router.state_writer = Mock()
+    return router
+
+
+class TestDispatch:
+    """Test device updates are dispatched to entities through the router."""
+
+    @pytest.mark.asyncio
+    async def test_one_shared_callback_per_device(
+        self, mock_hass, mock_config_entry, mock_topology_store
+    ):
+        """Test every device gets the same callback, once however often tracked."""
+        router = await _async_setup_grouped(mock_hass, mock_config_entry)
+        router._track_devices()
+
+        for device in router.api.devices.devices.values():
+            assert device.subscriptions == [router._device_callback]
+
+    @pytest.mark.asyncio
+    async def test_device_kinds_detected_once(
+        self, mock_hass, mock_config_entry, mock_topology_store
+    ):
+        """Test device kinds are cached when tracked, and dropped with the device."""
+        router = await _async_setup_grouped(mock_hass, mock_config_entry)
+        address = aiohelvar.HelvarAddress(0, 1, 1, 1)
+        assert router.capabilities[address] == "dimmer"
+
+        with patch("custom_components.helvar.router.detect_kind") as detect_kind:
+            router._track_devices()
+            assert router.device_kind(router.api.devices.devices[address]) == "dimmer"
+        detect_kind.assert_not_called()
+
+        del router.api.devices.devices[address]
+        router._track_devices()
+        assert address not in router.capabilities
+
+    @pytest.mark.asyncio
+    async def test_devices_in_the_same_groups_share_group_ids(
+        self, mock_hass, mock_config_entry, mock_topology_store
+    ):
+        """Test group memberships are shared between devices with the same groups."""
+        router = await _async_setup_grouped(mock_hass, mock_config_entry)
+        router.api.devices.register_device(
+            Device(aiohelvar.HelvarAddress(0, 1, 1, 3), raw_type=1537)
+        )
+        router.api.groups.groups[4].devices.append(aiohelvar.HelvarAddress(0, 1, 1, 3))
+        router._track_devices()
+
+        first, second, third = (
+            router._device_groups[aiohelvar.HelvarAddress(0, 1, 1, i)]
+            for i in (1, 2, 3)
+        )
+        assert first == (4, 5)
+        assert second == (4,)
+        assert third is second
+
+    @pytest.mark.asyncio
+    async def test_device_update_writes_light_and_group_lights(
+        self, mock_hass, mock_config_entry, mock_topology_store
+    ):
+        """Test a device update writes its light and the lights of its groups."""
+        router = await _async_setup_grouped(mock_hass, mock_config_entry)
+        device = router.api.devices.devices[aiohelvar.HelvarAddress(0, 1, 1, 1)]
+        light, office, hall = Mock(), Mock(), Mock()
+        router.lights[device.address] = light
+        router.group_lights.update({4: office, 5: hall})
+
+        await device.update_subscribers()
+
+        assert [
+            call.args[0]
+            for call in router.state_writer.async_schedule_write.call_args_list
+        ] == [light, office, hall]
+
+    @pytest.mark.asyncio
+    async def test_scene_recall_writes_group_light(
+        self, mock_hass, mock_config_entry, mock_topology_store
+    ):
+        """Test a scene recall on a group writes its group light."""
+        router = await _async_setup_grouped(mock_hass, mock_config_entry)
+        office = Mock()
+        router.group_lights[4] = office
+
+        await router._async_group_scene_changed(router.api.groups.groups[4])
+
+        router.state_writer.async_schedule_write.assert_called_with(office)
+
+    @pytest.mark.asyncio
+    async def test_in_disabled_groups(
+        self, mock_hass, mock_config_entry, mock_topology_store
+    ):
+        """Test a device is disabled only when every one of its groups is."""
+        router = await _async_setup_grouped(mock_hass, mock_config_entry)
+        first, second, ungrouped = (
+            aiohelvar.HelvarAddress(0, 1, 1, i) for i in (1, 2, 9)
+        )
+
+        mock_config_entry.options = {"disabled_groups": ["4"]}
+        assert not router.in_disabled_groups(first)
+        assert router.in_disabled_groups(second)
+        assert not router.in_disabled_groups(ungrouped)
+
+        mock_config_entry.options = {"disabled_groups": ["4", "5"]}
+        assert router.in_disabled_groups(first)
+
+
+class TestScenesUpdated:
+    """Test group selects are told when scenes change."""
+
+    @pytest.mark.asyncio
+    async def test_changed_scenes_send_scenes_updated(
+        self, mock_hass, mock_config_entry, mock_topology_store
+    ):
+        """Test a topology change with scenes in it sends the scenes signal."""
+        router = await _async_setup_grouped(mock_hass, mock_config_entry)
+        scene_address = aiohelvar.SceneAddress(4, 1, 1)
+        router.api.scenes.register_scene(
+            scene_address, Scene(scene_address, name="Bright")
+        )
+
+        with patch(
+            "custom_components.helvar.router.async_dispatcher_send"
+        ) as dispatcher_send:
+            router._async_topology_changed(TopologyDiff())
+            dispatcher_send.assert_not_called()
+
+            router._async_topology_changed(TopologyDiff(changed_scenes=["@4.1.1"]))
+
+        dispatcher_send.assert_called_once_with(
+            mock_hass, router.scenes_updated_signal
+        )
+        assert router.scene_names.name(scene_address) == "Bright - @4.1.1"
@@ -0,0 +1,122 @@
+"""Tests for the Helvar scene level table."""
+import pytest
+
+import aiohelvar
+from aiohelvar.devices import Device
+from aiohelvar.groups import Group
+
+from custom_components.helvar.scene_levels import (
+    LAST_LEVEL,
+    SCENE_LEVEL_COUNT,
+    SceneLevelTable,
+)
+
+BRIGHT = aiohelvar.SceneAddress(1, 1, 1)
+DIM = aiohelvar.SceneAddress(1, 1, 2)
+OFF = aiohelvar.SceneAddress(1, 1, 15)
+
+
+def _make_api():
+    """Create an unconnected router with a group of three lights."""
+    api = aiohelvar.Router("10.0.0.1", 50000)
+
+    scene_levels = [
+        {BRIGHT: "100", DIM: "40", OFF: "0"},
+        {BRIGHT: "100", DIM: "*", OFF: "0"},
+        {BRIGHT: "L", DIM: "20", OFF: "0"},
+    ]
+    for device_id, levels in enumerate(scene_levels, start=1):
+        device = Device(aiohelvar.HelvarAddress(0, 1, 1, device_id), raw_type=1537)
+        device.levels = ["*"] * 136
+        for scene_address, level in levels.items():
+            device.levels[scene_address.to_device_int()] = level
+        api.devices.register_device(device)
+
+    group = Group(1)
+    group.devices = list(api.devices.devices)
+    api.groups.register_group(group)
+
+    return api
+
+
+class TestSceneLevelTable:
+    """Test the SceneLevelTable class."""
+
+    def test_levels_for_scene(self):
+        """Test levels are read per member, skipping ignored ones."""
+        api = _make_api()
+        table = SceneLevelTable()
+        table.rebuild(api)
+
+        first, second, third = api.devices.devices
+
+        assert table.levels_for_scene(DIM) == {first: 40.0, third: 20.0}
+        assert table.levels_for_scene(BRIGHT) == {
+            first: 100.0,
+            second: 100.0,
+            third: LAST_LEVEL,
+        }
+        assert table.levels_for_scene(aiohelvar.SceneAddress(2, 1, 1)) == {}
+
+    def test_scene_devices(self):
+        """Test the devices a scene sets are the members it doesn't ignore."""
+        api = _make_api()
+        table = SceneLevelTable()
+        table.rebuild(api)
+        first, second, third = api.devices.devices.values()
+
+        assert table.scene_devices(api, OFF) == [first, second, third]
+        assert table.scene_devices(api, DIM) == [first, third]
+
+    @pytest.mark.asyncio
+    async def test_short_levels_are_padded(self):
+        """Test a member with missing scene levels doesn't stop a recall.
+
+        aiohelvar raises on it otherwise, before the group's subscribers are told.
+        """
+        api = _make_api()
+        first, second, third = api.devices.devices.values()
+        second.levels = second.levels[:2]
+        third.levels = []
+        table = SceneLevelTable()
+        table.rebuild(api)
+        group = api.groups.groups[1]
+        recalls = []
+
+        async def recalled(group):
+            recalls.append(group.get_last_scene_address())
+
+        group.add_subscriber(recalled)
+        third.load_level = 60.0
+
+        await api.groups.handle_scene_callback(OFF, 0)
+
+        assert len(second.levels) == len(third.levels) == SCENE_LEVEL_COUNT
+        assert recalls == [OFF]
+        assert first.load_level == 0.0
+        assert third.load_level == 60.0
+        assert table.scene_devices(api, OFF) == [first]
+
+    def test_store_scene(self):
+        """Test storing a scene records current levels, except where ignored."""
+        api = _make_api()
+        table = SceneLevelTable()
+        table.rebuild(api)
+        first, second, third = api.devices.devices.values()
+        levels = second.levels
+        for device, level in zip((first, second, third), (60.0, 60.0, 12.5)):
+            device.load_level = level
+
+        stored = table.store_scene(api, DIM)
+
+        assert stored == [first, third]
+        assert table.levels_for_scene(DIM) == {
+            first.address: 60.0,
+            third.address: 12.5,
+        }
+        assert second.levels is levels
+
+        assert table.store_scene(api, DIM, force=True) == [first, second, third]
+        assert table.levels_for_scene(DIM)[second.address] == 60.0
+        # Levels that match again are shared again.
+        assert first.levels is second.levels
@@ -0,0 +1,94 @@
+"""Tests for the index of rendered Helvar scene names."""
+import aiohelvar
+from aiohelvar import SceneAddress
+from aiohelvar.scenes import Scene
+
+from custom_components.helvar.scene_names import SceneNameIndex, render_scene_name
+
+
+def _make_api(*scenes):
+    """Create an aiohelvar router with some scenes."""
+    api = aiohelvar.Router("10.0.0.1", 50000)
+    for scene in scenes:
+        api.scenes.register_scene(scene.address, scene)
+    return api
+
+
+def _make_index(api):
+    index = SceneNameIndex()
+    index.rebuild(api)
+    return index
+
+
+class TestSceneNameIndex:
+    """Test the SceneNameIndex class."""
+
+    def test_render_scene_name(self):
+        """Test names are rendered with their address, or as unnamed."""
+        assert render_scene_name(Scene(SceneAddress(3, 1, 2), name="Dim")) == (
+            "Dim - @3.1.2"
+        )
+        assert render_scene_name(Scene(SceneAddress(3, 1, 2))) == "Unnamed - @3.1.2"
+        assert render_scene_name(None) is None
+
+    def test_rebuild(self):
+        """Test every scene is rendered, and grouped for the selects."""
+        api = _make_api(
+            Scene(SceneAddress(3, 1, 3)),
+            Scene(SceneAddress(3, 1, 2), name="Dim"),
+            Scene(SceneAddress(3, 2, 1), name="Bright"),
+            Scene(SceneAddress(4, 1, 1), name="Away"),
+        )
+        index = _make_index(api)
+
+        assert len(index) == 4
+        assert index.name(SceneAddress(3, 1, 2)) == "Dim - @3.1.2"
+        assert index.name(SceneAddress(5, 1, 1)) is None
+        assert index.name(None) is None
+        assert index.options(3) == {
+            "Bright - @3.2.1": SceneAddress(3, 2, 1),
+            "Dim - @3.1.2": SceneAddress(3, 1, 2),
+            "Unnamed - @3.1.3": SceneAddress(3, 1, 3),
+        }
+        assert index.options(5) == {}
+
+    def test_update_renders_only_changed_scenes(self):
+        """Test renamed, added and removed scenes are picked up."""
+        dim = Scene(SceneAddress(3, 1, 2), name="Dim")
+        away = Scene(SceneAddress(4, 1, 1), name="Away")
+        api = _make_api(dim, away)
+        index = _make_index(api)
+        away_options = index.options(4)
+
+        dim.name = "Dark"
+        away.name = "Gone"
+        api.scenes.register_scene(
+            SceneAddress(3, 1, 1), Scene(SceneAddress(3, 1, 1), name="Bright")
+        )
+        index.update(api, [SceneAddress(3, 1, 2), SceneAddress(3, 1, 1)])
+
+        assert list(index.options(3)) == ["Bright - @3.1.1", "Dark - @3.1.2"]
+        # Scenes that weren't updated keep their cached name and options.
+        assert index.name(away.address) == "Away - @4.1.1"
+        assert index.options(4) is away_options
+
+        del api.scenes.scenes[dim.address]
+        index.update(api, [dim.address])
+
+        assert index.name(dim.address) is None
+        assert list(index.options(3)) == ["Bright - @3.1.1"]
+
+    def test_remove_group(self):
+        """Test a group that has gone takes its scenes with it."""
+        api = _make_api(
+            Scene(SceneAddress(3, 1, 1), name="Bright"),
+            Scene(SceneAddress(4, 1, 1), name="Away"),
+        )
+        index = _make_index(api)
+        index.options(3)
+
+        index.remove_group(3)
+
+        assert len(index) == 1
+        assert index.name(SceneAddress(3, 1, 1)) is None
+        assert index.options(3) == {}
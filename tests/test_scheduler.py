@@ -0,0 +1,407 @@
+"""Tests for the Helvar command scheduler."""
+import pytest
+from unittest.mock import AsyncMock, Mock
+
+from aiohelvar import SceneAddress
+
+from custom_components.helvar.scheduler import CommandScheduler
+
+
+# Every test here runs with the module's timer patched.
+pytestmark = pytest.mark.parametrize(
+    "mock_call_later",
+    ["custom_components.helvar.scheduler"],
+    ids=["scheduler"],
+    indirect=True,
+)
+
+
+class TestCommandScheduler:
+    """Test the CommandScheduler class."""
+
+    @pytest.mark.asyncio
+    async def test_latest_level_wins(self, mock_hass, mock_router, mock_call_later):
+        """Test that only the latest level per address is sent."""
+        scheduler = CommandScheduler(mock_hass, mock_router, 0.1)
+
+        await scheduler.async_set_brightness("1.2.3.4", 10)
+        await scheduler.async_set_brightness("1.2.3.4", 20)
+        await scheduler.async_set_brightness("1.2.3.4", 30)
+
+        assert scheduler.queue_depth == 1
+
+        await scheduler.async_flush()
+
+        mock_router.api.devices.set_device_brightness.assert_called_once_with(
+            "1.2.3.4", 30
+        )
+        assert scheduler.stats["queued"] == 3
+        assert scheduler.stats["sent"] == 1
+        assert scheduler.stats["merged"] == 2
+        assert scheduler.queue_depth == 0
+
+    @pytest.mark.asyncio
+    async def test_timer_scheduled_once_per_flush(
+        self, mock_hass, mock_router, mock_call_later
+    ):
+        """Test that a single flush timer is armed until the queue is flushed."""
+        scheduler = CommandScheduler(mock_hass, mock_router, 0.25)
+
+        await scheduler.async_set_brightness("1.2.3.4", 10)
+        await scheduler.async_set_brightness("1.2.3.5", 10)
+
+        mock_call_later.assert_called_once()
+        assert mock_call_later.call_args[0][1] == 0.25
+
+        await scheduler.async_flush()
+        await scheduler.async_set_brightness("1.2.3.4", 0)
+
+        assert mock_call_later.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_flush_sends_each_address(
+        self, mock_hass, mock_router, mock_call_later
+    ):
+        """Test that different addresses are not merged."""
+        scheduler = CommandScheduler(mock_hass, mock_router, 0.1)
+
+        await scheduler.async_set_brightness("1.2.3.4", 10)
+        await scheduler.async_set_brightness("1.2.3.5", 0)
+        await scheduler.async_shutdown()
+
+        assert mock_router.api.devices.set_device_brightness.call_count == 2
+        assert scheduler.stats["merged"] == 0
+        assert scheduler.stats["sent"] == 2
+
+
+def _make_group(group_id, addresses):
+    group = Mock()
+    group.group_id = group_id
+    group.devices = addresses
+    return group
+
+
+def _make_device(address, on_level="100", off_level="0"):
+    device = Mock()
+    device.address = address
+    device.levels = ["0"] * 136
+    device.levels[SceneAddress(1, 1, 1).to_device_int()] = on_level
+    device.levels[SceneAddress(1, 1, 15).to_device_int()] = off_level
+    return device
+
+
+class TestGroupPacking:
+    """Test replacing whole-group batches with scene recalls."""
+
+    @pytest.fixture
+    def router_with_group(self, mock_router):
+        """Add a three device group to the mock router."""
+        addresses = ["1.2.3.1", "1.2.3.2", "1.2.3.3"]
+        mock_router.api.devices.devices = {a: _make_device(a) for a in addresses}
+        mock_router.api.groups.groups = {7: _make_group(7, addresses)}
+        return mock_router
+
+    @pytest.mark.asyncio
+    async def test_whole_group_off_becomes_scene_recall(
+        self, mock_hass, router_with_group, mock_call_later
+    ):
+        """Test that turning off every member sends the group's off scene."""
+        scheduler = CommandScheduler(mock_hass, router_with_group, 0.1)
+
+        for address in router_with_group.api.groups.groups[7].devices:
+            await scheduler.async_set_brightness(address, 0)
+        await scheduler.async_flush()
+
+        router_with_group.api.groups.set_scene.assert_called_once_with(
+            SceneAddress(7, 1, 15)
+        )
+        router_with_group.api.devices.set_device_brightness.assert_not_called()
+        assert scheduler.stats["group_commands"] == 1
+        assert scheduler.stats["packed"] == 3
+
+    @pytest.mark.asyncio
+    async def test_whole_group_on_becomes_scene_recall(
+        self, mock_hass, router_with_group, mock_call_later
+    ):
+        """Test that full brightness on every member sends the group's on scene."""
+        scheduler = CommandScheduler(mock_hass, router_with_group, 0.1)
+
+        for address in router_with_group.api.groups.groups[7].devices:
+            await scheduler.async_set_brightness(address, 255)
+        await scheduler.async_flush()
+
+        router_with_group.api.groups.set_scene.assert_called_once_with(
+            SceneAddress(7, 1, 1)
+        )
+
+    @pytest.mark.asyncio
+    async def test_partial_group_sends_device_commands(
+        self, mock_hass, router_with_group, mock_call_later
+    ):
+        """Test that a batch missing a member is not packed."""
+        scheduler = CommandScheduler(mock_hass, router_with_group, 0.1)
+
+        await scheduler.async_set_brightness("1.2.3.1", 0)
+        await scheduler.async_set_brightness("1.2.3.2", 0)
+        await scheduler.async_flush()
+
+        router_with_group.api.groups.set_scene.assert_not_called()
+        assert router_with_group.api.devices.set_device_brightness.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_level_not_matching_scene_sends_device_commands(
+        self, mock_hass, router_with_group, mock_call_later
+    ):
+        """Test that a level the on scene doesn't produce is not packed."""
+        scheduler = CommandScheduler(mock_hass, router_with_group, 0.1)
+
+        for address in router_with_group.api.groups.groups[7].devices:
+            await scheduler.async_set_brightness(address, 128)
+        await scheduler.async_flush()
+
+        router_with_group.api.groups.set_scene.assert_not_called()
+        assert router_with_group.api.devices.set_device_brightness.call_count == 3
+
+    @pytest.mark.asyncio
+    async def test_members_without_a_load_are_left_out(
+        self, mock_hass, router_with_group, mock_call_later
+    ):
+        """Test a group with a sensor and a button in it is still packed."""
+        group = router_with_group.api.groups.groups[7]
+        for address in ("1.2.3.4", "1.2.3.5"):
+            device = _make_device(address)
+            device.is_load = False
+            router_with_group.api.devices.devices[address] = device
+        group.devices = [*group.devices, "1.2.3.4", "1.2.3.5"]
+        scheduler = CommandScheduler(mock_hass, router_with_group, 0.1)
+
+        for address in ("1.2.3.1", "1.2.3.2", "1.2.3.3"):
+            await scheduler.async_set_brightness(address, 0)
+        await scheduler.async_flush()
+
+        router_with_group.api.groups.set_scene.assert_called_once_with(
+            SceneAddress(7, 1, 15)
+        )
+        router_with_group.api.devices.set_device_brightness.assert_not_called()
+        assert scheduler.stats["packed"] == 3
+
+
+class TestFadeTimes:
+    """Test fade times are passed to the router."""
+
+    @pytest.mark.asyncio
+    async def test_device_fade_time(self, mock_hass, mock_router, mock_call_later):
+        """Test a device level is sent with its fade time."""
+        scheduler = CommandScheduler(mock_hass, mock_router, 0.1)
+
+        await scheduler.async_set_brightness("1.2.3.4", 255, 60000)
+        await scheduler.async_flush()
+
+        mock_router.api.devices.set_device_brightness.assert_called_once_with(
+            "1.2.3.4", 255, 60000
+        )
+        mock_router.reconciler.async_mark_changed.assert_called_once_with(
+            "1.2.3.4", 600
+        )
+
+    @pytest.mark.asyncio
+    async def test_packed_scene_recall_fade_time(
+        self, mock_hass, mock_router, mock_call_later
+    ):
+        """Test a packed group keeps its members' shared fade time."""
+        addresses = ["1.2.3.1", "1.2.3.2"]
+        mock_router.api.devices.devices = {a: _make_device(a) for a in addresses}
+        mock_router.api.groups.groups = {7: _make_group(7, addresses)}
+        scheduler = CommandScheduler(mock_hass, mock_router, 0.1)
+
+        for address in addresses:
+            await scheduler.async_set_brightness(address, 0, 500)
+        await scheduler.async_flush()
+
+        mock_router.api.groups.set_scene.assert_called_once_with(
+            SceneAddress(7, 1, 15), 500
+        )
+
+    @pytest.mark.asyncio
+    async def test_mixed_fade_times_are_not_packed(
+        self, mock_hass, mock_router, mock_call_later
+    ):
+        """Test members fading at different speeds are sent one by one."""
+        addresses = ["1.2.3.1", "1.2.3.2"]
+        mock_router.api.devices.devices = {a: _make_device(a) for a in addresses}
+        mock_router.api.groups.groups = {7: _make_group(7, addresses)}
+        scheduler = CommandScheduler(mock_hass, mock_router, 0.1)
+
+        await scheduler.async_set_brightness(addresses[0], 0, 500)
+        await scheduler.async_set_brightness(addresses[1], 0)
+        await scheduler.async_flush()
+
+        mock_router.api.groups.set_scene.assert_not_called()
+        assert mock_router.api.devices.set_device_brightness.call_count == 2
+
+
+class TestGroupLevels:
+    """Test levels set for a whole group at once."""
+
+    @pytest.fixture
+    def router_with_group(self, mock_router):
+        """Add a three device group to the mock router."""
+        addresses = ["1.2.3.1", "1.2.3.2", "1.2.3.3"]
+        mock_router.api.devices.devices = {a: _make_device(a) for a in addresses}
+        for device in mock_router.api.devices.devices.values():
+            device.load_level = 80.0
+        mock_router.api.devices.update_device_load_level = AsyncMock()
+        mock_router.api.groups.groups = {7: _make_group(7, addresses)}
+        mock_router.api.send_string = AsyncMock()
+        return mock_router
+
+    @pytest.mark.asyncio
+    async def test_group_level_is_one_command(
+        self, mock_hass, router_with_group, mock_call_later
+    ):
+        """Test a group level is one message, applied locally to every member."""
+        scheduler = CommandScheduler(mock_hass, router_with_group, 0.1)
+
+        await scheduler.async_set_group_brightness(7, 0, 150)
+        await scheduler.async_flush()
+
+        router_with_group.api.send_string.assert_called_once_with(
+            ">V:2,C:13,G:7,L:0.0,F:150#"
+        )
+        assert router_with_group.api.devices.update_device_load_level.call_count == 3
+        router_with_group.api.devices.update_device_load_level.assert_called_with(
+            "1.2.3.3", 0.0
+        )
+        assert router_with_group.api.devices.devices["1.2.3.1"].last_load_level == 80.0
+        assert scheduler.stats["group_commands"] == 1
+
+    @pytest.mark.asyncio
+    async def test_group_level_replaces_pending_member_levels(
+        self, mock_hass, router_with_group, mock_call_later
+    ):
+        """Test member levels queued before a group level aren't sent."""
+        scheduler = CommandScheduler(mock_hass, router_with_group, 0.1)
+
+        await scheduler.async_set_brightness("1.2.3.1", 10)
+        await scheduler.async_set_brightness("9.9.9.9", 10)
+        await scheduler.async_set_group_brightness(7, 255)
+        await scheduler.async_flush()
+
+        router_with_group.api.send_string.assert_called_once()
+        router_with_group.api.devices.set_device_brightness.assert_called_once_with(
+            "9.9.9.9", 10
+        )
+        assert scheduler.stats["merged"] == 1
+
+
+class TestSceneRecalls:
+    """Test scene recalls queued alongside levels."""
+
+    @pytest.mark.asyncio
+    async def test_scene_sent_before_member_levels(
+        self, mock_hass, mock_router, mock_call_later
+    ):
+        """Test a recall goes first, so member levels queued with it override it."""
+        mock_router.api.groups.groups = {7: _make_group(7, ["1.2.3.1", "1.2.3.2"])}
+        mock_router.reconciler = Mock()
+        sent = []
+        mock_router.api.groups.set_scene.side_effect = lambda *args: sent.append(args)
+        mock_router.api.devices.set_device_brightness.side_effect = (
+            lambda *args: sent.append(args)
+        )
+        scheduler = CommandScheduler(mock_hass, mock_router, 0.1)
+
+        await scheduler.async_set_brightness("1.2.3.1", 10)
+        await scheduler.async_recall_scene(SceneAddress(7, 1, 2), 50)
+        assert scheduler.queue_depth == 2
+        await scheduler.async_flush()
+
+        assert sent == [(SceneAddress(7, 1, 2), 50), ("1.2.3.1", 10)]
+        assert mock_router.reconciler.async_mark_changed.call_count == 3
+
+    @pytest.mark.asyncio
+    async def test_latest_of_scene_and_group_level_wins(
+        self, mock_hass, mock_router, mock_call_later
+    ):
+        """Test a recall and a level for the same group replace each other."""
+        mock_router.api.send_string = AsyncMock()
+        scheduler = CommandScheduler(mock_hass, mock_router, 0.1)
+
+        await scheduler.async_set_group_brightness(7, 255)
+        await scheduler.async_recall_scene(SceneAddress(7, 1, 2))
+        await scheduler.async_flush()
+
+        mock_router.api.groups.set_scene.assert_called_once_with(SceneAddress(7, 1, 2))
+        mock_router.api.send_string.assert_not_called()
+
+        await scheduler.async_recall_scene(SceneAddress(7, 1, 2))
+        await scheduler.async_set_group_brightness(7, 255)
+        await scheduler.async_flush()
+
+        mock_router.api.groups.set_scene.assert_called_once()
+        mock_router.api.send_string.assert_called_once()
+        assert scheduler.stats["merged"] == 2
+
+
+class TestOfflineCommands:
+    """Test commands issued while a router is unreachable."""
+
+    @pytest.mark.asyncio
+    async def test_commands_held_until_link_returns(
+        self, mock_hass, mock_router, mock_call_later
+    ):
+        """Test only the latest level per address is sent once the link is back."""
+        mock_router.available = False
+        mock_router.is_available = Mock(return_value=False)
+        scheduler = CommandScheduler(mock_hass, mock_router, 0.1)
+
+        await scheduler.async_set_brightness("1.2.3.4", 10)
+        await scheduler.async_flush()
+        await scheduler.async_set_brightness("1.2.3.4", 90)
+        await scheduler.async_flush()
+
+        mock_router.api.devices.set_device_brightness.assert_not_called()
+        assert scheduler.queue_depth == 1
+
+        mock_router.available = True
+        mock_router.is_available.return_value = True
+        await scheduler.async_flush()
+
+        mock_router.api.devices.set_device_brightness.assert_called_once_with(
+            "1.2.3.4", 90
+        )
+        assert scheduler.stats["deferred"] == 2
+
+
+class TestPredictions:
+    """Test queued levels are predicted, and their predictions kept up to date."""
+
+    @pytest.mark.asyncio
+    async def test_levels_predicted_and_sent(
+        self, mock_hass, mock_router, mock_call_later
+    ):
+        """Test a level is predicted when queued and noted once it is sent."""
+        scheduler = CommandScheduler(mock_hass, mock_router, 0.1)
+
+        await scheduler.async_set_brightness("1.2.3.4", 90, 250)
+
+        mock_router.optimistic.async_predict.assert_called_once_with("1.2.3.4", 90)
+        mock_router.optimistic.async_sent.assert_not_called()
+
+        await scheduler.async_flush()
+
+        mock_router.optimistic.async_sent.assert_called_once_with("1.2.3.4", 2.5)
+
+    @pytest.mark.asyncio
+    async def test_held_levels_rolled_back(
+        self, mock_hass, mock_router, mock_call_later
+    ):
+        """Test a level held while the router is down isn't shown as set."""
+        mock_router.is_available = Mock(return_value=False)
+        scheduler = CommandScheduler(mock_hass, mock_router, 0.1)
+
+        await scheduler.async_set_brightness("1.2.3.4", 90)
+        await scheduler.async_flush()
+
+        mock_router.optimistic.async_roll_back.assert_called_once_with("1.2.3.4")
+        mock_router.optimistic.async_sent.assert_not_called()
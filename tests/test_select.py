@@ -0,0 +1,164 @@
+"""Tests for the Helvar select platform."""
+import pytest
+from unittest.mock import Mock, patch
+
+from aiohelvar import SceneAddress
+from aiohelvar.scenes import Scene
+
+from custom_components.helvar.const import DOMAIN as HELVAR_DOMAIN
+from custom_components.helvar.scene_names import SceneNameIndex
+from custom_components.helvar.scheduler import CommandScheduler
+from custom_components.helvar.select import HelvarGroup, async_setup_entry
+from custom_components.helvar.topology import TopologyDiff
+
+
+@pytest.fixture
+def mock_group():
+    """Create a mock Helvar group."""
+    group = Mock()
+    group.group_id = 3
+    group.name = "Office"
+    group.get_last_scene_address = Mock(return_value=SceneAddress(3, 1, 2))
+    return group
+
+
+@pytest.fixture
+def group_router(mock_router):
+    """Create a mock router with scenes for group 3."""
+    scenes = [
+        Scene(SceneAddress(3, 1, 3)),
+        Scene(SceneAddress(3, 1, 2), name="Dim"),
+        Scene(SceneAddress(3, 1, 1), name="Bright"),
+        Scene(SceneAddress(4, 1, 1), name="Away"),
+    ]
+    mock_router.api.scenes.scenes = {scene.address: scene for scene in scenes}
+    mock_router.scene_names = SceneNameIndex()
+    mock_router.scene_names.rebuild(mock_router.api)
+    return mock_router
+
+
+class TestHelvarGroup:
+    """Test the HelvarGroup class."""
+
+    def test_options_from_name_index(self, mock_group, group_router):
+        """Test the options are the group's own scenes, named ones first."""
+        select = HelvarGroup(mock_group, group_router)
+
+        assert select.options == [
+            "Bright - @3.1.1",
+            "Dim - @3.1.2",
+            "Unnamed - @3.1.3",
+        ]
+
+    def test_current_option(self, mock_group, group_router):
+        """Test current_option is the name of the last recalled scene."""
+        select = HelvarGroup(mock_group, group_router)
+        assert select.current_option == "Dim - @3.1.2"
+
+        mock_group.get_last_scene_address.return_value = None
+        assert select.current_option is None
+
+    @pytest.mark.asyncio
+    async def test_select_option_uses_cached_address(self, mock_group, group_router):
+        """Test selecting an option recalls the mapped scene through the scheduler."""
+        select = HelvarGroup(mock_group, group_router)
+
+        await select.async_select_option("Unnamed - @3.1.3")
+
+        group_router.scheduler.async_recall_scene.assert_called_once_with(
+            SceneAddress(3, 1, 3)
+        )
+        group_router.api.groups.set_scene.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_quick_selections_are_merged(
+        self, mock_hass, mock_group, group_router
+    ):
+        """Test options picked before the next flush go out as one recall."""
+        with patch("custom_components.helvar.scheduler.async_call_later"):
+            group_router.scheduler = CommandScheduler(mock_hass, group_router, 0.1)
+            select = HelvarGroup(mock_group, group_router)
+
+            for option in ("Bright - @3.1.1", "Dim - @3.1.2", "Unnamed - @3.1.3"):
+                await select.async_select_option(option)
+            await group_router.scheduler.async_flush()
+
+        group_router.api.groups.set_scene.assert_called_once_with(SceneAddress(3, 1, 3))
+        assert group_router.scheduler.stats["merged"] == 2
+
+    @pytest.mark.asyncio
+    async def test_select_unknown_option(self, mock_group, group_router):
+        """Test that an unknown option is not sent to the router."""
+        select = HelvarGroup(mock_group, group_router)
+
+        await select.async_select_option("Missing - @3.1.9")
+
+        group_router.scheduler.async_recall_scene.assert_not_called()
+
+    def test_scenes_updated_rebuilds_options(self, mock_group, group_router):
+        """Test the options cache is rebuilt when the router reports a change."""
+        select = HelvarGroup(mock_group, group_router)
+        select.async_write_ha_state = Mock()
+
+        scenes = group_router.api.scenes.scenes
+        scenes[SceneAddress(3, 1, 1)].name = "Morning"
+        del scenes[SceneAddress(3, 1, 2)]
+        group_router.scene_names.update(
+            group_router.api, [SceneAddress(3, 1, 1), SceneAddress(3, 1, 2)]
+        )
+        select._async_scenes_updated()
+
+        assert select.options == ["Morning - @3.1.1", "Unnamed - @3.1.3"]
+        assert select.current_option is None
+        select.async_write_ha_state.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_subscribes_once_added(self, mock_group, group_router):
+        """Test the group is only followed while the entity is added."""
+        select = HelvarGroup(mock_group, group_router)
+        select.hass = Mock()
+        group_router.api.groups.register_subscription.assert_not_called()
+
+        with patch(
+            "custom_components.helvar.select.async_dispatcher_connect",
+            return_value=Mock(),
+        ):
+            await select.async_added_to_hass()
+        group_router.api.groups.register_subscription.assert_called_once()
+
+        await select.async_remove()
+        group_router.api.groups.unregister_subscription.assert_called_once_with(
+            3, group_router.api.groups.register_subscription.call_args[0][1]
+        )
+
+    def test_disabled_by_default_in_disabled_groups(self, mock_group, group_router):
+        """Test the select of a disabled group is disabled by default."""
+        assert HelvarGroup(mock_group, group_router).entity_registry_enabled_default
+
+        group_router.disabled_groups = {3}
+
+        assert not HelvarGroup(mock_group, group_router).entity_registry_enabled_default
+
+
+@pytest.mark.asyncio
+async def test_topology_updates_add_and_remove_selects(
+    mock_hass, mock_config_entry, mock_add_entities, group_router, mock_group
+):
+    """Test selects come and go with the groups a sync finds."""
+    mock_hass.data = {HELVAR_DOMAIN: {mock_config_entry.entry_id: group_router}}
+
+    with patch(
+        "custom_components.helvar.select.async_dispatcher_connect"
+    ) as dispatcher_connect:
+        await async_setup_entry(mock_hass, mock_config_entry, mock_add_entities)
+    async_topology_updated = dispatcher_connect.call_args[0][2]
+
+    group_router.api.groups.groups[3] = mock_group
+    with patch(
+        "custom_components.helvar.select.async_remove_entities"
+    ) as remove_entities:
+        async_topology_updated(TopologyDiff(added_groups=["3"], removed_groups=["8"]))
+
+    assert list(remove_entities.call_args[0][2]) == ["8-select"]
+    (added,) = mock_add_entities.call_args[0][0]
+    assert added.group is mock_group
@@ -0,0 +1,141 @@
+"""Tests for the Helvar diagnostic sensors."""
+import asyncio
+import pytest
+from unittest.mock import Mock
+
+import aiohelvar
+
+from custom_components.helvar.router import HelvarRouter
+from custom_components.helvar.const import DOMAIN as HELVAR_DOMAIN
+from custom_components.helvar.sensor import (
+    SENSORS,
+    HelvarDiagnosticSensor,
+    async_setup_entry,
+)
+
+
+@pytest.fixture
+def diagnostics_router(mock_hass, mock_config_entry, mock_topology_store):
+    """Create a router manager with some measurements recorded."""
+    mock_config_entry.data = {"host": "10.0.0.1", "port": 50000}
+    router = HelvarRouter(mock_hass, mock_config_entry)
+
+    router.routers = {}
+    for key in ((0, 1), (0, 2)):
+        api = Mock()
+        api.host = f"10.0.0.{key[1]}"
+        api.commands_to_send = asyncio.Queue()
+        router.routers[key] = api
+    router.api = router.routers[(0, 1)]
+    router.api.commands_to_send.put_nowait(b">V:1,C:104#")
+    router.scheduler.pending = {
+        aiohelvar.HelvarAddress(0, 1, 1, 1): 255,
+        aiohelvar.HelvarAddress(0, 2, 1, 1): 0,
+    }
+    router.scheduler.pending_scenes = {4: (aiohelvar.SceneAddress(4, 1, 1), None)}
+
+    for latency in (0.010, 0.020, 0.030, 0.500):
+        router.pipeline.latency.record(latency)
+        router.pipeline.latency_for((0, 1)).record(latency)
+    router.pipeline.latency_for((0, 2)).record(0.2)
+    router.metrics["discovery_duration"] = 12.345
+    return router
+
+
+def _sensor(router, key, router_key=(0, 1)):
+    description = next(d for d in SENSORS if d.key == key)
+    if not description.per_router:
+        router_key = None
+    return HelvarDiagnosticSensor(router, description, router_key)
+
+
+class TestHelvarDiagnosticSensor:
+    """Test the HelvarDiagnosticSensor class."""
+
+    def test_latency_percentiles(self, diagnostics_router):
+        """Test latencies are reported in milliseconds, for each router."""
+        assert _sensor(diagnostics_router, "latency_p50").native_value == 30.0
+        assert _sensor(diagnostics_router, "latency_p99").native_value == 500.0
+        assert _sensor(diagnostics_router, "latency_p99", (0, 2)).native_value == 200.0
+
+    def test_latency_without_samples(self, diagnostics_router):
+        """Test latency is unknown before any query has been answered."""
+        diagnostics_router.pipeline.latency_for((0, 1)).samples.clear()
+        assert _sensor(diagnostics_router, "latency_p95").native_value is None
+
+    def test_queue_depth_counts_every_queue(self, diagnostics_router):
+        """Test the scheduler and connection send queues of a router are counted.
+
+        Scene recalls and group commands go to the first router.
+        """
+        assert _sensor(diagnostics_router, "queue_depth").native_value == 3
+        assert _sensor(diagnostics_router, "queue_depth", (0, 2)).native_value == 1
+
+    def test_reconnects_per_router(self, diagnostics_router):
+        """Test reconnects are counted for each router."""
+        diagnostics_router.supervisors = {(0, 2): Mock(stats={"reconnects": 2})}
+        assert _sensor(diagnostics_router, "reconnects").native_value == 0
+        assert _sensor(diagnostics_router, "reconnects", (0, 2)).native_value == 2
+
+    def test_discovery_duration(self, diagnostics_router):
+        """Test the last discovery duration is reported."""
+        assert _sensor(diagnostics_router, "discovery_duration").native_value == 12.35
+
+    def test_discovery_progress(self, diagnostics_router):
+        """Test discovery progress is reported overall and for each subnet."""
+        sensor = _sensor(diagnostics_router, "discovery_progress")
+        assert sensor.native_value is None
+        assert sensor.extra_state_attributes is None
+
+        diagnostics_router.discovery = Mock(
+            percent=40.0, progress={"0.1.1": {"devices": 5, "discovered": 2}}
+        )
+        assert sensor.native_value == 40.0
+        assert sensor.extra_state_attributes == {
+            "0.1.1": {"devices": 5, "discovered": 2}
+        }
+        assert _sensor(diagnostics_router, "latency_p50").extra_state_attributes is None
+
+    def test_prediction_divergence(self, diagnostics_router):
+        """Test divergence is reported overall and counted for each router."""
+        sensor = _sensor(diagnostics_router, "prediction_divergence")
+        assert sensor.native_value is None
+
+        diagnostics_router.optimistic.stats = {
+            "0.1": {"predicted": 4, "confirmed": 3, "diverged": 1, "rolled_back": 0}
+        }
+        assert sensor.native_value == 25.0
+        assert sensor.extra_state_attributes["0.1"]["diverged"] == 1
+
+    def test_link_mode(self, diagnostics_router):
+        """Test the watchdog's mode is reported, with its rolling latency."""
+        sensor = _sensor(diagnostics_router, "link_mode")
+        assert sensor.native_value == "normal"
+        assert sensor.extra_state_attributes["rolling_latency"] is None
+
+        diagnostics_router.pipeline.stats["queries"] = 4
+        diagnostics_router.watchdog.async_check()
+        assert sensor.extra_state_attributes["rolling_latency"] == 25.0
+
+        diagnostics_router.watchdog.degraded = True
+        assert sensor.native_value == "degraded"
+
+    @pytest.mark.asyncio
+    async def test_sensors_per_router(self, mock_hass, diagnostics_router):
+        """Test link sensors are created for every router, each with its own id."""
+        entry = diagnostics_router.config_entry
+        mock_hass.data = {HELVAR_DOMAIN: {entry.entry_id: diagnostics_router}}
+        sensors = []
+
+        await async_setup_entry(mock_hass, entry, sensors.extend)
+
+        per_router = [d for d in SENSORS if d.per_router]
+        assert len(sensors) == len(SENSORS) + len(per_router)
+        assert len({sensor.unique_id for sensor in sensors}) == len(sensors)
+        assert f"{entry.entry_id}-latency_p95" in {s.unique_id for s in sensors}
+        second = [sensor for sensor in sensors if sensor.key == (0, 2)]
+        assert (
+            second[0].unique_id
+            == f"{entry.entry_id}-0.2-{second[0].entity_description.key}"
+        )
+        assert second[0].name.startswith("Helvar 10.0.0.2 ")
@@ -0,0 +1,285 @@
+"""Tests for the Helvar services."""
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+
+import aiohelvar
+from homeassistant.core import SupportsResponse
+from homeassistant.exceptions import HomeAssistantError, ServiceValidationError
+import voluptuous as vol
+
+from custom_components.helvar.const import DOMAIN
+from custom_components.helvar.scene_levels import SceneLevelTable
+from custom_components.helvar.scheduler import CommandScheduler
+from custom_components.helvar.services import (
+    BULK_SET_SCHEMA,
+    RECALL_SCENE_SCHEMA,
+    SERVICE_BULK_SET,
+    STORE_SCENE_SCHEMA,
+    async_handle_bulk_set,
+    async_handle_recall_scene,
+    async_handle_store_scene,
+    async_setup_services,
+)
+
+
+@pytest.fixture
+def bulk_router(mock_hass, mock_router):
+    """Add a group of three dimmable devices, and a real scheduler, to a router."""
+    addresses = [aiohelvar.HelvarAddress(0, 1, 1, device) for device in (1, 2, 3)]
+    devices = {}
+    for address in addresses:
+        device = Mock()
+        device.address = address
+        device.is_load = True
+        device.load_level = 0.0
+        device.levels = ["0"] * 136
+        device.levels[aiohelvar.SceneAddress(1, 1, 1).to_device_int()] = "100"
+        devices[address] = device
+    mock_router.api.devices.devices = devices
+
+    group = Mock()
+    group.group_id = 7
+    group.devices = addresses
+    mock_router.api.groups.groups = {7: group}
+    mock_router.api.send_string = AsyncMock()
+    mock_router.api.devices.update_device_load_level = AsyncMock()
+
+    with patch("custom_components.helvar.scheduler.async_call_later"):
+        mock_router.scheduler = CommandScheduler(mock_hass, mock_router, 0.1)
+        mock_hass.data = {DOMAIN: {"entry": mock_router}}
+        yield mock_router
+
+
+def _call(schema=BULK_SET_SCHEMA, **data):
+    call = Mock()
+    call.data = schema(data)
+    return call
+
+
+class TestBulkSet:
+    """Test the bulk_set service."""
+
+    def test_registered_with_optional_response(self, mock_hass):
+        """Test the service is registered once, returning results if asked."""
+        async_setup_services(mock_hass)
+
+        args, kwargs = mock_hass.services.async_register.call_args_list[0]
+        assert args[:2] == (DOMAIN, SERVICE_BULK_SET)
+        assert kwargs["supports_response"] is SupportsResponse.OPTIONAL
+
+    @pytest.mark.asyncio
+    async def test_whole_group_is_packed(self, mock_hass, bulk_router):
+        """Test device levels covering a group are sent as one scene recall."""
+        call = _call(
+            targets=[
+                {"address": f"@0.1.1.{device}", "level": 100} for device in (1, 2, 3)
+            ]
+        )
+
+        response = await async_handle_bulk_set(mock_hass, call)
+
+        bulk_router.api.groups.set_scene.assert_called_once_with(
+            aiohelvar.SceneAddress(7, 1, 1)
+        )
+        bulk_router.api.devices.set_device_brightness.assert_not_called()
+        assert response["commands"] == 1
+        assert [result["status"] for result in response["results"]] == ["sent"] * 3
+        assert response["results"][0]["address"] == "@0.1.1.1"
+
+    @pytest.mark.asyncio
+    async def test_scenes_levels_and_transitions(self, mock_hass, bulk_router):
+        """Test scenes and levels go out in one batch, with their own fade times."""
+        call = _call(
+            transition=2,
+            targets=[
+                {"group": 7, "scene": 4, "block": 2},
+                {"address": "0.1.1.2", "level": 50, "transition": 0.5},
+            ],
+        )
+
+        response = await async_handle_bulk_set(mock_hass, call)
+
+        bulk_router.api.groups.set_scene.assert_called_once_with(
+            aiohelvar.SceneAddress(7, 2, 4), 200
+        )
+        bulk_router.api.devices.set_device_load_level.assert_called_once_with(
+            aiohelvar.HelvarAddress(0, 1, 1, 2), "50.0", 50
+        )
+        assert response == {
+            "results": [
+                {"group": 7, "status": "sent"},
+                {"address": "0.1.1.2", "status": "sent"},
+            ],
+            "commands": 2,
+        }
+
+    @pytest.mark.asyncio
+    async def test_long_transition_is_clamped(self, mock_hass, bulk_router):
+        """Test transitions are taken as the light services take them, and clamped."""
+        call = _call(
+            transition=1000,
+            targets=[{"address": "0.1.1.2", "level": 50}],
+        )
+
+        await async_handle_bulk_set(mock_hass, call)
+
+        bulk_router.api.devices.set_device_load_level.assert_called_once_with(
+            aiohelvar.HelvarAddress(0, 1, 1, 2), "50.0", 65535
+        )
+
+    @pytest.mark.asyncio
+    async def test_levels_are_sent_exactly(self, mock_hass, bulk_router):
+        """Test levels aren't rounded through a brightness on the way out."""
+        call = _call(
+            targets=[
+                {"address": "0.1.1.1", "level": 1},
+                {"address": "0.1.1.2", "level": 50},
+            ]
+        )
+
+        await async_handle_bulk_set(mock_hass, call)
+
+        set_device_load_level = bulk_router.api.devices.set_device_load_level
+        assert [args[:2] for args, _ in set_device_load_level.call_args_list] == [
+            (aiohelvar.HelvarAddress(0, 1, 1, 1), "1.0"),
+            (aiohelvar.HelvarAddress(0, 1, 1, 2), "50.0"),
+        ]
+        bulk_router.api.devices.set_device_brightness.assert_not_called()
+
+        await async_handle_bulk_set(
+            mock_hass, _call(targets=[{"group": 7, "level": 1}])
+        )
+
+        bulk_router.api.send_string.assert_called_once()
+        assert ",L:1.0," in bulk_router.api.send_string.call_args[0][0]
+
+    @pytest.mark.asyncio
+    async def test_failed_and_replaced_targets(self, mock_hass, bulk_router):
+        """Test unknown targets fail, and targets a later one overrides say so."""
+        call = _call(
+            targets=[
+                {"address": "0.1.1.1", "level": 10},
+                {"address": "0.1.1.9", "level": 10},
+                {"address": "nonsense", "level": 10},
+                {"group": 8, "level": 10},
+                {"group": 7, "level": 0},
+            ]
+        )
+
+        response = await async_handle_bulk_set(mock_hass, call)
+
+        assert [result["status"] for result in response["results"]] == [
+            "replaced",
+            "failed",
+            "failed",
+            "failed",
+            "sent",
+        ]
+        assert response["results"][1]["error"] == "unknown device"
+        assert response["results"][3]["error"] == "unknown group"
+        assert response["commands"] == 1
+
+    @pytest.mark.asyncio
+    async def test_deferred_while_router_is_down(self, mock_hass, bulk_router):
+        """Test targets on an unreachable router are held, and reported as such."""
+        bulk_router.is_available = Mock(return_value=False)
+
+        response = await async_handle_bulk_set(
+            mock_hass, _call(targets=[{"address": "0.1.1.1", "level": 10}])
+        )
+
+        assert response["results"][0]["status"] == "deferred"
+        assert response["commands"] == 0
+        assert bulk_router.scheduler.queue_depth == 1
+
+    @pytest.mark.asyncio
+    async def test_workgroup_must_be_picked(self, mock_hass, bulk_router):
+        """Test the entry must be given if there is more than one workgroup."""
+        mock_hass.data[DOMAIN]["other"] = Mock()
+        call = _call(targets=[{"group": 7, "level": 0}])
+
+        with pytest.raises(ServiceValidationError):
+            await async_handle_bulk_set(mock_hass, call)
+
+        with pytest.raises(ServiceValidationError):
+            await async_handle_bulk_set(
+                mock_hass, _call(config_entry_id="missing", **call.data)
+            )
+
+        response = await async_handle_bulk_set(
+            mock_hass, _call(config_entry_id="entry", **call.data)
+        )
+        assert response["results"][0]["status"] == "sent"
+
+    def test_invalid_targets(self):
+        """Test targets must name one thing to set, and one value to set it to."""
+        for target in (
+            {"level": 10},
+            {"address": "0.1.1.1", "group": 7, "level": 10},
+            {"address": "0.1.1.1"},
+            {"address": "0.1.1.1", "scene": 1},
+            {"group": 7, "level": 101},
+        ):
+            with pytest.raises(vol.Invalid):
+                BULK_SET_SCHEMA({"targets": [target]})
+
+
+class TestSceneServices:
+    """Test storing and recalling group scenes on the router."""
+
+    @pytest.mark.asyncio
+    async def test_store_scene(self, mock_hass, bulk_router):
+        """Test current levels are stored with one command, after pending ones."""
+        bulk_router.scene_levels = SceneLevelTable()
+        bulk_router.scene_levels.rebuild(bulk_router.api)
+        await bulk_router.scheduler.async_set_brightness(
+            aiohelvar.HelvarAddress(0, 1, 1, 2), 153
+        )
+        for device in bulk_router.api.devices.devices.values():
+            device.load_level = 60.0
+
+        response = await async_handle_store_scene(
+            mock_hass, _call(STORE_SCENE_SCHEMA, group=7, scene=3)
+        )
+
+        bulk_router.api.devices.set_device_brightness.assert_called_once()
+        bulk_router.api.send_string.assert_called_once_with(
+            ">V:2,C:203,O:0,G:7,B:1,S:3#"
+        )
+        assert response == {
+            "scene_address": "@7.1.3",
+            "devices": ["@0.1.1.1", "@0.1.1.2", "@0.1.1.3"],
+        }
+        assert set(
+            bulk_router.scene_levels.levels_for_scene(
+                aiohelvar.SceneAddress(7, 1, 3)
+            ).values()
+        ) == {60.0}
+
+    @pytest.mark.asyncio
+    async def test_store_scene_needs_the_router(self, mock_hass, bulk_router):
+        """Test a scene can't be stored on an unknown group or unreachable router."""
+        with pytest.raises(ServiceValidationError):
+            await async_handle_store_scene(
+                mock_hass, _call(STORE_SCENE_SCHEMA, group=8, scene=3)
+            )
+
+        bulk_router.available = False
+        with pytest.raises(HomeAssistantError):
+            await async_handle_store_scene(
+                mock_hass, _call(STORE_SCENE_SCHEMA, group=7, scene=3)
+            )
+        bulk_router.api.send_string.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_recall_scene(self, mock_hass, bulk_router):
+        """Test a recall is queued as one scene command with its transition."""
+        await async_handle_recall_scene(
+            mock_hass,
+            _call(RECALL_SCENE_SCHEMA, group=7, block=2, scene=4, transition=1.5),
+        )
+        await bulk_router.scheduler.async_flush()
+
+        bulk_router.api.groups.set_scene.assert_called_once_with(
+            aiohelvar.SceneAddress(7, 2, 4), 150
+        )
@@ -0,0 +1,65 @@
+"""Tests for the Helvar state writer."""
+import pytest
+from unittest.mock import Mock
+
+from custom_components.helvar.state_writer import StateWriter
+
+
+# Every test here runs with the module's timer patched.
+pytestmark = pytest.mark.parametrize(
+    "mock_call_later",
+    ["custom_components.helvar.state_writer"],
+    ids=["state_writer"],
+    indirect=True,
+)
+
+
+def _make_entity():
+    entity = Mock()
+    entity.hass = Mock()
+    return entity
+
+
+class TestStateWriter:
+    """Test the StateWriter class."""
+
+    def test_each_entity_written_once(self, mock_hass, mock_call_later):
+        """Test repeated updates in one window produce one write per entity."""
+        writer = StateWriter(mock_hass, 0.05)
+        first, second = _make_entity(), _make_entity()
+
+        for _ in range(5):
+            writer.async_schedule_write(first)
+        writer.async_schedule_write(second)
+
+        mock_call_later.assert_called_once()
+        first.async_write_ha_state.assert_not_called()
+
+        writer.async_write()
+
+        first.async_write_ha_state.assert_called_once()
+        second.async_write_ha_state.assert_called_once()
+        assert writer.stats == {"received": 6, "written": 2}
+
+    def test_removed_entity_not_written(self, mock_hass, mock_call_later):
+        """Test an entity removed during the window is skipped."""
+        writer = StateWriter(mock_hass, 0.05)
+        entity = _make_entity()
+
+        writer.async_schedule_write(entity)
+        entity.hass = None
+        writer.async_write()
+
+        entity.async_write_ha_state.assert_not_called()
+        assert writer.stats["written"] == 0
+
+    def test_shutdown_drops_pending(self, mock_hass, mock_call_later):
+        """Test shutdown cancels the timer and forgets pending writes."""
+        writer = StateWriter(mock_hass, 0.05)
+        entity = _make_entity()
+
+        writer.async_schedule_write(entity)
+        writer.async_shutdown()
+
+        mock_call_later.return_value.assert_called_once()
+        assert not writer.pending
@@ -0,0 +1,127 @@
+"""Tests for the Helvar connection supervisor."""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+
+import aiohelvar
+
+from custom_components.helvar.supervisor import (
+    RECONNECT_DELAY_MAX,
+    ConnectionSupervisor,
+)
+
+
+@pytest.fixture
+def mock_api():
+    """Create a mock aiohelvar router connection."""
+    api = Mock()
+    api.host = "10.0.0.1"
+    api.connected = True
+    api.connect = AsyncMock()
+
+
+    async def disconnect():
+        api.connected = False
+
+    api.disconnect = AsyncMock(side_effect=disconnect)
+    return api
+
+
+class TestConnectionSupervisor:
+    """Test the ConnectionSupervisor class."""
+
+    @pytest.mark.asyncio
+    async def test_ping_answered(self, mock_router, mock_api, reply_future):
+        """Test a keepalive reply means the link is up."""
+        mock_api.send_command = AsyncMock(side_effect=reply_future)
+        supervisor = ConnectionSupervisor(mock_router, mock_api)
+
+        assert await supervisor.async_ping() is True
+
+    @pytest.mark.asyncio
+    async def test_ping_timeout(self, mock_router, mock_api):
+        """Test a keepalive timeout means the link is down."""
+        mock_api.send_command = AsyncMock(
+            side_effect=aiohelvar.CommandResponseTimeout(None)
+        )
+        supervisor = ConnectionSupervisor(mock_router, mock_api)
+
+        assert await supervisor.async_ping() is False
+
+    @pytest.mark.asyncio
+    async def test_reconnect_backs_off_with_jitter(self, mock_router, mock_api):
+        """Test failed reconnects wait longer each time, up to the maximum."""
+        mock_api.connect = AsyncMock(side_effect=[OSError("refused")] * 12 + [None])
+        supervisor = ConnectionSupervisor(mock_router, mock_api)
+
+        with patch(
+            "custom_components.helvar.supervisor.asyncio.sleep", AsyncMock()
+        ) as sleep:
+            await supervisor.async_reconnect()
+
+        delays = [call.args[0] for call in sleep.call_args_list]
+        assert len(delays) == 13
+        assert delays[0] <= 1
+        assert delays[3] >= 4
+        assert max(delays) <= RECONNECT_DELAY_MAX
+        assert supervisor.stats["reconnects"] == 1
+        mock_api.disconnect.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_reconnect_survives_timeouts(self, mock_router, mock_api):
+        """Test a reconnect that times out or hangs is retried."""
+        attempts = []
+
+        async def connect():
+            attempts.append(len(attempts))
+            if len(attempts) == 1:
+                raise aiohelvar.CommandResponseTimeout(None)
+            if len(attempts) == 2:
+                # The workgroup name query is never answered.
+                await asyncio.Event().wait()
+
+        mock_api.connect = AsyncMock(side_effect=connect)
+        supervisor = ConnectionSupervisor(mock_router, mock_api)
+
+        with patch(
+            "custom_components.helvar.supervisor.asyncio.sleep", AsyncMock()
+        ), patch("custom_components.helvar.supervisor.CONNECT_TIMEOUT", 0.01):
+            await supervisor.async_reconnect()
+
+        assert len(attempts) == 3
+        assert supervisor.stats["reconnects"] == 1
+
+    def test_library_keepalive_is_stopped(self, mock_router, mock_api):
+        """Test aiohelvar's own keepalive can't reconnect behind our back."""
+        keepalive = Mock()
+        mock_api._keep_alive_task = keepalive
+
+        ConnectionSupervisor(mock_router, mock_api)
+
+        keepalive.cancel.assert_called_once()
+        assert mock_api._keep_alive_task is None
+
+    @pytest.mark.asyncio
+    async def test_link_loss_and_recovery(self, mock_router, mock_api):
+        """Test entities are told about the outage and held commands are replayed."""
+        mock_api.send_command = AsyncMock(
+            side_effect=aiohelvar.CommandResponseTimeout(None)
+        )
+        mock_router.async_link_restored = AsyncMock()
+        supervisor = ConnectionSupervisor(mock_router, mock_api)
+
+        states = []
+        mock_router.async_link_changed = Mock(
+            side_effect=lambda api: states.append(supervisor.available)
+        )
+
+        with patch(
+            "custom_components.helvar.supervisor.asyncio.sleep",
+            AsyncMock(side_effect=[None, None, asyncio.CancelledError]),
+        ):
+            with pytest.raises(asyncio.CancelledError):
+                await supervisor.async_run()
+
+        assert states == [False, True]
+        mock_router.async_link_restored.assert_called_once_with(mock_api)
+        assert supervisor.stats["failures"] == 1
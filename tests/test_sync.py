@@ -0,0 +1,163 @@
+"""Tests for incremental sync of a Helvar workgroup's configuration."""
+import pytest
+from unittest.mock import Mock, patch
+
+import aiohelvar
+
+from custom_components.helvar.router import HelvarRouter
+from custom_components.helvar.sync import (
+    async_read_configuration,
+    configuration_checksum,
+    diff_configuration,
+)
+from custom_components.helvar.topology import dump_topology
+
+from .simulator import QUERY_SCENE_INFO, HelvarSimulator, SimulatedDevice
+
+
+async def _async_setup(hass, entry, store):
+    """Start a simulated router with five groups of twenty lights, and set up a
+    router from a cached copy of its topology."""
+    simulator = HelvarSimulator()
+    await simulator.start()
+
+    api = aiohelvar.Router(simulator.host, simulator.port)
+    simulator.populate(api)
+    store.async_load.return_value = dump_topology(api)
+
+    entry.data = {"host": simulator.host, "port": simulator.port}
+    entry.options = {"poll_rate": 0, "sync_interval": 0}
+    router = HelvarRouter(hass, entry)
+    assert await router.async_setup()
+    return simulator, router
+
+
+async def _async_stop(simulator, router):
+    await router.async_reset()
+    await simulator.stop()
+
+
+class TestReadConfiguration:
+    """Test reading the cheap parts of the configuration."""
+
+    @pytest.mark.asyncio
+    async def test_matches_full_topology(
+        self, mock_hass, mock_config_entry, mock_topology_store
+    ):
+        """Test an unchanged workgroup reads as no differences."""
+        simulator, router = await _async_setup(
+            mock_hass, mock_config_entry, mock_topology_store
+        )
+
+        configuration = await async_read_configuration(router.pipeline, [router.api])
+
+        assert configuration["workgroup_name"] == "Simulated"
+        assert len(configuration["devices"]) == 100
+        assert configuration["groups"]["1"]["name"] == "Group 1"
+        assert configuration["groups"]["1"]["devices"][0] == "0.1.1.1"
+        assert configuration["scenes"]["@1.1.1"] == "On"
+        assert not diff_configuration(router.api, configuration)
+        assert simulator.received.get(QUERY_SCENE_INFO) is None
+
+        await _async_stop(simulator, router)
+
+    def test_checksum_is_stable(self):
+        """Test the checksum doesn't depend on key order."""
+        assert configuration_checksum({"a": 1, "b": 2}) == configuration_checksum(
+            {"b": 2, "a": 1}
+        )
+
+
+class TestSync:
+    """Test applying configuration changes to a running router."""
+
+    @pytest.mark.asyncio
+    async def test_unchanged_checksum_does_nothing(
+        self, mock_hass, mock_config_entry, mock_topology_store
+    ):
+        """Test the checksum is saved, and a second sync stops at it."""
+        simulator, router = await _async_setup(
+            mock_hass, mock_config_entry, mock_topology_store
+        )
+
+        assert not await router.async_sync()
+        saved = mock_topology_store.async_save.call_args[0][0]
+        assert saved["checksum"] == router.checksum
+
+        assert await router.async_sync() is None
+        mock_topology_store.async_save.assert_called_once()
+
+        await _async_stop(simulator, router)
+
+    @pytest.mark.asyncio
+    async def test_changes_are_applied(
+        self, mock_hass, mock_config_entry, mock_topology_store
+    ):
+        """Test a new device and a removed group are picked up without a reload."""
+        simulator, router = await _async_setup(
+            mock_hass, mock_config_entry, mock_topology_store
+        )
+        group = router.api.groups.groups[1]
+        group_updates = []
+
+        async def group_updated(group):
+            group_updates.append(group)
+
+        group.add_subscriber(group_updated)
+
+        simulator.devices[(1, 101)] = SimulatedDevice(1, 101)
+        simulator.devices[(1, 101)].load_level = 50.0
+        simulator.groups[1].append((1, 101))
+        del simulator.groups[5]
+
+        with patch(
+            "custom_components.helvar.router.async_dispatcher_send"
+        ) as dispatcher_send:
+            diff = await router.async_sync()
+
+        assert diff.added_devices == ["0.1.1.101"]
+        assert diff.changed_groups == ["1"]
+        assert diff.removed_groups == ["5"]
+        assert not diff.removed_devices
+        dispatcher_send.assert_any_call(mock_hass, router.topology_updated_signal, diff)
+
+        device = router.api.devices.devices[aiohelvar.HelvarAddress(0, 1, 1, 101)]
+        assert device.name == "Light 1.101"
+        assert device.load_level == 50.0
+        assert len(device.levels) == 136
+        assert group.devices[-1] == device.address
+        assert group_updates == [group]
+        assert router._device_groups[device.address] == (1,)
+
+        assert 5 not in router.api.groups.groups
+        assert not router.api.groups.get_scenes_for_group(5, only_named=False)
+
+        await _async_stop(simulator, router)
+
+    @pytest.mark.asyncio
+    async def test_rename_is_not_a_scene_recall(
+        self, mock_hass, mock_config_entry, mock_topology_store
+    ):
+        """Test renaming a group leaves its members and the last scene alone."""
+        simulator, router = await _async_setup(
+            mock_hass, mock_config_entry, mock_topology_store
+        )
+        group = router.api.groups.groups[1]
+        group.last_scene_address = aiohelvar.SceneAddress(1, 1, 1)
+        members = [router.api.devices.devices[address] for address in group.devices]
+        for device in members:
+            device.load_level = 25.0
+        router.events = Mock()
+        notifications = router.notifications.total
+
+        simulator.group_names[1] = "Kitchen"
+        diff = await router.async_sync()
+
+        assert diff.changed_groups == ["1"]
+        assert group.name == "Kitchen"
+        assert [device.load_level for device in members] == [25.0] * len(members)
+        router.events.async_scene_recalled.assert_not_called()
+        router.events.async_level_changed.assert_not_called()
+        assert router.notifications.total == notifications
+
+        await _async_stop(simulator, router)
@@ -0,0 +1,100 @@
+"""Tests for the Helvar topology cache."""
+import json
+
+import aiohelvar
+from aiohelvar.devices import Device
+from aiohelvar.groups import Group
+from aiohelvar.scenes import Scene
+
+from custom_components.helvar.topology import (
+    apply_topology,
+    diff_topology,
+    dump_topology,
+    restore_topology,
+)
+
+
+def _make_api():
+    """Create an unconnected aiohelvar router with one group of two lights."""
+    api = aiohelvar.Router("10.0.0.1", 50000)
+    api.workgroup_name = "Office"
+
+    for device_id in (1, 2):
+        device = Device(
+            aiohelvar.HelvarAddress(0, 1, 1, device_id), raw_type=1537, name="Desk"
+        )
+        device.load_level = 50.0
+        device.levels = ["100"] * 136
+        api.devices.register_device(device)
+
+    group = Group(1)
+    group.name = "Desks"
+    group.devices = list(api.devices.devices)
+    group.last_scene_address = aiohelvar.SceneAddress(1, 1, 2)
+    api.groups.register_group(group)
+
+    scene_address = aiohelvar.SceneAddress(1, 1, 1)
+    api.scenes.register_scene(scene_address, Scene(scene_address, name="Bright"))
+
+    return api
+
+
+class TestTopology:
+    """Test dumping, restoring and diffing topologies."""
+
+    def test_round_trip(self):
+        """Test a dumped topology restores to the same topology."""
+        topology = json.loads(json.dumps(dump_topology(_make_api())))
+
+        restored = aiohelvar.Router("10.0.0.1", 50000)
+        restore_topology(restored, topology)
+
+        assert restored.workgroup_name == "Office"
+        assert dump_topology(restored) == topology
+
+        device = restored.devices.devices[aiohelvar.HelvarAddress(0, 1, 1, 2)]
+        assert device.protocol == "DALI"
+        assert device.brightness == 127
+        assert device in restored.devices.get_light_devices()
+
+        scene = restored.scenes.get_scene(aiohelvar.SceneAddress(1, 1, 1))
+        assert scene.name == "Bright"
+        assert len(restored.groups.get_scenes_for_group(1, only_named=False)) > 1
+
+    def test_diff_ignores_live_state(self):
+        """Test levels changing on the bus aren't reported as topology changes."""
+        api = _make_api()
+        old = dump_topology(api)
+
+        for device in api.devices.devices.values():
+            device.load_level = 0.0
+
+        assert not diff_topology(old, dump_topology(api))
+
+    def test_diff_and_apply(self):
+        """Test changes found by a re-scan are reported and applied in place."""
+        api = _make_api()
+        scanned = _make_api()
+
+        renamed = scanned.devices.devices[aiohelvar.HelvarAddress(0, 1, 1, 1)]
+        renamed.name = "Window"
+        scanned.devices.register_device(
+            Device(aiohelvar.HelvarAddress(0, 1, 2, 9), raw_type=1537, name="New")
+        )
+        scanned.scenes.update_scene_name(aiohelvar.SceneAddress(1, 1, 1), "Full")
+
+        diff = diff_topology(dump_topology(api), dump_topology(scanned))
+
+        assert diff.changed_devices == ["0.1.1.1"]
+        assert diff.added_devices == ["0.1.2.9"]
+        assert diff.changed_scenes == ["@1.1.1"]
+        assert not diff.removed_devices
+        assert str(diff) == "1 added devices, 1 changed devices, 1 changed scenes"
+
+        live_device = api.devices.devices[aiohelvar.HelvarAddress(0, 1, 1, 1)]
+        updated = apply_topology(api, scanned, diff)
+
+        assert updated == [live_device]
+        assert live_device.name == "Window"
+        assert aiohelvar.HelvarAddress(0, 1, 2, 9) in api.devices.devices
+        assert api.scenes.get_scene(aiohelvar.SceneAddress(1, 1, 1)).name == "Full"
@@ -0,0 +1,108 @@
+"""Tests for the Helvar latency watchdog."""
+import asyncio
+import logging
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+
+from custom_components.helvar.pipeline import CommandPipeline
+from custom_components.helvar.watchdog import (
+    DEGRADED_FLUSH_INTERVAL,
+    WINDOW,
+    LatencyWatchdog,
+)
+
+
+def _make_router():
+    """Create a mock router with a real pipeline and a 100ms flush interval."""
+    router = Mock()
+    router.host = "10.0.0.1"
+    router.available = True
+    router.flush_interval = 0.1
+    router.pipeline = CommandPipeline(4)
+    router.scheduler.interval = 0.1
+    router.reconciler.paused = False
+    return router
+
+
+def _reply(router, latency, count=WINDOW):
+    """Record replies to queries, as the pipeline does."""
+    for _ in range(count):
+        router.pipeline.latency.record(latency)
+        router.pipeline.stats["queries"] += 1
+
+
+class TestLatencyWatchdog:
+    """Test the LatencyWatchdog class."""
+
+    def test_slow_router_degrades_and_recovers(self, caplog):
+        """Test slow replies merge levels and pause polling until they speed up."""
+        router = _make_router()
+        watchdog = LatencyWatchdog(router)
+
+        _reply(router, 0.05)
+        watchdog.async_check()
+        assert not watchdog.degraded
+
+        _reply(router, 3.0)
+        with caplog.at_level(logging.WARNING):
+            watchdog.async_check()
+
+        assert watchdog.degraded
+        assert watchdog.latency == 3.0
+        assert router.scheduler.interval == DEGRADED_FLUSH_INTERVAL
+        assert router.reconciler.paused is True
+        router.optimistic.async_set_paused.assert_called_with(True)
+        assert "sending only final levels" in caplog.text
+
+        _reply(router, 0.05)
+        watchdog.async_check()
+
+        assert not watchdog.degraded
+        assert router.scheduler.interval == 0.1
+        assert router.reconciler.paused is False
+        router.optimistic.async_set_paused.assert_called_with(False)
+        assert watchdog.stats == {"degraded": 1, "recovered": 1, "probes": 0}
+
+    def test_timeouts_count_as_slow(self):
+        """Test queries that time out push the rolling latency up."""
+        router = _make_router()
+        watchdog = LatencyWatchdog(router)
+
+        _reply(router, 0.05, count=3)
+        router.pipeline.stats["timeouts"] += 5
+        watchdog.async_check()
+
+        assert watchdog.degraded
+
+    def test_recovery_needs_a_fast_router(self):
+        """Test a router that is faster, but not fast, stays degraded."""
+        router = _make_router()
+        watchdog = LatencyWatchdog(router)
+
+        _reply(router, 3.0)
+        watchdog.async_check()
+        _reply(router, 1.0)
+        watchdog.async_check()
+
+        assert watchdog.degraded
+        # No replies since the last check change nothing.
+        watchdog.async_check()
+        assert watchdog.latency == 1.0
+
+    @pytest.mark.asyncio
+    async def test_idle_degraded_router_is_probed(self, reply_future):
+        """Test a router is probed for its latency if nothing else was answered."""
+        router = _make_router()
+        router.api.send_command = AsyncMock(side_effect=reply_future)
+        watchdog = LatencyWatchdog(router)
+        _reply(router, 3.0)
+        watchdog.async_check()
+
+        with patch(
+            "custom_components.helvar.watchdog.asyncio.sleep",
+            AsyncMock(side_effect=[None, None, asyncio.CancelledError]),
+        ), pytest.raises(asyncio.CancelledError):
+            await watchdog.async_run()
+
+        assert watchdog.stats["probes"] == 2
+        assert router.pipeline.stats["queries"] == WINDOW + 2